@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 from logging.config import fileConfig
 from pathlib import Path
@@ -26,10 +27,25 @@ settings = get_settings()
 config.set_main_option("sqlalchemy.url", os.getenv("DB_URL", settings.db_url))
 target_metadata = Base.metadata
 
+# Dialect-specific expression indexes are created with raw DDL (in the migrations,
+# the DDL hooks in app.models and at runtime) rather than declared as model
+# indexes, so autogenerate must not drop them.
+MANUAL_INDEX_PREFIXES = ("ix_audit_logs_meta_", "ix_dataset_rows_key_")
+# Per-dataset partitions of dataset_rows (see migration 0011) are managed at runtime.
+PARTITION_TABLE = re.compile(r"^dataset_rows_p\d+$")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "index" and reflected and compare_to is None and name and name.startswith(MANUAL_INDEX_PREFIXES):
+        return False
+    if type_ == "table" and reflected and compare_to is None and name and PARTITION_TABLE.match(name):
+        return False
+    return True
+
 
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
-    context.configure(url=url, target_metadata=target_metadata, literal_binds=True)
+    context.configure(url=url, target_metadata=target_metadata, literal_binds=True, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -43,7 +59,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
         with context.begin_transaction():
             context.run_migrations()
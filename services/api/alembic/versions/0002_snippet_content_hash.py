@@ -0,0 +1,18 @@
+"""snippet content hash"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_snippet_content_hash"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("snippets", sa.Column("content_hash", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("snippets") as batch_op:
+        batch_op.drop_column("content_hash")
@@ -0,0 +1,42 @@
+"""content-addressed snippet version storage"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_snippet_version_storage"
+down_revision = "0002_snippet_content_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "snippet_blobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+    )
+    op.create_index("ix_snippet_blobs_content_hash", "snippet_blobs", ["content_hash"], unique=True)
+
+    with op.batch_alter_table("snippet_versions") as batch_op:
+        batch_op.alter_column("body", existing_type=sa.Text(), nullable=True)
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("body_hash", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("base_version", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("delta", sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column("delta_depth", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    # Inline bodies must be restored (no compacted rows) before downgrading.
+    with op.batch_alter_table("snippet_versions") as batch_op:
+        batch_op.drop_column("delta_depth")
+        batch_op.drop_column("delta")
+        batch_op.drop_column("base_version")
+        batch_op.drop_column("body_hash")
+        batch_op.drop_column("content_hash")
+        batch_op.alter_column("body", existing_type=sa.Text(), nullable=False)
+    op.drop_index("ix_snippet_blobs_content_hash", table_name="snippet_blobs")
+    op.drop_table("snippet_blobs")
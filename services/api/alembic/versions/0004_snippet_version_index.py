@@ -0,0 +1,16 @@
+"""index snippet versions by (snippet_id, version)"""
+
+from alembic import op
+
+revision = "0004_snippet_version_index"
+down_revision = "0003_snippet_version_storage"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_snippet_versions_snippet_version", "snippet_versions", ["snippet_id", "version"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_snippet_versions_snippet_version", table_name="snippet_versions")
@@ -0,0 +1,72 @@
+"""dataset tables under alembic management"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_dataset_tables"
+down_revision = "0004_snippet_version_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Older deployments created these tables at import time; only create what is missing.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "datasets" not in existing:
+        op.create_table(
+            "datasets",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("created_by_client", sa.String(), nullable=True),
+            sa.Column("schema", sa.JSON(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        )
+        op.create_index("ix_datasets_name", "datasets", ["name"])
+        op.create_index("ix_datasets_owner_id", "datasets", ["owner_id"])
+        op.create_index("ix_datasets_created_by_client", "datasets", ["created_by_client"])
+
+    if "dataset_permissions" not in existing:
+        op.create_table(
+            "dataset_permissions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("dataset_id", sa.Integer(), sa.ForeignKey("datasets.id"), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("role", sa.String(), nullable=False, server_default="viewer"),
+        )
+        op.create_index("ix_dataset_permissions_dataset_id", "dataset_permissions", ["dataset_id"])
+        op.create_index("ix_dataset_permissions_user_id", "dataset_permissions", ["user_id"])
+        op.create_index("ix_dataset_perm_unique", "dataset_permissions", ["dataset_id", "user_id"], unique=True)
+
+    if "dataset_rows" not in existing:
+        op.create_table(
+            "dataset_rows",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("dataset_id", sa.Integer(), sa.ForeignKey("datasets.id"), nullable=False),
+            sa.Column("data", sa.JSON(), nullable=False),
+            sa.Column("archived", sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        )
+        op.create_index("ix_dataset_rows_dataset_id", "dataset_rows", ["dataset_id"])
+
+    # Dataset audit events are not scoped to a workspace.
+    with op.batch_alter_table("audit_logs") as batch_op:
+        batch_op.alter_column("workspace_id", existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("audit_logs") as batch_op:
+        batch_op.alter_column("workspace_id", existing_type=sa.Integer(), nullable=False)
+    op.drop_index("ix_dataset_rows_dataset_id", table_name="dataset_rows")
+    op.drop_table("dataset_rows")
+    op.drop_index("ix_dataset_perm_unique", table_name="dataset_permissions")
+    op.drop_index("ix_dataset_permissions_user_id", table_name="dataset_permissions")
+    op.drop_index("ix_dataset_permissions_dataset_id", table_name="dataset_permissions")
+    op.drop_table("dataset_permissions")
+    op.drop_index("ix_datasets_created_by_client", table_name="datasets")
+    op.drop_index("ix_datasets_owner_id", table_name="datasets")
+    op.drop_index("ix_datasets_name", table_name="datasets")
+    op.drop_table("datasets")
@@ -0,0 +1,29 @@
+"""api key prefix lookup, scopes and rate limits"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_api_key_lookup"
+down_revision = "0005_dataset_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("api_keys") as batch_op:
+        batch_op.add_column(sa.Column("prefix", sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column("role", sa.String(), nullable=False, server_default="editor"))
+        batch_op.add_column(sa.Column("rate_limit_per_minute", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("revoked_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_api_keys_prefix", "api_keys", ["prefix"], unique=True)
+    op.create_index("ix_api_keys_workspace_id", "api_keys", ["workspace_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_api_keys_workspace_id", table_name="api_keys")
+    op.drop_index("ix_api_keys_prefix", table_name="api_keys")
+    with op.batch_alter_table("api_keys") as batch_op:
+        batch_op.drop_column("revoked_at")
+        batch_op.drop_column("rate_limit_per_minute")
+        batch_op.drop_column("role")
+        batch_op.drop_column("prefix")
@@ -0,0 +1,58 @@
+"""audit log keyset index, meta lookup indexes and archive table"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_audit_log_indexes"
+down_revision = "0006_api_key_lookup"
+branch_labels = None
+depends_on = None
+
+# Keep in sync with ``app.audit.META_FILTER_KEYS``.
+META_KEYS = ("dataset_id", "snippet_id")
+
+
+def _meta_expression(dialect: str, key: str) -> str:
+    if dialect == "postgresql":
+        return f"(meta ->> '{key}')"
+    return f"json_extract(meta, '$.{key}')"
+
+
+def upgrade() -> None:
+    op.create_index("ix_audit_logs_workspace_created", "audit_logs", ["workspace_id", "created_at", "id"])
+    dialect = op.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        for key in META_KEYS:
+            expression = _meta_expression(dialect, key)
+            op.create_index(
+                f"ix_audit_logs_meta_{key}",
+                "audit_logs",
+                [sa.text(expression), "created_at", "id"],
+                postgresql_where=sa.text(f"{expression} IS NOT NULL"),
+                sqlite_where=sa.text(f"{expression} IS NOT NULL"),
+            )
+
+    op.create_table(
+        "audit_logs_archive",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("workspace_id", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("meta", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index(
+        "ix_audit_logs_archive_workspace_created",
+        "audit_logs_archive",
+        ["workspace_id", "created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_audit_logs_archive_workspace_created", table_name="audit_logs_archive")
+    op.drop_table("audit_logs_archive")
+    if op.get_bind().dialect.name in ("postgresql", "sqlite"):
+        for key in META_KEYS:
+            op.drop_index(f"ix_audit_logs_meta_{key}", table_name="audit_logs")
+    op.drop_index("ix_audit_logs_workspace_created", table_name="audit_logs")
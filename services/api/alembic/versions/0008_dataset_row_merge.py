@@ -0,0 +1,34 @@
+"""dataset row content hash for merge imports"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_dataset_row_merge"
+down_revision = "0007_audit_log_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Per-dataset merge-key indexes (``ix_dataset_rows_key_<id>``) are created at
+    # runtime by ``app.dataset_rows.ensure_merge_index``, not here.
+    with op.batch_alter_table("dataset_rows") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+
+
+def _merge_key_indexes(bind) -> list:
+    # Expression indexes are not reflected on every backend, so read the catalog directly.
+    if bind.dialect.name == "postgresql":
+        query = "SELECT indexname FROM pg_indexes WHERE tablename = 'dataset_rows'"
+    elif bind.dialect.name == "sqlite":
+        query = "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'dataset_rows'"
+    else:
+        return []
+    return [name for (name,) in bind.execute(sa.text(query)) if name.startswith("ix_dataset_rows_key_")]
+
+
+def downgrade() -> None:
+    for name in _merge_key_indexes(op.get_bind()):
+        op.drop_index(name, table_name="dataset_rows")
+    with op.batch_alter_table("dataset_rows") as batch_op:
+        batch_op.drop_column("content_hash")
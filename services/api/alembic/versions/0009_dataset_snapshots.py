@@ -0,0 +1,39 @@
+"""dataset snapshots"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_dataset_snapshots"
+down_revision = "0008_dataset_row_merge"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dataset_snapshots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("dataset_id", sa.Integer(), sa.ForeignKey("datasets.id"), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("mode", sa.String(length=8), nullable=False),
+        sa.Column("schema", sa.JSON(), nullable=False),
+        sa.Column("max_row_id", sa.Integer(), nullable=True),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_dataset_snapshots_dataset_id", "dataset_snapshots", ["dataset_id"])
+    op.create_index("ix_dataset_snapshots_dataset_name", "dataset_snapshots", ["dataset_id", "name"], unique=True)
+    op.create_table(
+        "dataset_snapshot_rows",
+        sa.Column("snapshot_id", sa.Integer(), sa.ForeignKey("dataset_snapshots.id"), primary_key=True),
+        sa.Column("row_id", sa.Integer(), primary_key=True),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("content_hash", sa.String(length=64), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("dataset_snapshot_rows")
+    op.drop_index("ix_dataset_snapshots_dataset_name", table_name="dataset_snapshots")
+    op.drop_index("ix_dataset_snapshots_dataset_id", table_name="dataset_snapshots")
+    op.drop_table("dataset_snapshots")
@@ -0,0 +1,33 @@
+"""materialized dataset row counts and sizes"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_dataset_counters"
+down_revision = "0009_dataset_snapshots"
+branch_labels = None
+depends_on = None
+
+_SIZE = {"postgresql": "octet_length(CAST(r.data AS text))"}
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("datasets") as batch_op:
+        batch_op.add_column(sa.Column("live_row_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("archived_row_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("approx_bytes", sa.BigInteger(), nullable=False, server_default="0"))
+
+    size = _SIZE.get(op.get_bind().dialect.name, "length(CAST(r.data AS text))")
+    op.execute(
+        "UPDATE datasets SET "
+        "live_row_count = (SELECT count(*) FROM dataset_rows r WHERE r.dataset_id = datasets.id AND r.archived = false), "
+        "archived_row_count = (SELECT count(*) FROM dataset_rows r WHERE r.dataset_id = datasets.id AND r.archived = true), "
+        f"approx_bytes = (SELECT coalesce(sum({size}), 0) FROM dataset_rows r WHERE r.dataset_id = datasets.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("datasets") as batch_op:
+        batch_op.drop_column("approx_bytes")
+        batch_op.drop_column("archived_row_count")
+        batch_op.drop_column("live_row_count")
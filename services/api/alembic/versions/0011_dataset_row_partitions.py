@@ -0,0 +1,83 @@
+"""optional list partitioning of dataset_rows by dataset (postgres)
+
+Only runs on Postgres with ``DATASET_ROW_PARTITIONING=list``; otherwise both
+directions are no-ops. To switch an existing deployment later, set the
+variable and run ``alembic downgrade 0010_dataset_counters && alembic upgrade
+head`` (the downgrade is a no-op on an unpartitioned table). The conversion
+rewrites every row, so run it in a maintenance window.
+"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    from services.api.app.partitions import partitioning_requested
+except ModuleNotFoundError:
+    from app.partitions import partitioning_requested
+
+revision = "0011_dataset_row_partitions"
+down_revision = "0010_dataset_counters"
+branch_labels = None
+depends_on = None
+
+_KEY_INDEXES = (
+    "SELECT indexname, indexdef FROM pg_indexes "
+    "WHERE tablename LIKE 'dataset\\_rows%' AND indexname LIKE 'ix\\_dataset\\_rows\\_key\\_%'"
+)
+_INDEX_TABLE = re.compile(r" ON (\S+\.)?dataset_rows(_p\d+)? ")
+
+
+def _is_partitioned(bind) -> bool:
+    query = "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('dataset_rows')"
+    return bind.execute(sa.text(query)).first() is not None
+
+
+def _key_indexes(bind) -> list:
+    # Per-dataset merge-key indexes are created at runtime; carry them over by definition.
+    return bind.execute(sa.text(_KEY_INDEXES)).all()
+
+
+def _finish_table(key_indexes, table_for, primary_key: str) -> None:
+    op.execute("ALTER SEQUENCE dataset_rows_id_seq OWNED BY dataset_rows.id")
+    op.execute(f"ALTER TABLE dataset_rows ADD CONSTRAINT dataset_rows_pkey PRIMARY KEY ({primary_key})")
+    op.execute(
+        "ALTER TABLE dataset_rows ADD CONSTRAINT dataset_rows_dataset_id_fkey "
+        "FOREIGN KEY (dataset_id) REFERENCES datasets (id)"
+    )
+    op.create_index("ix_dataset_rows_dataset_id", "dataset_rows", ["dataset_id"])
+    for name, definition in key_indexes:
+        table = table_for(int(name.rsplit("_", 1)[1]))
+        op.execute(_INDEX_TABLE.sub(f" ON {table} ", definition, count=1))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not partitioning_requested(bind.dialect.name):
+        return
+    if _is_partitioned(bind):
+        return
+    key_indexes = _key_indexes(bind)
+    op.execute("ALTER TABLE dataset_rows RENAME TO dataset_rows_plain")
+    op.execute("CREATE TABLE dataset_rows (LIKE dataset_rows_plain INCLUDING DEFAULTS) PARTITION BY LIST (dataset_id)")
+    for (dataset_id,) in bind.execute(sa.text("SELECT id FROM datasets ORDER BY id")).all():
+        op.execute(f"CREATE TABLE dataset_rows_p{dataset_id} PARTITION OF dataset_rows FOR VALUES IN ({dataset_id})")
+    op.execute("INSERT INTO dataset_rows SELECT * FROM dataset_rows_plain")
+    op.execute("ALTER SEQUENCE dataset_rows_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE dataset_rows_plain")
+    # A primary key on a partitioned table must include the partition key.
+    _finish_table(key_indexes, lambda dataset_id: f"dataset_rows_p{dataset_id}", "id, dataset_id")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not _is_partitioned(bind):
+        return
+    key_indexes = _key_indexes(bind)
+    op.execute("ALTER TABLE dataset_rows RENAME TO dataset_rows_partitioned")
+    op.execute("CREATE TABLE dataset_rows (LIKE dataset_rows_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO dataset_rows SELECT * FROM dataset_rows_partitioned")
+    op.execute("ALTER SEQUENCE dataset_rows_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE dataset_rows_partitioned")
+    _finish_table(key_indexes, lambda dataset_id: "dataset_rows", "id")
@@ -0,0 +1,38 @@
+"""initial schema fixes: snippet and membership unique keys, is_archived default
+
+Revision 0001 is kept as released. It adds its unique constraints with ALTER,
+which SQLite rejects, and gives ``snippets.is_archived`` an integer default,
+which Postgres rejects for a boolean, so new databases are built from the
+models and stamped instead (see ``create_new_database``). This revision brings
+databases that have a history to the same state: both unique constraints
+exist, and ``is_archived`` defaults to false on the server.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0012_initial_schema_fixes"
+down_revision = "0011_dataset_row_partitions"
+branch_labels = None
+depends_on = None
+
+_UNIQUE = (
+    ("memberships", "uq_memberships_user_workspace", ["user_id", "workspace_id"]),
+    ("snippets", "uq_snippets_workspace_trigger", ["workspace_id", "trigger"]),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, name, columns in _UNIQUE:
+        if name not in {constraint["name"] for constraint in inspector.get_unique_constraints(table)}:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.create_unique_constraint(name, columns)
+    with op.batch_alter_table("snippets") as batch_op:
+        batch_op.alter_column("is_archived", existing_type=sa.Boolean(), existing_nullable=False, server_default=sa.false())
+
+
+def downgrade() -> None:
+    # The unique constraints stay: 0001 declares them, so they predate this revision.
+    with op.batch_alter_table("snippets") as batch_op:
+        batch_op.alter_column("is_archived", existing_type=sa.Boolean(), existing_nullable=False, server_default=None)
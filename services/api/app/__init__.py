@@ -1,5 +1,12 @@
 """Public datasets API package."""
 
-__all__ = ['app']
+__all__ = ['app', 'create_app']
 
-from .main import app
+
+def __getattr__(name: str):
+    # Import lazily so `from services.api.app import models` does not build the app.
+    if name in __all__:
+        from . import main
+
+        return getattr(main, name)
+    raise AttributeError(name)
@@ -0,0 +1,136 @@
+"""Workspace-scoped API keys for machine clients.
+
+Keys look like ``oak_<prefix>_<secret>``. Only the SHA-256 of the full key is
+stored; the public prefix is indexed so verification is one indexed probe,
+after which the verified row is cached by prefix and every request is
+checked with a constant-time hash comparison.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .cache import MISSING, LRUCache
+from .config import settings
+from .models import ApiKey
+
+KEY_SCHEME = "oak"
+API_KEY_ROLES = ("editor", "viewer")
+
+
+def hash_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def generate_key() -> Tuple[str, str]:
+    """Return ``(prefix, token)`` for a new key."""
+
+    prefix = secrets.token_hex(6)
+    return prefix, f"{KEY_SCHEME}_{prefix}_{secrets.token_urlsafe(32)}"
+
+
+def is_api_key(token: str) -> bool:
+    return token.startswith(f"{KEY_SCHEME}_")
+
+
+@dataclass(frozen=True)
+class VerifiedKey:
+    id: int
+    workspace_id: int
+    name: str
+    role: str
+    token_hash: str
+    created_by: Optional[int]
+    rate_limit_per_minute: int
+
+
+class RateLimiter:
+    """In-process token bucket per API key."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+
+    def allow(self, key_id: int, per_minute: int) -> bool:
+        now = time.monotonic()
+        rate = per_minute / 60.0
+        with self._lock:
+            tokens, updated = self._buckets.get(key_id, (float(per_minute), now))
+            tokens = min(float(per_minute), tokens + (now - updated) * rate)
+            if tokens < 1.0:
+                self._buckets[key_id] = (tokens, now)
+                return False
+            self._buckets[key_id] = (tokens - 1.0, now)
+            return True
+
+    def reset(self, key_id: Optional[int] = None) -> None:
+        with self._lock:
+            if key_id is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key_id, None)
+
+
+_verified = LRUCache(maxsize=10_000, ttl=settings.auth_cache_ttl_seconds)
+rate_limiter = RateLimiter()
+
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+
+
+def verify_api_key(db: Session, token: str) -> VerifiedKey:
+    """Return the verified key for ``token`` or raise 401/429."""
+
+    parts = token.split("_", 2)
+    if len(parts) != 3 or parts[0] != KEY_SCHEME:
+        raise _unauthorized()
+    prefix = parts[1]
+
+    key = _verified.get(prefix)
+    if key is MISSING:
+        row = db.execute(
+            select(ApiKey).where(ApiKey.prefix == prefix, ApiKey.revoked_at.is_(None))
+        ).scalar_one_or_none()
+        if row is None:
+            raise _unauthorized()
+        key = VerifiedKey(
+            id=row.id,
+            workspace_id=row.workspace_id,
+            name=row.name,
+            role=row.role,
+            token_hash=row.token_hash,
+            created_by=row.created_by,
+            rate_limit_per_minute=row.rate_limit_per_minute or settings.api_key_rate_limit_per_minute,
+        )
+        _verified.set(prefix, key)
+
+    if not hmac.compare_digest(hash_key(token), key.token_hash):
+        raise _unauthorized()
+    if not rate_limiter.allow(key.id, key.rate_limit_per_minute):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="API key rate limit exceeded",
+            headers={"Retry-After": str(max(1, int(60 / key.rate_limit_per_minute)))},
+        )
+    return key
+
+
+def forget_api_key(prefix: Optional[str]) -> None:
+    if prefix:
+        _verified.pop(prefix)
+
+
+def clear_api_key_cache() -> None:
+    _verified.clear()
+    rate_limiter.reset()
@@ -0,0 +1,298 @@
+"""Append-only audit log pipeline.
+
+Handlers call :func:`record_audit` inside their transaction. In ``sync`` mode
+(or whenever the background writer is not running) the row is simply added
+to the caller's session, exactly as before. In ``batched`` mode the event is
+held on the session and only enqueued once that session commits, so rolled
+back work never produces audit rows; a writer thread drains the queue with
+bulk inserts every ``AUDIT_FLUSH_INTERVAL_SECONDS`` or ``AUDIT_BATCH_SIZE``
+events, whichever comes first.
+
+When the queue is full, ``AUDIT_OVERFLOW`` picks the back-pressure policy:
+``sync`` writes the overflow batch directly (durable, slower), ``block``
+waits for space for at most ``AUDIT_BLOCK_TIMEOUT_SECONDS`` per commit before
+falling back to ``sync``, and ``drop`` discards the events and counts them.
+
+Rows older than ``AUDIT_RETENTION_DAYS`` can be moved to
+``audit_logs_archive`` with :func:`archive_audit_logs` so the hot table stays
+small enough for index-only browsing.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, event, func, insert, literal_column, select
+from sqlalchemy.orm import Session, SessionTransaction
+
+from .config import settings
+from .metrics import AUDIT_EVENTS, AUDIT_FLUSH_LATENCY, AUDIT_QUEUE_DEPTH
+from .models import AuditLog, AuditLogArchive
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "audit_pending"
+
+# Meta keys that can be filtered on; each has an expression index (migration 0007).
+META_FILTER_KEYS = ("dataset_id", "snippet_id")
+
+
+class AuditWriter:
+    """Background thread that writes queued audit events in batches."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        *,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        overflow: str = "sync",
+        block_timeout: float = 0.1,
+    ) -> None:
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the thread after flushing everything already queued."""
+
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._drain()
+
+    def enqueue(self, events: List[Dict[str, Any]]) -> None:
+        overflow: List[Dict[str, Any]] = []
+        # Runs on the request thread after its commit, so "block" waits at most block_timeout for the whole batch.
+        deadline = time.monotonic() + self.block_timeout
+        for item in events:
+            try:
+                remaining = deadline - time.monotonic()
+                if self.overflow == "block" and remaining > 0 and not overflow:
+                    self._queue.put(item, timeout=remaining)
+                else:
+                    self._queue.put_nowait(item)
+            except queue.Full:
+                overflow.append(item)
+        AUDIT_QUEUE_DEPTH.set(self._queue.qsize())
+        if not overflow:
+            return
+        if self.overflow == "drop":
+            AUDIT_EVENTS.labels(outcome="dropped").inc(len(overflow))
+            logger.warning("audit_events_dropped", extra={"count": len(overflow)})
+        else:
+            self._write(overflow, outcome="overflow_sync")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.25)))
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+        AUDIT_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    def _drain(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+        AUDIT_QUEUE_DEPTH.set(0)
+
+    def _write(self, batch: List[Dict[str, Any]], outcome: str = "written") -> None:
+        started = time.perf_counter()
+        session = self.session_factory()
+        try:
+            session.execute(insert(AuditLog), batch)
+            session.commit()
+            AUDIT_EVENTS.labels(outcome=outcome).inc(len(batch))
+        except Exception:
+            session.rollback()
+            AUDIT_EVENTS.labels(outcome="failed").inc(len(batch))
+            logger.exception("audit_batch_write_failed", extra={"count": len(batch)})
+        finally:
+            session.close()
+            AUDIT_FLUSH_LATENCY.observe(time.perf_counter() - started)
+
+
+def _default_writer() -> AuditWriter:
+    from .database import SessionLocal
+
+    return AuditWriter(
+        SessionLocal,
+        max_queue=settings.audit_queue_size,
+        batch_size=settings.audit_batch_size,
+        flush_interval=settings.audit_flush_interval_seconds,
+        overflow=settings.audit_overflow,
+        block_timeout=settings.audit_block_timeout_seconds,
+    )
+
+
+audit_writer = _default_writer()
+
+
+def record_audit(
+    db: Session,
+    *,
+    action: str,
+    workspace_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    api_key_id: Optional[int] = None,
+) -> None:
+    """Record an audit event as part of ``db``'s current transaction.
+
+    Pass ``api_key_id`` when the caller authenticated with an API key; the
+    event is then attributed to the key's creator and tagged with the key.
+    """
+
+    if api_key_id is not None:
+        meta = {**(meta or {}), "via_api_key_id": api_key_id}
+
+    if settings.audit_mode != "batched" or not audit_writer.running:
+        db.add(AuditLog(workspace_id=workspace_id, user_id=user_id, action=action, meta=meta))
+        return
+    if not db.in_transaction():
+        # Start the (lazy) transaction now so a rollback without any other
+        # work in between still discards the event.
+        db.begin()
+    # Tagged with the innermost savepoint so rolling that savepoint back discards just its events.
+    db.info.setdefault(_PENDING_KEY, []).append(
+        (
+            db.get_nested_transaction(),
+            {
+                "workspace_id": workspace_id,
+                "user_id": user_id,
+                "action": action,
+                "meta": meta,
+                "created_at": datetime.utcnow(),
+            },
+        )
+    )
+
+
+def _within(savepoint: Optional[SessionTransaction], transaction: SessionTransaction) -> bool:
+    while savepoint is not None:
+        if savepoint is transaction:
+            return True
+        savepoint = savepoint.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed(session: Session) -> None:
+    if session.in_nested_transaction():
+        # Releasing a savepoint also fires after_commit; wait for the outermost commit.
+        return
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        audit_writer.enqueue([item for _, item in pending])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction: SessionTransaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+        return
+    pending = session.info.get(_PENDING_KEY)
+    if pending:
+        pending[:] = [(savepoint, item) for savepoint, item in pending if not _within(savepoint, previous_transaction)]
+
+
+def meta_field(column: Any, key: str, dialect: str) -> Any:
+    """Return the SQL expression for ``meta[key]`` matching the expression index.
+
+    The key is inlined rather than bound so the planner can use the index.
+    """
+
+    if key not in META_FILTER_KEYS:
+        raise ValueError(f"Unsupported audit meta key: {key}")
+    if dialect == "postgresql":
+        return column.op("->>")(literal_column(f"'{key}'"))
+    return func.json_extract(column, literal_column(f"'$.{key}'"))
+
+
+def meta_value(value: int, dialect: str) -> Any:
+    # ``->>`` yields text on Postgres while SQLite's json_extract keeps the JSON type.
+    return str(value) if dialect == "postgresql" else value
+
+
+_ARCHIVE_COLUMNS = ("id", "workspace_id", "user_id", "action", "meta", "created_at")
+
+
+def archive_audit_logs(
+    db: Session,
+    *,
+    older_than_days: Optional[int] = None,
+    workspace_id: Optional[int] = None,
+    batch_size: int = 5000,
+) -> int:
+    """Move audit rows past the retention window to the archive table.
+
+    Rows are copied with ``INSERT ... SELECT`` and deleted by primary key in
+    batches, committing per batch. Returns the number of rows archived.
+    """
+
+    days = settings.audit_retention_days if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = 0
+    while True:
+        query = select(AuditLog.id).where(AuditLog.created_at < cutoff)
+        if workspace_id is not None:
+            query = query.where(AuditLog.workspace_id == workspace_id)
+        ids = list(db.scalars(query.order_by(AuditLog.id).limit(batch_size)))
+        if not ids:
+            break
+        columns = [getattr(AuditLog, name) for name in _ARCHIVE_COLUMNS]
+        db.execute(
+            insert(AuditLogArchive).from_select(list(_ARCHIVE_COLUMNS), select(*columns).where(AuditLog.id.in_(ids)))
+        )
+        db.execute(delete(AuditLog).where(AuditLog.id.in_(ids)))
+        db.commit()
+        archived += len(ids)
+    if archived:
+        logger.info("audit_logs_archived", extra={"count": archived, "workspace_id": workspace_id})
+    return archived
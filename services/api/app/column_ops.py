@@ -0,0 +1,281 @@
+"""Set-based column operations over ``DatasetRow.data``.
+
+Rename, drop, retype and fill each compile to one ``UPDATE dataset_rows``
+statement that rewrites the JSON inside the database (``jsonb`` operators on
+Postgres, ``json_set``/``json_remove`` on SQLite). The statement runs over
+primary-key ranges of ``COLUMN_OP_CHUNK_ROWS`` rows, committing after each
+range, so a large dataset is rewritten in short transactions by a background
+job instead of by clients re-sending every row. Rewritten rows get a NULL
+``content_hash``, and copy-on-write snapshots capture each range first. The
+dataset schema is updated once the last range commits.
+
+Each job records ``next_id``, the first row id not yet rewritten. A job that
+fails partway (or whose schema change no longer applies once the rows are
+done) leaves the schema untouched and can be resumed from ``next_id``; every
+operation is idempotent on rows it already rewrote.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from .dataset_snapshots import capture_rows
+from .models_datasets import DatasetRow
+
+OPERATIONS = ("rename", "drop", "retype", "fill")
+COLUMN_TYPES = ("string", "number", "boolean")
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+_NUMBER_PATTERN = r"^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$"
+_TRUE_WORDS = "('true', 't', 'yes', 'y', '1')"
+_FALSE_WORDS = "('false', 'f', 'no', 'n', '0')"
+
+
+class ColumnOpError(ValueError):
+    """Raised for an operation that cannot be applied to the dataset schema."""
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ColumnOp:
+    op: str
+    key: str
+    new_key: Optional[str] = None
+    type: Optional[str] = None
+    value: Any = None
+    only_missing: bool = True
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "path": _json_path(self.key),
+            "new_key": self.new_key,
+            "new_path": _json_path(self.new_key) if self.new_key else None,
+            "value": json.dumps(self.value),
+        }
+
+
+def _json_path(key: str) -> str:
+    return f'$."{key}"'
+
+
+def _check_key(key: str) -> str:
+    key = (key or "").strip()
+    # Keys end up in JSON paths, where quotes and backslashes cannot be expressed.
+    if not key or key == "id" or len(key) > 128 or any(char in key for char in "\"\\") or not key.isprintable():
+        raise ColumnOpError(f"Unsupported column key: {key!r}")
+    return key
+
+
+def plan_schema(schema: Dict[str, Any], op: ColumnOp) -> Dict[str, Any]:
+    """Validate ``op`` against ``schema`` and return the schema it produces."""
+
+    op.key = _check_key(op.key)
+    columns = [dict(col) for col in schema.get("columns", [])]
+    index = next((i for i, col in enumerate(columns) if col.get("key") == op.key), None)
+    if op.key in (schema.get("merge_keys") or []):
+        raise ColumnOpError("Column is a merge key", status_code=409)
+
+    if op.op == "fill":
+        if index is None:
+            columns.append({"key": op.key, "type": "string"})
+        return {**schema, "columns": columns}
+    if index is None:
+        raise ColumnOpError("Column not found", status_code=404)
+    if op.op == "rename":
+        op.new_key = _check_key(op.new_key or "")
+        if any(col.get("key") == op.new_key for col in columns):
+            raise ColumnOpError("Column already exists", status_code=409)
+        columns[index]["key"] = op.new_key
+    elif op.op == "drop":
+        columns.pop(index)
+    elif op.op == "retype":
+        if op.type not in COLUMN_TYPES:
+            raise ColumnOpError(f"Unsupported column type: {op.type!r}")
+        columns[index]["type"] = op.type
+    return {**schema, "columns": columns}
+
+
+def _postgres_update(op: ColumnOp) -> Tuple[str, str]:
+    doc = "data::jsonb"
+    # psycopg sends untyped parameters, which jsonb_build_object cannot resolve.
+    key, new_key = "CAST(:key AS text)", "CAST(:new_key AS text)"
+    cell = f"({doc} -> {key})"
+    cell_text = f"btrim({doc} ->> {key})"
+    if op.op == "rename":
+        return f"(({doc} - {key}) || jsonb_build_object({new_key}, {cell}))::json", f"jsonb_exists({doc}, {key})"
+    if op.op == "drop":
+        return f"({doc} - {key})::json", f"jsonb_exists({doc}, {key})"
+    if op.op == "fill":
+        where = f"jsonb_exists({doc}, {key}) IS NOT TRUE OR {cell} = 'null'::jsonb OR {doc} ->> {key} = ''"
+        return f"({doc} || jsonb_build_object({key}, CAST(:value AS jsonb)))::json", (where if op.only_missing else "TRUE")
+    if op.type == "string":
+        converted = f"to_jsonb({doc} ->> {key})"
+        where = f"jsonb_typeof({cell}) NOT IN ('string', 'null')"
+    elif op.type == "number":
+        converted = (
+            f"CASE WHEN {cell_text} ~ '{_NUMBER_PATTERN}' THEN to_jsonb(CAST({cell_text} AS numeric)) "
+            "ELSE 'null'::jsonb END"
+        )
+        where = f"jsonb_typeof({cell}) NOT IN ('number', 'null')"
+    else:
+        converted = (
+            f"CASE WHEN lower({cell_text}) IN {_TRUE_WORDS} THEN 'true'::jsonb "
+            f"WHEN lower({cell_text}) IN {_FALSE_WORDS} THEN 'false'::jsonb ELSE 'null'::jsonb END"
+        )
+        where = f"jsonb_typeof({cell}) NOT IN ('boolean', 'null')"
+    return f"({doc} || jsonb_build_object({key}, {converted}))::json", where
+
+
+def _sqlite_update(op: ColumnOp) -> Tuple[str, str]:
+    kind = "json_type(data, :path)"
+    cell = "json_extract(data, :path)"
+    # json_extract returns objects/arrays as plain text; json() restores them as JSON.
+    moved = f"CASE WHEN {kind} IN ('object', 'array') THEN json({cell}) ELSE {cell} END"
+    if op.op == "rename":
+        return f"json_remove(json_set(data, :new_path, {moved}), :path)", f"{kind} IS NOT NULL"
+    if op.op == "drop":
+        return "json_remove(data, :path)", f"{kind} IS NOT NULL"
+    if op.op == "fill":
+        where = f"{kind} IS NULL OR {kind} = 'null' OR {cell} = ''"
+        return "json_set(data, :path, json(:value))", (where if op.only_missing else "1 = 1")
+    trimmed = f"trim({cell})"
+    if op.type == "string":
+        converted = f"CASE WHEN {kind} IN ('true', 'false') THEN {kind} ELSE CAST({cell} AS TEXT) END"
+        where = f"{kind} NOT IN ('text', 'null')"
+    elif op.type == "number":
+        converted = (
+            f"CASE WHEN {trimmed} <> '' AND {trimmed} NOT GLOB '*[^0-9.eE+-]*' AND {trimmed} GLOB '*[0-9]*' "
+            f"THEN CAST({trimmed} AS NUMERIC) ELSE NULL END"
+        )
+        where = f"{kind} NOT IN ('integer', 'real', 'null')"
+    else:
+        converted = (
+            f"CASE WHEN lower({trimmed}) IN {_TRUE_WORDS} THEN json('true') "
+            f"WHEN lower({trimmed}) IN {_FALSE_WORDS} THEN json('false') ELSE NULL END"
+        )
+        where = f"{kind} NOT IN ('true', 'false', 'null')"
+    return f"json_set(data, :path, {converted})", where
+
+
+def build_update(op: ColumnOp, dialect: str):
+    if dialect not in SUPPORTED_DIALECTS:
+        raise ColumnOpError(f"Column operations are not supported on {dialect}", status_code=501)
+    new_data, where = (_postgres_update if dialect == "postgresql" else _sqlite_update)(op)
+    return text(
+        f"UPDATE dataset_rows SET data = {new_data}, content_hash = NULL "
+        f"WHERE dataset_id = :dataset_id AND id >= :low AND id < :high AND ({where})"
+    )
+
+
+def apply_column_op(
+    db: Session,
+    dataset_id: int,
+    op: ColumnOp,
+    chunk_rows: int,
+    on_progress: Optional[Callable[[int, int, int], None]] = None,
+    start_id: Optional[int] = None,
+) -> int:
+    """Rewrite every row of the dataset (archived rows included), committing per id range.
+
+    Starts at ``start_id`` when resuming. Returns the number of rows changed;
+    ``on_progress(rows_changed, ranges_done, next_id)`` runs after each commit.
+    """
+
+    statement = build_update(op, db.get_bind().dialect.name)
+    low, high = db.execute(
+        select(func.min(DatasetRow.id), func.max(DatasetRow.id)).where(DatasetRow.dataset_id == dataset_id)
+    ).one()
+    changed = ranges = 0
+    if low is None:
+        return 0
+    if start_id is not None:
+        low = max(low, start_id)
+    params = {**op.params(), "dataset_id": dataset_id}
+    for start in range(low, high + 1, chunk_rows):
+        capture_rows(db, dataset_id, id_range=(start, start + chunk_rows))
+        result = db.execute(statement, {**params, "low": start, "high": start + chunk_rows})
+        db.commit()
+        changed += result.rowcount or 0
+        ranges += 1
+        if on_progress:
+            on_progress(changed, ranges, start + chunk_rows)
+    return changed
+
+
+@dataclass
+class ColumnJob:
+    id: str
+    dataset_id: int
+    op: str
+    key: str
+    status: str = "pending"  # pending|running|succeeded|failed
+    rows_changed: int = 0
+    ranges_done: int = 0
+    # First row id not yet rewritten; a failed job resumes from here.
+    next_id: Optional[int] = None
+    schema_updated: bool = False
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    spec: Optional[ColumnOp] = field(default=None, repr=False)
+
+    @property
+    def resumable(self) -> bool:
+        return self.status == "failed" and self.spec is not None
+
+    def as_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        payload.pop("spec")
+        payload["resumable"] = self.resumable
+        payload["created_at"] = self.created_at.isoformat() + "Z"
+        payload["finished_at"] = self.finished_at.isoformat() + "Z" if self.finished_at else None
+        return payload
+
+
+class ColumnJobRegistry:
+    """Bounded in-process registry of column jobs; one running job per dataset."""
+
+    def __init__(self, max_jobs: int = 200) -> None:
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ColumnJob] = {}
+        self._active: Dict[int, str] = {}
+        self._max_jobs = max_jobs
+
+    def start(self, dataset_id: int, op: ColumnOp, start_id: Optional[int] = None) -> Optional[ColumnJob]:
+        """Register a job, or return ``None`` if the dataset already has one running."""
+
+        with self._lock:
+            if dataset_id in self._active:
+                return None
+            job = ColumnJob(id=uuid.uuid4().hex, dataset_id=dataset_id, op=op.op, key=op.key, next_id=start_id, spec=op)
+            self._jobs[job.id] = job
+            self._active[dataset_id] = job.id
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.pop(next(iter(self._jobs)))
+            return job
+
+    def finish(self, job: ColumnJob, error: Optional[str] = None) -> None:
+        with self._lock:
+            job.status = "failed" if error else "succeeded"
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            self._active.pop(job.dataset_id, None)
+
+    def get(self, job_id: str) -> Optional[ColumnJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+column_jobs = ColumnJobRegistry()
@@ -10,8 +10,35 @@ class Settings(BaseSettings):
 
     environment: str = Field(default="development", alias="ENVIRONMENT")
     db_url: str = Field(default="sqlite:///./dev.db", alias="DB_URL")
+    db_replica_url: str | None = Field(default=None, alias="DB_REPLICA_URL")  # read replica for GET routes
+    db_replica_max_lag_seconds: float = Field(default=5.0, alias="DB_REPLICA_MAX_LAG_SECONDS")
+    db_replica_lag_check_seconds: float = Field(default=1.0, alias="DB_REPLICA_LAG_CHECK_SECONDS")
+    db_replica_connect_timeout_seconds: int = Field(default=2, alias="DB_REPLICA_CONNECT_TIMEOUT_SECONDS")
     jwt_secret: str = Field(default="dev-secret", alias="JWT_SECRET")
     jwt_algorithm: str = Field(default="HS256", alias="JWT_ALGORITHM")
+    auto_create_schema: bool = Field(default=True, alias="AUTO_CREATE_SCHEMA")
+    auth_cache_ttl_seconds: float = Field(default=30.0, alias="AUTH_CACHE_TTL_SECONDS")
+    auth_role_claims: bool = Field(default=False, alias="AUTH_ROLE_CLAIMS")
+    auth_role_claims_ttl_seconds: int = Field(default=900, alias="AUTH_ROLE_CLAIMS_TTL_SECONDS")
+    api_key_rate_limit_per_minute: int = Field(default=600, alias="API_KEY_RATE_LIMIT_PER_MINUTE")
+    audit_mode: str = Field(default="batched", alias="AUDIT_MODE")  # batched|sync
+    audit_overflow: str = Field(default="sync", alias="AUDIT_OVERFLOW")  # sync|block|drop
+    audit_block_timeout_seconds: float = Field(default=0.1, alias="AUDIT_BLOCK_TIMEOUT_SECONDS")
+    audit_queue_size: int = Field(default=10_000, alias="AUDIT_QUEUE_SIZE")
+    audit_batch_size: int = Field(default=500, alias="AUDIT_BATCH_SIZE")
+    audit_flush_interval_seconds: float = Field(default=1.0, alias="AUDIT_FLUSH_INTERVAL_SECONDS")
+    audit_retention_days: int = Field(default=90, alias="AUDIT_RETENTION_DAYS")
+    ws_send_timeout_seconds: float = Field(default=5.0, alias="WS_SEND_TIMEOUT_SECONDS")
+    ws_op_batch_max: int = Field(default=200, alias="WS_OP_BATCH_MAX")  # inbound ops applied per commit
+    admin_token: str | None = Field(default=None, alias="ADMIN_TOKEN")
+    dataset_cache_url: str | None = Field(default=None, alias="DATASET_CACHE_URL")  # e.g. redis://localhost:6379/0
+    dataset_cache_ttl_seconds: float = Field(default=30.0, alias="DATASET_CACHE_TTL_SECONDS")
+    column_op_chunk_rows: int = Field(default=5000, alias="COLUMN_OP_CHUNK_ROWS")
+    row_json_passthrough: bool = Field(default=True, alias="ROW_JSON_PASSTHROUGH")
+    slow_query_ms: float = Field(default=0.0, alias="SLOW_QUERY_MS")  # 0 disables the slow-query log
+    profile_sample_rate: float = Field(default=0.0, alias="PROFILE_SAMPLE_RATE")
+    profile_dir: str = Field(default="/tmp/api-profiles", alias="PROFILE_DIR")
+    profile_interval_ms: float = Field(default=5.0, alias="PROFILE_INTERVAL_MS")
 
     @property
     def is_postgres(self) -> bool:
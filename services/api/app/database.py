@@ -1,16 +1,124 @@
-"""Database session and engine configuration."""
+"""Database session and engine configuration.
 
+Writes always go to ``DB_URL``. When ``DB_REPLICA_URL`` is set, GET routes
+take their session from :func:`get_read_db`, which reads from the replica
+unless that would return stale data:
+
+* the replica's replay lag (checked in the background at most every
+  ``DB_REPLICA_LAG_CHECK_SECONDS``) exceeds ``DB_REPLICA_MAX_LAG_SECONDS``, or
+  the replica cannot be reached, including when its session fails to connect;
+* the caller wrote more recently than the replica's lag. Successful writes
+  return their time in the ``X-Last-Write`` header and ``last_write`` cookie
+  (see :class:`~.middleware.LastWriteMiddleware`), and the client sends either
+  one back on later reads. This gives read-your-writes consistency.
+"""
+
+import logging
+import threading
+import time
 from contextlib import contextmanager
+from typing import Optional, Tuple
 
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 
 from .config import settings
+from .metrics import DB_READ_SESSIONS
+
+logger = logging.getLogger(__name__)
+
+LAST_WRITE_HEADER = "x-last-write"
+LAST_WRITE_COOKIE = "last_write"
+# ``Session.info`` flags set by :func:`get_read_db` for caches that must not serve stale reads.
+READ_REPLICA = "read_replica"
+READ_AFTER_WRITE = "read_after_write"
 
 connect_args = {"check_same_thread": False} if settings.db_url.startswith("sqlite") else {}
 engine = create_engine(settings.db_url, connect_args=connect_args, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+replica_engine = (
+    create_engine(
+        settings.db_replica_url,
+        connect_args=(
+            {"check_same_thread": False}
+            if settings.db_replica_url.startswith("sqlite")
+            else {"connect_timeout": settings.db_replica_connect_timeout_seconds}
+        ),
+        # A dead replica is then noticed at checkout, where get_read_db can still fall back.
+        pool_pre_ping=True,
+        future=True,
+    )
+    if settings.db_replica_url
+    else None
+)
+ReplicaSessionLocal = (
+    sessionmaker(bind=replica_engine, autoflush=False, autocommit=False, future=True) if replica_engine is not None else None
+)
+
+# Zero when the standby has replayed everything it received, so an idle primary does not read as lag.
+_PG_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaLag:
+    """Replica replay lag in seconds, re-measured in the background at most once per ``interval``.
+
+    Readers never wait on the replica: :meth:`seconds` returns the last
+    measurement and starts a refresh thread when it is older than ``interval``.
+    ``None`` means unavailable: not measured yet, unreachable, or a check has
+    been in flight for longer than ``interval``.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._started_at: Optional[float] = None
+        self._seconds: Optional[float] = None
+
+    def _measure(self) -> Optional[float]:
+        if replica_engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with replica_engine.connect() as conn:
+                return float(conn.execute(_PG_REPLICA_LAG).scalar() or 0.0)
+        except Exception:
+            logger.warning("replica_lag_check_failed", exc_info=True)
+            return None
+
+    def _refresh(self) -> None:
+        seconds = self._measure()
+        with self._lock:
+            self._seconds = seconds
+            self._checked_at = time.monotonic()
+            self._started_at = None
+
+    def mark_unavailable(self) -> None:
+        """Route reads to the primary until the next check."""
+
+        with self._lock:
+            self._seconds = None
+            self._checked_at = time.monotonic()
+
+    def seconds(self) -> Optional[float]:
+        with self._lock:
+            now = time.monotonic()
+            if self._started_at is not None:
+                # A check still connecting after a whole interval means the replica is not answering.
+                return None if now - self._started_at > self.interval else self._seconds
+            if now - self._checked_at >= self.interval:
+                self._started_at = now
+                threading.Thread(target=self._refresh, name="replica-lag", daemon=True).start()
+            return self._seconds
+
+
+replica_lag = ReplicaLag(settings.db_replica_lag_check_seconds)
+
 
 def get_db():
     """FastAPI dependency that yields a database session."""
@@ -22,6 +130,96 @@ def get_db():
         db.close()
 
 
+def get_session_factory() -> sessionmaker:
+    """FastAPI dependency for long-lived handlers (WebSockets) that open one session per unit of work."""
+
+    return SessionLocal
+
+
+def _last_write(request: Request) -> Optional[float]:
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _read_target(request: Request) -> Tuple[str, str]:
+    if ReplicaSessionLocal is None:
+        return "primary", "no_replica"
+    lag = replica_lag.seconds()
+    if lag is None:
+        return "primary", "replica_unavailable"
+    if lag > settings.db_replica_max_lag_seconds:
+        return "primary", "replica_lagging"
+    last_write = _last_write(request)
+    # The lag may have grown since it was measured, so allow one more check interval.
+    if last_write is not None and time.time() - last_write <= lag + replica_lag.interval:
+        return "primary", "recent_write"
+    return "replica", "ok"
+
+
+def get_read_db(request: Request):
+    """FastAPI dependency for read-only routes: a replica session when it is fresh enough, else the primary."""
+
+    target, reason = _read_target(request)
+    db = None
+    if target == "replica":
+        db = ReplicaSessionLocal()
+        try:
+            # Check out (and ping) the connection now, so a dead replica falls back here instead of failing the route.
+            db.connection()
+        except OperationalError:
+            logger.warning("replica_connect_failed", exc_info=True)
+            db.close()
+            db = None
+            replica_lag.mark_unavailable()
+            target, reason = "primary", "replica_unavailable"
+    if db is None:
+        db = SessionLocal()
+    DB_READ_SESSIONS.labels(target=target, reason=reason).inc()
+    db.info[READ_REPLICA] = target == "replica"
+    db.info[READ_AFTER_WRITE] = reason == "recent_write"
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def init_db(bind=None) -> None:
+    """Create any missing tables. Called explicitly at startup, never on import."""
+
+    from .models import Base
+
+    Base.metadata.create_all(bind=bind or engine)
+
+
+def create_new_database(alembic_ini: str = "alembic.ini") -> bool:
+    """Build an empty database from the models and stamp it at the latest revision.
+
+    Revision 0001 does not run on Postgres or SQLite and stays as released, so
+    new databases skip the history, as Alembic recommends for building one from
+    scratch; ``alembic upgrade head`` then only has to migrate existing ones.
+    With ``DATASET_ROW_PARTITIONING=list`` on Postgres, the new ``dataset_rows``
+    is converted right away. Returns whether the database was new.
+    """
+
+    from alembic import command
+    from alembic.config import Config
+
+    from .partitions import partitioning_requested
+
+    if inspect(engine).get_table_names():
+        return False
+    init_db()
+    config = Config(alembic_ini)
+    command.stamp(config, "head")
+    if partitioning_requested(engine.dialect.name):
+        command.downgrade(config, "0010_dataset_counters")
+        command.upgrade(config, "head")
+    return True
+
+
 @contextmanager
 def session_scope():
     """Provide a transactional scope around a series of operations."""
@@ -0,0 +1,148 @@
+"""Apache Arrow IPC and Parquet conversion for dataset import/export.
+
+Requires the optional ``pyarrow`` package; callers check
+:func:`arrow_available` and report the format as unsupported otherwise.
+
+Imports read record batches and convert each one with a single vectorized
+``to_pylist`` call. Values JSON cannot hold (timestamps, decimals, binary) are
+cast to strings first. Exports build one record batch per chunk of rows, with
+an ``id`` column followed by the ``Dataset.schema`` columns in order, and yield
+the encoded bytes as soon as each batch is written.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+try:  # Optional dependency.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pc = pq = None
+
+FORMATS = ("parquet", "arrow")
+EXTENSIONS = {".parquet": "parquet", ".arrow": "arrow", ".arrows": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.stream"}
+FILE_SUFFIXES = {"parquet": "parquet", "arrow": "arrows"}
+BATCH_ROWS = 5000
+
+RowItem = Tuple[int, Mapping[str, Any]]
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def format_for_filename(filename: str) -> str | None:
+    for suffix, fmt in EXTENSIONS.items():
+        if filename.endswith(suffix):
+            return fmt
+    return None
+
+
+def _json_safe(batch: "pa.RecordBatch") -> "pa.RecordBatch":
+    columns = []
+    for column in batch.columns:
+        kind = column.type
+        if pa.types.is_temporal(kind) or pa.types.is_decimal(kind):
+            column = pc.cast(column, pa.string())
+        elif pa.types.is_binary(kind) or pa.types.is_large_binary(kind) or pa.types.is_fixed_size_binary(kind):
+            column = pa.array([None if value is None else value.hex() for value in column.to_pylist()], pa.string())
+        elif pa.types.is_dictionary(kind):
+            column = column.dictionary_decode()
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def _source_batches(raw: bytes, fmt: str) -> Tuple[List[str], Iterable["pa.RecordBatch"]]:
+    if fmt == "parquet":
+        parquet = pq.ParquetFile(io.BytesIO(raw))
+        return parquet.schema_arrow.names, parquet.iter_batches(batch_size=BATCH_ROWS)
+    try:
+        reader = pa.ipc.open_file(pa.BufferReader(raw))
+        return reader.schema.names, (reader.get_batch(index) for index in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        # Not the random-access file format; fall back to the streaming format.
+        stream = pa.ipc.open_stream(pa.BufferReader(raw))
+        return stream.schema.names, stream
+
+
+def read_batches(raw: bytes, fmt: str) -> Tuple[List[str], List[List[Dict[str, Any]]]]:
+    """Return the column names and the rows of ``raw`` as lists of dicts, one list per record batch.
+
+    An ``id`` column is dropped so imported rows always get fresh ids.
+    """
+
+    names, batches = _source_batches(raw, fmt)
+    columns = [name for name in names if name != "id"]
+    rows = []
+    for batch in batches:
+        if "id" in batch.schema.names:
+            batch = batch.drop_columns(["id"])
+        if batch.num_rows:
+            rows.append(_json_safe(batch).to_pylist())
+    return columns, rows
+
+
+def _cell(value: Any) -> Any:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only sink whose buffered bytes are drained after every batch."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def export_stream(rows: Iterable[RowItem], columns: Sequence[str], fmt: str, batch_rows: int = BATCH_ROWS) -> Iterator[bytes]:
+    """Encode ``(id, data)`` rows as Parquet or an Arrow IPC stream, yielding bytes per batch.
+
+    Schema columns are typed as strings (the dataset schema's only type);
+    non-string cells are stringified and missing cells are null.
+    """
+
+    schema = pa.schema([("id", pa.int64()), *((key, pa.string()) for key in columns)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+
+    def write(chunk: List[RowItem]) -> bytes:
+        arrays = [pa.array([row_id for row_id, _ in chunk], pa.int64())]
+        arrays.extend(pa.array([_cell(data.get(key)) for _, data in chunk], pa.string()) for key in columns)
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        return sink.drain()
+
+    chunk: List[RowItem] = []
+    try:
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= batch_rows:
+                yield write(chunk)
+                chunk = []
+        if chunk:
+            yield write(chunk)
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,229 @@
+"""Read-through cache for dataset metadata and listings.
+
+Entries are plain JSON-compatible dicts and lists, so they can live in the
+in-process LRU (default) or in a shared backend such as Redis when
+``DATASET_CACHE_URL`` is set; with several API processes only a shared backend
+makes invalidation visible everywhere. Writers call :func:`store_dataset` after
+committing so the detail entry is written through and the listings that
+include the dataset are dropped.
+
+Reads through a replica session (see :func:`~.database.get_read_db`) cache
+what they load for at most ``DB_REPLICA_MAX_LAG_SECONDS``, so a lagging load
+cannot outlive the lag. A session routed to the primary after the caller's own
+write skips cached values and reloads.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .cache import MISSING, LRUCache
+from .config import settings
+from .database import READ_AFTER_WRITE, READ_REPLICA
+from .metrics import CACHE_REQUESTS
+from .models_datasets import Dataset
+
+logger = logging.getLogger(__name__)
+
+ALL_KEY = "datasets:all"
+
+
+def dataset_key(dataset_id: int) -> str:
+    return f"datasets:{dataset_id}"
+
+
+def client_key(client_id: str) -> str:
+    return f"datasets:client:{client_id}"
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Any: ...
+
+    def set(self, key: str, value: Any, ttl: float) -> None: ...
+
+    def delete(self, *keys: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryBackend:
+    """Per-process LRU; returns ``MISSING`` for absent keys."""
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._cache.pop(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class RedisBackend:
+    """Shared backend; requires the optional ``redis`` package."""
+
+    def __init__(self, url: str, prefix: str = "macro:") -> None:
+        try:
+            import redis
+        except ImportError as exc:  # pragma: no cover - depends on the environment
+            raise RuntimeError("DATASET_CACHE_URL points at Redis but the 'redis' package is not installed") from exc
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self._client.get(self._prefix + key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._client.set(self._prefix + key, json.dumps(value, default=str), px=int(ttl * 1000))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._client.delete(*(self._prefix + key for key in keys))
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(f"{self._prefix}datasets:*"):
+            self._client.delete(key)
+
+
+class DatasetCache:
+    def __init__(self, backend: CacheBackend, ttl: float) -> None:
+        self.backend = backend
+        self.ttl = ttl
+
+    def get_or_load(
+        self, key: str, loader: Callable[[], Any], *, ttl: Optional[float] = None, refresh: bool = False
+    ) -> Any:
+        try:
+            value = MISSING if refresh else self.backend.get(key)
+        except Exception:
+            # A shared cache outage must not take the API down; fall through to the database.
+            logger.warning("dataset_cache_get_failed", extra={"key": key}, exc_info=True)
+            value = MISSING
+        if value is not MISSING:
+            CACHE_REQUESTS.labels(cache="datasets", result="hit").inc()
+            return value
+        CACHE_REQUESTS.labels(cache="datasets", result="miss").inc()
+        value = loader()
+        if value is not None:
+            self.put(key, value, ttl=ttl)
+        return value
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            self.backend.set(key, value, self.ttl if ttl is None else min(ttl, self.ttl))
+        except Exception:
+            logger.warning("dataset_cache_set_failed", extra={"key": key}, exc_info=True)
+
+    def invalidate(self, *keys: str) -> None:
+        try:
+            self.backend.delete(*keys)
+        except Exception:
+            logger.warning("dataset_cache_delete_failed", extra={"keys": keys}, exc_info=True)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+def _make_backend() -> CacheBackend:
+    if settings.dataset_cache_url:
+        return RedisBackend(settings.dataset_cache_url)
+    return MemoryBackend()
+
+
+dataset_cache = DatasetCache(_make_backend(), ttl=settings.dataset_cache_ttl_seconds)
+
+
+def _load_options(db: Session) -> Dict[str, Any]:
+    if db.info.get(READ_REPLICA):
+        return {"ttl": settings.db_replica_max_lag_seconds}
+    return {"refresh": bool(db.info.get(READ_AFTER_WRITE))}
+
+
+def _timestamp(value) -> str:
+    return value.isoformat() + "Z"
+
+
+def dataset_detail(dataset: Dataset) -> Dict[str, Any]:
+    return {
+        "id": dataset.id,
+        "name": dataset.name,
+        "schema": dataset.schema,
+        "updated_at": _timestamp(dataset.updated_at),
+        "created_by_client": dataset.created_by_client,
+    }
+
+
+def _summaries(db: Session, *criteria) -> List[Dict[str, Any]]:
+    # Only the listed columns are selected; no Dataset instances or joins are built.
+    # Row counts and sizes are the materialized counters, so they cost nothing extra.
+    rows = db.execute(
+        select(
+            Dataset.id, Dataset.name, Dataset.updated_at, Dataset.live_row_count, Dataset.approx_bytes
+        ).where(*criteria).order_by(Dataset.updated_at.desc())
+    ).all()
+    return [
+        {
+            "id": row.id,
+            "name": row.name,
+            "updated_at": _timestamp(row.updated_at),
+            "row_count": row.live_row_count,
+            "approx_bytes": row.approx_bytes,
+        }
+        for row in rows
+    ]
+
+
+def list_all_summaries(db: Session) -> List[Dict[str, Any]]:
+    return dataset_cache.get_or_load(ALL_KEY, lambda: _summaries(db), **_load_options(db))
+
+
+def list_client_summaries(db: Session, client_id: str) -> List[Dict[str, Any]]:
+    return dataset_cache.get_or_load(
+        client_key(client_id), lambda: _summaries(db, Dataset.created_by_client == client_id), **_load_options(db)
+    )
+
+
+def get_dataset_meta(db: Session, dataset_id: int) -> Optional[Dict[str, Any]]:
+    """Return cached metadata (id, name, schema, updated_at) or ``None`` if missing."""
+
+    def load() -> Optional[Dict[str, Any]]:
+        row = db.execute(
+            select(Dataset.id, Dataset.name, Dataset.schema, Dataset.updated_at, Dataset.created_by_client).where(
+                Dataset.id == dataset_id
+            )
+        ).first()
+        return dict(row._mapping, updated_at=_timestamp(row.updated_at)) if row else None
+
+    return dataset_cache.get_or_load(dataset_key(dataset_id), load, **_load_options(db))
+
+
+def store_dataset(dataset: Dataset) -> Dict[str, Any]:
+    """Write a committed dataset through to the cache and drop listings containing it."""
+
+    detail = dataset_detail(dataset)
+    dataset_cache.put(dataset_key(dataset.id), detail)
+    keys = [ALL_KEY]
+    if dataset.created_by_client:
+        keys.append(client_key(dataset.created_by_client))
+    dataset_cache.invalidate(*keys)
+    return detail
+
+
+def forget_dataset(dataset_id: int, created_by_client: Optional[str] = None) -> None:
+    keys = [dataset_key(dataset_id), ALL_KEY]
+    if created_by_client:
+        keys.append(client_key(created_by_client))
+    dataset_cache.invalidate(*keys)
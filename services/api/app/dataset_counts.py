@@ -0,0 +1,111 @@
+"""Materialized per-dataset row counts and size accounting.
+
+``Dataset.live_row_count``, ``archived_row_count`` and ``approx_bytes`` are
+adjusted with relative ``UPDATE datasets SET x = x + :delta`` statements in the
+same transaction as the row writes they describe, so concurrent writers never
+overwrite each other's counts and a rolled-back write leaves them untouched.
+``approx_bytes`` is the length of the stored JSON text of every row, live or
+archived, until archived rows are purged.
+
+Set-based rewrites (column operations, clones) recount their dataset with
+:func:`reconcile_counts`, which is also the repair job for drift from writes
+that bypass the API.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import Integer, Text, cast, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from .models_datasets import Dataset, DatasetRow
+
+COUNTERS = ("live_row_count", "archived_row_count", "approx_bytes")
+
+
+def row_bytes(data: Mapping[str, Any]) -> int:
+    """Size of ``data`` as the JSON column stores it (the driver's ``json.dumps``)."""
+
+    return len(json.dumps(data).encode("utf-8"))
+
+
+def rows_bytes(rows: Iterable[Mapping[str, Any]]) -> int:
+    return sum(row_bytes(row) for row in rows)
+
+
+def data_bytes(dialect: str):
+    """SQL expression for the stored size of ``DatasetRow.data``."""
+
+    if dialect == "postgresql":
+        return func.octet_length(cast(DatasetRow.data, Text))
+    return func.length(cast(DatasetRow.data, Text))
+
+
+def adjust_counts(db: Session, dataset_id: int, *, live: int = 0, archived: int = 0, size: int = 0) -> None:
+    """Add deltas to the dataset's counters inside the caller's transaction."""
+
+    if not (live or archived or size):
+        return
+    db.execute(
+        update(Dataset)
+        .where(Dataset.id == dataset_id)
+        .values(
+            live_row_count=Dataset.live_row_count + live,
+            archived_row_count=Dataset.archived_row_count + archived,
+            approx_bytes=Dataset.approx_bytes + size,
+            # Row writes are not metadata edits; keep listings ordered as before.
+            updated_at=Dataset.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def purge_archived(db: Session, dataset_id: int) -> Dict[str, int]:
+    """Hard-delete the dataset's archived rows and return how many rows and bytes were freed."""
+
+    sizes = db.scalars(
+        delete(DatasetRow)
+        .where(DatasetRow.dataset_id == dataset_id, DatasetRow.archived.is_(True))
+        .returning(data_bytes(db.get_bind().dialect.name))
+        .execution_options(synchronize_session=False)
+    ).all()
+    freed = {"rows": len(sizes), "bytes": sum(size or 0 for size in sizes)}
+    adjust_counts(db, dataset_id, archived=-freed["rows"], size=-freed["bytes"])
+    return freed
+
+
+def reconcile_counts(db: Session, dataset_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Recount rows and bytes from ``dataset_rows`` and fix counters that drifted.
+
+    Covers one dataset or, without ``dataset_id``, all of them in a single
+    grouped scan. Returns the corrected datasets with their old and new values.
+    """
+
+    archived = cast(DatasetRow.archived, Integer)
+    actual_query = select(
+        DatasetRow.dataset_id,
+        func.count(DatasetRow.id) - func.coalesce(func.sum(archived), 0),
+        func.coalesce(func.sum(archived), 0),
+        func.coalesce(func.sum(data_bytes(db.get_bind().dialect.name)), 0),
+    ).group_by(DatasetRow.dataset_id)
+    stored_query = select(Dataset.id, Dataset.live_row_count, Dataset.archived_row_count, Dataset.approx_bytes)
+    if dataset_id is not None:
+        actual_query = actual_query.where(DatasetRow.dataset_id == dataset_id)
+        stored_query = stored_query.where(Dataset.id == dataset_id)
+
+    actual = {row[0]: tuple(int(value) for value in row[1:]) for row in db.execute(actual_query)}
+    fixed = []
+    for row_id, *stored in db.execute(stored_query).all():
+        counts = actual.get(row_id, (0, 0, 0))
+        if tuple(stored) == counts:
+            continue
+        db.execute(
+            update(Dataset)
+            .where(Dataset.id == row_id)
+            .values(**dict(zip(COUNTERS, counts)), updated_at=Dataset.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        fixed.append({"dataset_id": row_id, "before": dict(zip(COUNTERS, stored)), "after": dict(zip(COUNTERS, counts))})
+    return fixed
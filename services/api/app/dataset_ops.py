@@ -0,0 +1,224 @@
+"""Row mutations shared by the REST routes and the WebSocket op protocol.
+
+Each mutation works inside the caller's transaction (copy-on-write capture,
+counter updates, and the row writes themselves) and returns the realtime
+message to broadcast once the caller commits. The same functions serve a
+single REST request and a batch of ops applied from a socket.
+
+A WebSocket client sends ops as JSON (or MessagePack binary frames), either
+one object or a list, each with a client-generated ``op_id``::
+
+    {"op": "patch", "op_id": "c1-17", "id": 42, "key": "DX", "value": "..."}
+    {"op": "upsert", "op_id": "c1-18", "rows": [{"DX": "..."}, {"id": 42, "DX": "..."}]}
+    {"op": "delete", "op_id": "c1-19", "ids": [42, 43]}
+
+:func:`apply_batch` applies whatever ops have queued up with one commit. Each
+op gets an ``ack`` (with its result) or an ``error``, and the resulting
+messages are broadcast to the other sockets in the room.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Annotated, Any, Dict, List, Literal, Optional, Sequence, Union
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .dataset_counts import adjust_counts, row_bytes
+from .dataset_snapshots import capture_rows
+from .models_datasets import DatasetRow
+
+MERGE_KEY_CONFLICT = 'Rows would repeat a merge key value'
+
+
+class RowOpError(ValueError):
+    """Raised for a row mutation that cannot be applied."""
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def patch_cell(db: Session, dataset_id: int, row_id: int, key: str, value: Any) -> Dict[str, Any]:
+    row = (
+        db.query(DatasetRow)
+        .filter(
+            DatasetRow.dataset_id == dataset_id,
+            DatasetRow.id == row_id,
+            DatasetRow.archived.is_(False),
+        )
+        .first()
+    )
+    if not row:
+        raise RowOpError('Row not found', status_code=404)
+
+    capture_rows(db, dataset_id, row_ids=[row.id])
+    data = dict(row.data)
+    data[key] = value
+    adjust_counts(db, dataset_id, size=row_bytes(data) - row_bytes(row.data))
+    row.data = data
+    row.content_hash = None
+    return {
+        'type': 'cell',
+        'row_id': row.id,
+        'key': key,
+        'value': value,
+        'updated_at': datetime.utcnow().isoformat() + 'Z',
+    }
+
+
+def upsert_rows(db: Session, dataset_id: int, items: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace rows that carry an ``id`` and insert the rest; returns the created rows with their ids."""
+
+    created_rows: List[Dict[str, Any]] = []
+    size_delta = 0
+    capture_rows(db, dataset_id, row_ids=[item['id'] for item in items if item.get('id')])
+    for item in items:
+        row_id = item.get('id')
+        data = {k: v for k, v in item.items() if k != 'id'}
+        if row_id:
+            row = (
+                db.query(DatasetRow)
+                .filter(DatasetRow.id == row_id, DatasetRow.dataset_id == dataset_id)
+                .first()
+            )
+            if row:
+                size_delta += row_bytes(data) - row_bytes(row.data)
+                row.data = data
+                row.content_hash = None
+        else:
+            row = DatasetRow(dataset_id=dataset_id, data=data)
+            db.add(row)
+            db.flush()
+            size_delta += row_bytes(data)
+            created_rows.append({**row.data, 'id': row.id})
+    adjust_counts(db, dataset_id, live=len(created_rows), size=size_delta)
+    return created_rows
+
+
+def archive_rows(db: Session, dataset_id: int, ids: Sequence[int]) -> int:
+    """Archive the given rows; returns how many of them belong to the dataset."""
+
+    rows = (
+        db.query(DatasetRow)
+        .filter(DatasetRow.dataset_id == dataset_id, DatasetRow.id.in_(ids))
+        .all()
+    )
+    if not rows:
+        return 0
+
+    capture_rows(db, dataset_id, row_ids=[row.id for row in rows])
+    newly_archived = sum(1 for row in rows if not row.archived)
+    for row in rows:
+        row.archived = True
+    adjust_counts(db, dataset_id, live=-newly_archived, archived=newly_archived)
+    return len(rows)
+
+
+class PatchOp(BaseModel):
+    op: Literal['patch']
+    op_id: str = Field(..., min_length=1, max_length=64)
+    id: int
+    key: str = Field(..., min_length=1)
+    value: Any = None
+
+
+class UpsertOp(BaseModel):
+    op: Literal['upsert']
+    op_id: str = Field(..., min_length=1, max_length=64)
+    rows: List[Dict[str, Any]] = Field(..., min_length=1)
+
+
+class DeleteOp(BaseModel):
+    op: Literal['delete']
+    op_id: str = Field(..., min_length=1, max_length=64)
+    ids: List[int] = Field(..., min_length=1)
+
+
+RowOp = Annotated[Union[PatchOp, UpsertOp, DeleteOp], Field(discriminator='op')]
+OP_NAMES = ('patch', 'upsert', 'delete')
+_row_op = TypeAdapter(RowOp)
+
+
+def parse_op(raw: Any) -> RowOp:
+    """Validate one inbound op; raises ``RowOpError`` naming the first problem."""
+
+    try:
+        return _row_op.validate_python(raw)
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        location = '.'.join(str(part) for part in error['loc'])
+        raise RowOpError(f"Invalid op: {location + ': ' if location else ''}{error['msg']}") from None
+
+
+@dataclass
+class OpOutcome:
+    op_id: str
+    ack: Optional[Dict[str, Any]] = None
+    error: Optional[Dict[str, Any]] = None
+    broadcast: Optional[Dict[str, Any]] = None
+
+    def reply(self) -> Dict[str, Any]:
+        if self.error is not None:
+            return {'type': 'error', 'op_id': self.op_id, **self.error}
+        return {'type': 'ack', 'op_id': self.op_id, **(self.ack or {})}
+
+
+def _apply(db: Session, dataset_id: int, op: RowOp) -> OpOutcome:
+    outcome = OpOutcome(op_id=op.op_id)
+    try:
+        if isinstance(op, PatchOp):
+            outcome.broadcast = patch_cell(db, dataset_id, op.id, op.key, op.value)
+            outcome.ack = {'row_id': op.id, 'updated_at': outcome.broadcast['updated_at']}
+        elif isinstance(op, UpsertOp):
+            created = upsert_rows(db, dataset_id, op.rows)
+            outcome.ack = {'created_ids': [row['id'] for row in created]}
+            if created:
+                outcome.broadcast = {'type': 'rows_upsert', 'rows': created}
+        else:
+            deleted = archive_rows(db, dataset_id, op.ids)
+            outcome.ack = {'deleted': deleted}
+            if deleted:
+                outcome.broadcast = {'type': 'delete_rows', 'ids': op.ids}
+    except RowOpError as exc:
+        outcome.error = {'status': exc.status_code, 'detail': str(exc)}
+    return outcome
+
+
+@dataclass
+class BatchResult:
+    outcomes: List[OpOutcome] = field(default_factory=list)
+    commits: int = 0
+
+
+def apply_batch(db: Session, dataset_id: int, ops: Sequence[RowOp]) -> BatchResult:
+    """Apply ``ops`` in order with a single commit.
+
+    If the commit hits a constraint (a repeated merge key), the batch is
+    rolled back and replayed one op per transaction so that only the
+    offending ops fail.
+    """
+
+    result = BatchResult()
+    try:
+        result.outcomes = [_apply(db, dataset_id, op) for op in ops]
+        db.commit()
+        result.commits = 1
+        return result
+    except IntegrityError:
+        db.rollback()
+
+    result.outcomes = []
+    for op in ops:
+        try:
+            outcome = _apply(db, dataset_id, op)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            outcome = OpOutcome(op_id=op.op_id, error={'status': 409, 'detail': MERGE_KEY_CONFLICT})
+        result.commits += 1
+        result.outcomes.append(outcome)
+    return result
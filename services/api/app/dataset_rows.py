@@ -0,0 +1,235 @@
+"""Set-based dataset row writes: bulk inserts and natural-key merges.
+
+A merge import matches incoming rows to live rows on one or more JSON keys
+(``schema["merge_keys"]``). Each dataset with merge keys gets its own partial
+unique expression index, ``ix_dataset_rows_key_<id>``, over those keys. The
+index makes key lookups cheap and stops concurrent merges from inserting
+duplicate keys. On Postgres it is built with ``CREATE UNIQUE INDEX
+CONCURRENTLY`` outside the request transaction, so building it does not block
+writes to other datasets' rows. Matched rows whose ``content_hash`` equals the incoming hash
+are skipped. Changed rows are updated with one executemany and new rows are
+inserted with one multi-row INSERT, so a re-sync costs time in proportion to
+what changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, literal_column, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .dataset_counts import adjust_counts, data_bytes, row_bytes, rows_bytes
+from .dataset_snapshots import capture_rows, lock_dataset
+from .models_datasets import DatasetRow
+from .partitions import rows_table
+
+MAX_MERGE_KEYS = 4
+LOOKUP_CHUNK = 500
+MERGE_INDEX_DIALECTS = ("postgresql", "sqlite")
+# Advisory lock namespace that serializes merge-index builds per dataset.
+_INDEX_LOCK_CLASS = 4401
+
+
+class MergeKeyError(ValueError):
+    """Raised for unusable merge keys or rows that lack them."""
+
+
+def row_hash(data: Dict[str, Any]) -> str:
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def bulk_insert_rows(db: Session, dataset_id: int, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert ``rows`` with one multi-row INSERT and return them with their new ids."""
+
+    if not rows:
+        return []
+    # New ids must not land below the max_row_id of a snapshot that commits first.
+    lock_dataset(db, dataset_id)
+    ids = db.scalars(
+        insert(DatasetRow).returning(DatasetRow.id, sort_by_parameter_order=True),
+        [{"dataset_id": dataset_id, "data": row, "content_hash": row_hash(row)} for row in rows],
+    ).all()
+    adjust_counts(db, dataset_id, live=len(ids), size=rows_bytes(rows))
+    return [{**row, "id": row_id} for row, row_id in zip(rows, ids)]
+
+
+def validate_merge_keys(keys: Sequence[str]) -> List[str]:
+    cleaned = list(dict.fromkeys(key.strip() for key in keys if key and key.strip()))
+    if not cleaned:
+        raise MergeKeyError("At least one merge key is required")
+    if len(cleaned) > MAX_MERGE_KEYS:
+        raise MergeKeyError(f"At most {MAX_MERGE_KEYS} merge keys are supported")
+    for key in cleaned:
+        # Keys are inlined into index DDL and JSON paths, so keep them to safe characters.
+        if key == "id" or len(key) > 128 or any(char in key for char in "\"\\") or not key.isprintable():
+            raise MergeKeyError(f"Unsupported merge key: {key!r}")
+    return cleaned
+
+
+def _key_sql(dialect: str, key: str) -> str:
+    quoted = key.replace("'", "''")
+    if dialect == "postgresql":
+        return f"(data ->> '{quoted}')"
+    return f"json_extract(data, '$.\"{quoted}\"')"
+
+
+def merge_index_name(dataset_id: int) -> str:
+    return f"ix_dataset_rows_key_{dataset_id}"
+
+
+def _index_predicate(dataset_id: int) -> str:
+    # SQLite only uses a partial index when the query repeats its WHERE terms
+    # verbatim (literals, not bound parameters), so lookups reuse this text.
+    return f"dataset_id = {int(dataset_id)} AND archived = false"
+
+
+def ensure_merge_index(db: Session, dataset_id: int, keys: Sequence[str], replace: bool = False) -> None:
+    """Create the dataset's unique merge-key index (dropping the old one when ``replace``).
+
+    On a partitioned ``dataset_rows`` the index goes on the dataset's own
+    partition. Raises ``IntegrityError`` when live rows already repeat a key.
+
+    On Postgres the index is built concurrently on a connection of its own and
+    rebuilt whenever it was made for other keys, so ``replace`` is not needed
+    there. Call it while ``db`` has no open transaction: a concurrent build
+    waits for every older transaction, the caller's included.
+    """
+
+    dialect = db.get_bind().dialect.name
+    if dialect not in MERGE_INDEX_DIALECTS:
+        return
+    if dialect == "postgresql":
+        _build_index_concurrently(db, dataset_id, keys)
+        return
+    name = merge_index_name(dataset_id)
+    if replace:
+        db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    expressions = ", ".join(_key_sql(dialect, key) for key in keys)
+    db.execute(
+        text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {rows_table(db, dataset_id)} ({expressions}) "
+            f"WHERE {_index_predicate(dataset_id)}"
+        )
+    )
+
+
+def _build_index_concurrently(db: Session, dataset_id: int, keys: Sequence[str]) -> None:
+    name = merge_index_name(dataset_id)
+    # The index comment records the keys it was built for.
+    wanted = json.dumps(list(keys)).replace("'", "''")
+    expressions = ", ".join(_key_sql("postgresql", key) for key in keys)
+    lock = {"cls": _INDEX_LOCK_CLASS, "id": int(dataset_id)}
+    with db.get_bind().engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Look the table up on this connection too, so ``db`` starts no transaction.
+        table = rows_table(Session(bind=conn), dataset_id)
+        conn.execute(text("SELECT pg_advisory_lock(:cls, :id)"), lock)
+        try:
+            current = conn.execute(
+                text("SELECT indisvalid, obj_description(indexrelid, 'pg_class') FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                {"name": name},
+            ).first()
+            if current is not None and current[0] and current[1] == json.dumps(list(keys)):
+                return
+            # Build beside the old index and swap, so a failed build (say, repeated
+            # keys) leaves the old one in place. A leftover is from a crashed build.
+            building = f"{name}_new"
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {building}"))
+            try:
+                conn.execute(
+                    text(
+                        f"CREATE UNIQUE INDEX CONCURRENTLY {building} ON {table} ({expressions}) "
+                        f"WHERE {_index_predicate(dataset_id)}"
+                    )
+                )
+            except IntegrityError:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {building}"))
+                raise
+            conn.execute(text(f"COMMENT ON INDEX {building} IS '{wanted}'"))
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            conn.execute(text(f"ALTER INDEX {building} RENAME TO {name}"))
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:cls, :id)"), lock)
+
+
+def drop_merge_index(db: Session, dataset_id: int) -> None:
+    if db.get_bind().dialect.name in MERGE_INDEX_DIALECTS:
+        db.execute(text(f"DROP INDEX IF EXISTS {merge_index_name(dataset_id)}"))
+
+
+def _key_text(value: Any) -> Optional[str]:
+    # ``->>`` yields text on Postgres; normalise SQLite's typed values the same way.
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+@dataclass
+class MergeResult:
+    inserted: List[Dict[str, Any]] = field(default_factory=list)
+    updated: List[Dict[str, Any]] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed_rows(self) -> List[Dict[str, Any]]:
+        return self.inserted + self.updated
+
+
+def merge_rows(db: Session, dataset_id: int, keys: Sequence[str], rows: Sequence[Dict[str, Any]]) -> MergeResult:
+    """Upsert ``rows`` into the dataset by ``keys``; a later duplicate key in ``rows`` wins."""
+
+    dialect = db.get_bind().dialect.name
+    incoming: Dict[Tuple[Optional[str], ...], Dict[str, Any]] = {}
+    raw_keys: Dict[Tuple[Optional[str], ...], Tuple[Any, ...]] = {}
+    for position, row in enumerate(rows, start=1):
+        values = tuple(row.get(key) for key in keys)
+        if any(value is None or value == "" for value in values):
+            raise MergeKeyError(f"Row {position} has no value for merge key(s) {', '.join(keys)}")
+        key = tuple(_key_text(value) for value in values)
+        incoming[key] = row
+        raw_keys[key] = key if dialect == "postgresql" else values
+
+    columns = [literal_column(_key_sql(dialect, key)) for key in keys]
+    target = columns[0] if len(columns) == 1 else tuple_(*columns)
+    existing: Dict[Tuple[Optional[str], ...], Tuple[int, Optional[str], int]] = {}
+    size = data_bytes(dialect)
+    pending = list(raw_keys.values())
+    for start in range(0, len(pending), LOOKUP_CHUNK):
+        chunk = pending[start : start + LOOKUP_CHUNK]
+        params = [values[0] for values in chunk] if len(columns) == 1 else chunk
+        found = db.execute(
+            select(DatasetRow.id, DatasetRow.content_hash, size, *columns).where(
+                text(_index_predicate(dataset_id)), target.in_(params)
+            )
+        )
+        for row_id, content_hash, stored_bytes, *values in found:
+            existing[tuple(_key_text(value) for value in values)] = (row_id, content_hash, stored_bytes or 0)
+
+    result = MergeResult()
+    updates, inserts = [], []
+    size_delta = 0
+    for key, data in incoming.items():
+        digest = row_hash(data)
+        match = existing.get(key)
+        if match is None:
+            inserts.append(data)
+        elif match[1] == digest:
+            result.unchanged += 1
+        else:
+            updates.append({"id": match[0], "data": data, "content_hash": digest})
+            size_delta += row_bytes(data) - match[2]
+            result.updated.append({**data, "id": match[0]})
+    if updates:
+        capture_rows(db, dataset_id, row_ids=[item["id"] for item in updates])
+        # The dataset_id term lets a partitioned table prune to the dataset's partition.
+        statement = update(DatasetRow).where(DatasetRow.dataset_id == dataset_id)
+        db.execute(statement.execution_options(synchronize_session=None), updates)
+        adjust_counts(db, dataset_id, size=size_delta)
+    result.inserted = bulk_insert_rows(db, dataset_id, inserts)
+    return result
@@ -0,0 +1,177 @@
+"""Dataset clones and snapshots, copied server-side with ``INSERT ... SELECT``.
+
+Row data never passes through Python: a clone or ``full`` snapshot is a
+single statement that copies the live rows. A ``cow`` (copy-on-write)
+snapshot copies nothing when it is taken. Instead, every write path calls
+:func:`capture_rows` before it changes or archives rows, and that copies the
+pre-image of rows the snapshot has not captured yet. A copy-on-write snapshot
+is then read as the captured rows plus the untouched live rows up to
+``max_row_id``.
+
+Snapshot creation and row writes both lock the ``datasets`` row first
+(:func:`lock_dataset`), so a write that has not seen a new snapshot cannot
+commit after it: either the write commits first, or it waits and then
+captures its pre-images. ``FOR UPDATE`` rather than ``FOR SHARE``, because
+writers go on to update the same row's counters and two shared holders
+upgrading would deadlock.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, and_, exists, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .models_datasets import Dataset, DatasetRow, DatasetSnapshot, DatasetSnapshotRow
+
+
+# INSERT ... SELECT row counts are only kept on every driver when asked for.
+_ROWCOUNT = {"preserve_rowcount": True}
+
+
+def _live_rows(dataset_id: int):
+    return and_(DatasetRow.dataset_id == dataset_id, DatasetRow.archived.is_(False))
+
+
+def snapshot_dict(snapshot: DatasetSnapshot) -> Dict[str, Any]:
+    return {
+        "id": snapshot.id,
+        "dataset_id": snapshot.dataset_id,
+        "name": snapshot.name,
+        "mode": snapshot.mode,
+        "row_count": snapshot.row_count,
+        "created_at": snapshot.created_at.isoformat() + "Z",
+    }
+
+
+def snapshot_rows(snapshot: DatasetSnapshot):
+    """Selectable of ``(id, data, content_hash)`` for the rows as they were when ``snapshot`` was taken."""
+
+    captured = select(
+        DatasetSnapshotRow.row_id.label("id"), DatasetSnapshotRow.data, DatasetSnapshotRow.content_hash
+    ).where(DatasetSnapshotRow.snapshot_id == snapshot.id)
+    if snapshot.mode == "full":
+        return captured.subquery()
+    untouched = select(DatasetRow.id, DatasetRow.data, DatasetRow.content_hash).where(
+        _live_rows(snapshot.dataset_id),
+        DatasetRow.id <= (snapshot.max_row_id or 0),
+        ~exists().where(DatasetSnapshotRow.snapshot_id == snapshot.id, DatasetSnapshotRow.row_id == DatasetRow.id),
+    )
+    return union_all(captured, untouched).subquery()
+
+
+def live_rows(dataset_id: int):
+    return select(DatasetRow.id, DatasetRow.data, DatasetRow.content_hash).where(_live_rows(dataset_id)).subquery()
+
+
+def copy_rows(db: Session, source, target_dataset_id: int) -> int:
+    """Insert every row of the ``source`` selectable into ``target_dataset_id``; returns the row count."""
+
+    rows = select(literal(target_dataset_id, Integer), source.c.data, source.c.content_hash).order_by(source.c.id)
+    result = db.execute(
+        insert(DatasetRow).from_select([DatasetRow.dataset_id, DatasetRow.data, DatasetRow.content_hash], rows),
+        execution_options=_ROWCOUNT,
+    )
+    return result.rowcount or 0
+
+
+def lock_dataset(db: Session, dataset_id: int) -> None:
+    """Hold the dataset row lock until the transaction ends (a no-op on SQLite, which locks the database)."""
+
+    db.execute(select(Dataset.id).where(Dataset.id == dataset_id).with_for_update())
+
+
+def create_snapshot(db: Session, dataset: Dataset, name: str, mode: str) -> DatasetSnapshot:
+    lock_dataset(db, dataset.id)
+    snapshot = DatasetSnapshot(dataset_id=dataset.id, name=name, mode=mode, schema=dataset.schema)
+    db.add(snapshot)
+    db.flush()
+    if mode == "full":
+        source = live_rows(dataset.id)
+        copied = select(literal(snapshot.id, Integer), source.c.id, source.c.data, source.c.content_hash)
+        result = db.execute(
+            insert(DatasetSnapshotRow).from_select(
+                [DatasetSnapshotRow.snapshot_id, DatasetSnapshotRow.row_id, DatasetSnapshotRow.data, DatasetSnapshotRow.content_hash],
+                copied,
+            ),
+            execution_options=_ROWCOUNT,
+        )
+        snapshot.row_count = result.rowcount or 0
+    else:
+        max_row_id, live = db.execute(
+            select(func.max(DatasetRow.id), func.count(DatasetRow.id).filter(DatasetRow.archived.is_(False))).where(
+                DatasetRow.dataset_id == dataset.id
+            )
+        ).one()
+        snapshot.max_row_id = max_row_id or 0
+        snapshot.row_count = live
+    return snapshot
+
+
+def capture_rows(
+    db: Session,
+    dataset_id: int,
+    *,
+    row_ids: Optional[Sequence[int]] = None,
+    id_range: Optional[Tuple[int, int]] = None,
+) -> int:
+    """Copy pre-images of the given live rows into the dataset's copy-on-write snapshots.
+
+    Call before changing or archiving rows, with either explicit ``row_ids`` or
+    a half-open ``id_range``. Rows a snapshot already holds are skipped.
+    The dataset row stays locked until the caller's transaction ends, even
+    when there is nothing to capture. Returns the number of rows captured.
+    """
+
+    lock_dataset(db, dataset_id)
+    if row_ids is not None and not row_ids:
+        return 0
+    snapshots = db.execute(
+        select(DatasetSnapshot.id, DatasetSnapshot.max_row_id).where(
+            DatasetSnapshot.dataset_id == dataset_id, DatasetSnapshot.mode == "cow"
+        )
+    ).all()
+    if not snapshots:
+        return 0
+    if row_ids is not None:
+        selected = DatasetRow.id.in_(list(row_ids))
+    else:
+        selected = and_(DatasetRow.id >= id_range[0], DatasetRow.id < id_range[1])
+    captured = 0
+    for snapshot_id, max_row_id in snapshots:
+        pre_images = select(literal(snapshot_id, Integer), DatasetRow.id, DatasetRow.data, DatasetRow.content_hash).where(
+            _live_rows(dataset_id),
+            selected,
+            DatasetRow.id <= max_row_id,
+            ~exists().where(DatasetSnapshotRow.snapshot_id == snapshot_id, DatasetSnapshotRow.row_id == DatasetRow.id),
+        )
+        result = db.execute(
+            insert(DatasetSnapshotRow).from_select(
+                [DatasetSnapshotRow.snapshot_id, DatasetSnapshotRow.row_id, DatasetSnapshotRow.data, DatasetSnapshotRow.content_hash],
+                pre_images,
+            ),
+            execution_options=_ROWCOUNT,
+        )
+        captured += result.rowcount or 0
+    return captured
+
+
+def list_snapshots(db: Session, dataset_id: int) -> List[DatasetSnapshot]:
+    return (
+        db.query(DatasetSnapshot)
+        .filter(DatasetSnapshot.dataset_id == dataset_id)
+        .order_by(DatasetSnapshot.created_at.desc(), DatasetSnapshot.id.desc())
+        .all()
+    )
+
+
+def delete_snapshot(db: Session, snapshot: DatasetSnapshot) -> None:
+    db.query(DatasetSnapshotRow).filter(DatasetSnapshotRow.snapshot_id == snapshot.id).delete(synchronize_session=False)
+    db.delete(snapshot)
+
+
+def delete_dataset_snapshots(db: Session, dataset_id: int) -> None:
+    snapshot_ids = select(DatasetSnapshot.id).where(DatasetSnapshot.dataset_id == dataset_id).scalar_subquery()
+    db.query(DatasetSnapshotRow).filter(DatasetSnapshotRow.snapshot_id.in_(snapshot_ids)).delete(synchronize_session=False)
+    db.query(DatasetSnapshot).filter(DatasetSnapshot.dataset_id == dataset_id).delete(synchronize_session=False)
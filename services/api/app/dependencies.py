@@ -1,36 +1,108 @@
 """Reusable FastAPI dependencies."""
 
-from typing import Any
+import hmac
+from dataclasses import dataclass
+from typing import Mapping, Optional
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from .api_keys import clear_api_key_cache, is_api_key, verify_api_key
+from .cache import MISSING, LRUCache
 from .config import settings
 from .database import get_db
 from .models import User
 
 security = HTTPBearer(auto_error=False)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+# user_id -> email; users are never renamed or deleted through the API, so a short TTL suffices.
+_user_cache = LRUCache(maxsize=10_000, ttl=settings.auth_cache_ttl_seconds)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Authenticated principal resolved from the bearer token."""
+
+    id: int
+    email: str
+    # Workspace roles signed into the token (only when AUTH_ROLE_CLAIMS is enabled).
+    roles: Optional[Mapping[int, str]] = None
+    # API-key principals are limited to ``roles`` and never fall back to memberships.
+    scoped: bool = False
+    api_key_id: Optional[int] = None
+
+
+def _role_claims(payload: dict) -> Optional[dict[int, str]]:
+    claims = payload.get("roles")
+    if not settings.auth_role_claims or not isinstance(claims, dict):
+        return None
+    return {int(workspace_id): role for workspace_id, role in claims.items()}
 
 
 def get_current_user(
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
+    api_key: str | None = Depends(api_key_header),
     db: Session = Depends(get_db),
-) -> User:
-    """Decode bearer token and fetch the associated user."""
+) -> CurrentUser:
+    """Resolve the caller from a JWT or API key, hitting the database only on a cache miss."""
 
-    if credentials is None:
+    token = api_key or (credentials.credentials if credentials else None)
+    if token is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
-    token = credentials.credentials
+    if api_key or is_api_key(token):
+        key = verify_api_key(db, token)
+        if key.created_by is None:
+            # Writes are owned by the key's creator; a key whose creator is gone has no one to act as.
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="API key has no owner")
+        return CurrentUser(
+            id=key.created_by,
+            email=f"api-key:{key.name}",
+            roles={key.workspace_id: key.role},
+            scoped=True,
+            api_key_id=key.id,
+        )
+
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
         user_id = int(payload.get("sub"))
+        roles = _role_claims(payload)
     except (JWTError, ValueError, TypeError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from None
 
-    user = db.get(User, user_id)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    email = _user_cache.get(user_id)
+    if email is MISSING:
+        email = db.execute(select(User.email).where(User.id == user_id)).scalar_one_or_none()
+        if email is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        _user_cache.set(user_id, email)
+    return CurrentUser(id=user_id, email=email, roles=roles)
+
+
+def is_admin_token(value: Optional[str]) -> bool:
+    """Check ``value`` against ``ADMIN_TOKEN``; nobody is admin when it is unset."""
+
+    if not settings.admin_token or not value:
+        return False
+    return hmac.compare_digest(value, settings.admin_token)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Guard operator endpoints with ``ADMIN_TOKEN``."""
+
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+
+def clear_auth_caches() -> None:
+    """Drop cached users, memberships and API keys (used by tests and admin tooling)."""
+
+    from .utils import clear_membership_cache
+
+    _user_cache.clear()
+    clear_membership_cache()
+    clear_api_key_cache()
@@ -2,27 +2,72 @@
 
 from __future__ import annotations
 
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routes_datasets import router as datasets_router
-from .ws import ws_router
+from .config import settings
+from .database import engine, init_db
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Run one-time startup work and release pooled connections on shutdown."""
+
+    from .audit import audit_writer
+    from .database import replica_engine
+
+    if settings.auto_create_schema:
+        init_db()
+    if settings.audit_mode == 'batched':
+        audit_writer.start()
+    yield
+    audit_writer.stop()
+    engine.dispose()
+    if replica_engine is not None:
+        replica_engine.dispose()
+
+
+def create_app() -> FastAPI:
+    """Build the application with every router mounted.
+
+    Routers are imported here rather than at module import so that importing
+    the package (e.g. for models or Alembic) does not pull in the whole API.
+    """
 
-app = FastAPI(title='Public Dataset API', version='0.4.0', docs_url='/docs')
+    from .middleware import LastWriteMiddleware, MetricsMiddleware, instrument_engines
+    from .routes import admin, api_keys, audit, auth, health, snippets
+    from .routes_datasets import router as datasets_router
+    from .ws import ws_router
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=['*'],
-    allow_credentials=False,
-    allow_methods=['*'],
-    allow_headers=['*'],
-)
+    app = FastAPI(title='Public Dataset API', version='0.4.0', docs_url='/docs', lifespan=lifespan)
 
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=['*'],
+        allow_credentials=False,
+        allow_methods=['*'],
+        allow_headers=['*'],
+    )
+    app.add_middleware(MetricsMiddleware)
+    if settings.db_replica_url:
+        app.add_middleware(LastWriteMiddleware)
+    instrument_engines()
 
-@app.get('/healthz', tags=['meta'])
-def healthz() -> dict[str, str]:
-    return {'status': 'ok'}
+    app.include_router(health.router)
+    app.include_router(auth.router)
+    app.include_router(snippets.router)
+    app.include_router(audit.router)
+    app.include_router(api_keys.router)
+    app.include_router(datasets_router)
+    app.include_router(ws_router)
+    app.include_router(admin.router)
+    return app
 
 
-app.include_router(datasets_router)
-app.include_router(ws_router)
+app = create_app()
@@ -1,6 +1,6 @@
 """Prometheus metrics for the Macro Library API."""
 
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 REQUEST_COUNT = Counter(
     "macro_http_requests_total",
@@ -14,8 +14,113 @@ REQUEST_LATENCY = Histogram(
     ["method", "path"],
 )
 
+REQUEST_DB_TIME = Histogram(
+    "macro_http_request_db_seconds",
+    "Time spent in database queries per HTTP request",
+    ["method", "path"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    "macro_http_request_db_queries",
+    "Number of database queries per HTTP request",
+    ["method", "path"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "macro_db_query_duration_seconds",
+    "Latency of individual database statements",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+SLOW_QUERIES = Counter(
+    "macro_db_slow_queries_total",
+    "Statements slower than SLOW_QUERY_MS",
+    ["path"],
+)
+
+DB_READ_SESSIONS = Counter(
+    "macro_db_read_sessions_total",
+    "Read-only request sessions by target database and routing reason",
+    ["target", "reason"],
+)
+
+CACHE_REQUESTS = Counter(
+    "macro_cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+
 SNIPPET_MUTATIONS = Counter(
     "macro_snippet_mutations_total",
     "Count of snippet mutations",
     ["action"],
 )
+
+AUDIT_QUEUE_DEPTH = Gauge(
+    "macro_audit_queue_depth",
+    "Audit events waiting to be flushed",
+)
+
+AUDIT_EVENTS = Counter(
+    "macro_audit_events_total",
+    "Audit events by outcome",
+    ["outcome"],
+)
+
+AUDIT_FLUSH_LATENCY = Histogram(
+    "macro_audit_flush_duration_seconds",
+    "Time spent writing one batch of audit events",
+)
+
+WS_CONNECTIONS = Gauge(
+    "macro_ws_connections",
+    "Open dataset WebSocket connections",
+)
+
+WS_ROOMS = Gauge(
+    "macro_ws_rooms",
+    "Datasets with at least one open WebSocket",
+)
+
+WS_FANOUT = Histogram(
+    "macro_ws_broadcast_fanout",
+    "Sockets targeted per broadcast (room size)",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+WS_BROADCAST_LATENCY = Histogram(
+    "macro_ws_broadcast_duration_seconds",
+    "Time to deliver one broadcast to every socket in a room",
+    ["type"],
+)
+
+WS_MESSAGE_BYTES = Histogram(
+    "macro_ws_message_bytes",
+    "Serialized size of broadcast messages",
+    ["type"],
+    buckets=(128, 512, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+
+WS_BROADCASTS_IN_FLIGHT = Gauge(
+    "macro_ws_broadcasts_in_flight",
+    "Broadcasts currently being delivered",
+)
+
+WS_OPS = Counter(
+    "macro_ws_ops_total",
+    "Edits received over dataset WebSockets by op and outcome",
+    ["op", "outcome"],
+)
+
+WS_OP_BATCH_SIZE = Histogram(
+    "macro_ws_op_batch_size",
+    "Inbound WebSocket ops applied per commit",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500),
+)
+
+WS_EVICTIONS = Counter(
+    "macro_ws_evictions_total",
+    "Sockets dropped after a failed or timed-out send",
+)
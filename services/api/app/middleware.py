@@ -0,0 +1,228 @@
+"""Request instrumentation: Prometheus metrics, per-request DB timing and profiling.
+
+Paths are labelled with the matched route template (``/workspaces/{workspace_id:int}/snippets``)
+rather than the raw URL so label cardinality stays bounded; requests that do
+not match a route share the ``unmatched`` label.
+
+Opt-in diagnostics:
+
+* ``SLOW_QUERY_MS`` logs every statement slower than the threshold with its
+  route, duration and a hash of its parameters (values are never logged).
+* ``PROFILE_SAMPLE_RATE`` profiles that fraction of requests, and admins can
+  profile one request on demand with ``X-Profile: 1`` plus ``X-Admin-Token``.
+  Collapsed stacks are written to ``PROFILE_DIR`` (see :mod:`.profiling`).
+
+With a read replica configured, :class:`LastWriteMiddleware` stamps successful
+writes so later reads from the same client can avoid a lagging replica.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .database import LAST_WRITE_COOKIE, LAST_WRITE_HEADER
+from .metrics import (
+    DB_QUERY_LATENCY,
+    REQUEST_COUNT,
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_TIME,
+    REQUEST_LATENCY,
+    SLOW_QUERIES,
+)
+from .profiling import finish_profile, try_start_profile
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED = "unmatched"
+
+
+def route_template(scope: Optional[Scope]) -> str:
+    route = scope.get("route") if scope is not None else None
+    return getattr(route, "path", None) or UNMATCHED
+
+
+@dataclass
+class RequestStats:
+    """Database work attributed to the current request."""
+
+    scope: Optional[Scope] = field(default=None, repr=False)
+    queries: int = 0
+    db_seconds: float = 0.0
+
+    @property
+    def path(self) -> str:
+        # The router stores the matched route on the shared scope before the endpoint runs.
+        return route_template(self.scope)
+
+
+# Sync endpoints run in a threadpool that copies the context, so handlers and
+# the middleware share the same ``RequestStats`` instance.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _params_hash(parameters: Any) -> str:
+    return hashlib.sha1(repr(parameters).encode("utf-8", "replace")).hexdigest()[:12]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    # Kept on the statement's execution context, which is dropped whether or not it fails.
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    _record_query(context, statement, parameters, executemany)
+
+
+def _handle_error(exception_context) -> None:
+    # A failed statement spent database time too; it never reaches after_cursor_execute.
+    context = exception_context.execution_context
+    if context is not None and exception_context.statement is not None:
+        _record_query(context, exception_context.statement, exception_context.parameters, context.executemany)
+
+
+def _record_query(context, statement: str, parameters: Any, executemany: bool) -> None:
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if settings.slow_query_ms and elapsed * 1000 >= settings.slow_query_ms:
+        route = stats.path if stats is not None else None
+        SLOW_QUERIES.labels(path=route or "background").inc()
+        logger.warning(
+            "slow_query",
+            extra={
+                "statement": " ".join(statement.split())[:2000],
+                "params_hash": _params_hash(parameters),
+                "executemany": executemany,
+                "duration_ms": round(elapsed * 1000, 2),
+                "route": route,
+            },
+        )
+
+
+def instrument_engines() -> None:
+    """Time every statement executed by any engine in this process (idempotent)."""
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def _wants_profile(scope: Scope) -> bool:
+    headers = Headers(scope=scope)
+    if headers.get("x-profile") == "1":
+        from .dependencies import is_admin_token
+
+        return is_admin_token(headers.get("x-admin-token"))
+    return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+
+class MetricsMiddleware:
+    """Record request count, latency and DB time per route template.
+
+    Also reports the split as a ``Server-Timing`` header so slow requests can
+    be diagnosed from the browser without scraping Prometheus.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope=scope)
+        token = _request_stats.set(stats)
+        sampler = try_start_profile(_request_stats, settings.profile_interval_ms / 1000) if _wants_profile(scope) else None
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing = (
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                    f"app;dur={(time.perf_counter() - started) * 1000:.1f}"
+                )
+                headers = [*message.get("headers", []), (b"server-timing", timing.encode("latin-1"))]
+                headers.append((b"x-query-count", str(stats.queries).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            path = stats.path
+            method = scope["method"]
+            REQUEST_COUNT.labels(method=method, path=path, status=str(status_code)).inc()
+            REQUEST_LATENCY.labels(method=method, path=path).observe(elapsed)
+            REQUEST_DB_TIME.labels(method=method, path=path).observe(stats.db_seconds)
+            REQUEST_DB_QUERIES.labels(method=method, path=path).observe(stats.queries)
+            if sampler is not None:
+                name = await run_in_threadpool(finish_profile, sampler, settings.profile_dir, f"{method} {path}")
+                logger.info(
+                    "request_profiled",
+                    extra={"profile": name, "route": path, "duration_ms": round(elapsed * 1000, 2)},
+                )
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class LastWriteMiddleware:
+    """Stamp successful writes with ``X-Last-Write`` and a ``last_write`` cookie.
+
+    :func:`~.database.get_read_db` reads from the primary while the stamp is
+    newer than the replica lag. The cookie expires after
+    ``DB_REPLICA_MAX_LAG_SECONDS``, when the replica must have caught up or be
+    bypassed anyway.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                stamp = f"{time.time():.3f}"
+                max_age = int(settings.db_replica_max_lag_seconds + settings.db_replica_lag_check_seconds) + 1
+                cookie = f"{LAST_WRITE_COOKIE}={stamp}; Max-Age={max_age}; Path=/; SameSite=Lax"
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (LAST_WRITE_HEADER.encode("latin-1"), stamp.encode("latin-1")),
+                    (b"set-cookie", cookie.encode("latin-1")),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
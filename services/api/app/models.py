@@ -1,15 +1,19 @@
 """SQLAlchemy models for the Macro Library API."""
 
 from sqlalchemy import (
+    DDL,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
     Text,
     UniqueConstraint,
+    event,
+    false,
     func,
 )
 from sqlalchemy.orm import declarative_base, relationship
@@ -44,7 +48,7 @@ class Membership(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
     workspace_id = Column(Integer, ForeignKey("workspaces.id"), index=True, nullable=False)
-    role = Column(String, default="viewer", nullable=False)  # admin|editor|viewer
+    role = Column(String, default="viewer", server_default="viewer", nullable=False)  # admin|editor|viewer
 
     user = relationship("User", back_populates="memberships")
     workspace = relationship("Workspace", back_populates="members")
@@ -62,7 +66,8 @@ class Snippet(Base):
     body = Column(Text, nullable=False)
     tags = Column(JSON, nullable=True)
     variables = Column(JSON, nullable=True)
-    is_archived = Column(Boolean, default=False, nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    is_archived = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     updated_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
@@ -84,14 +89,32 @@ class SnippetVersion(Base):
     version = Column(Integer, nullable=False)
     name = Column(String, nullable=False)
     trigger = Column(String, nullable=False)
-    body = Column(Text, nullable=False)
+    # Legacy rows keep the body inline; new rows reference a blob or a delta (see versioning.py).
+    body = Column(Text, nullable=True)
     tags = Column(JSON, nullable=True)
     variables = Column(JSON, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    body_hash = Column(String(64), nullable=True)
+    base_version = Column(Integer, nullable=True)
+    delta = Column(JSON, nullable=True)
+    delta_depth = Column(Integer, default=0, server_default="0", nullable=False)
     edited_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     snippet = relationship("Snippet", back_populates="versions")
 
+    __table_args__ = (Index("ix_snippet_versions_snippet_version", "snippet_id", "version"),)
+
+
+class SnippetBlob(Base):
+    __tablename__ = "snippet_blobs"
+
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    body = Column(Text, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
@@ -103,6 +126,40 @@ class AuditLog(Base):
     meta = Column(JSON, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
+    __table_args__ = (Index("ix_audit_logs_workspace_created", "workspace_id", "created_at", "id"),)
+
+
+# Dialect-specific meta lookup indexes (migration 0007), so create_all builds them too.
+# Keep in sync with ``app.audit.META_FILTER_KEYS``.
+_META_EXPRESSIONS = {"postgresql": "(meta ->> '{key}')", "sqlite": "json_extract(meta, '$.{key}')"}
+for _key in ("dataset_id", "snippet_id"):
+    for _dialect, _expression in _META_EXPRESSIONS.items():
+        _expression = _expression.format(key=_key)
+        event.listen(
+            AuditLog.__table__,
+            "after_create",
+            DDL(
+                f"CREATE INDEX ix_audit_logs_meta_{_key} ON audit_logs ({_expression}, created_at, id) "
+                f"WHERE {_expression} IS NOT NULL"
+            ).execute_if(dialect=_dialect),
+        )
+
+
+class AuditLogArchive(Base):
+    """Audit rows moved out of ``audit_logs`` once they pass the retention window."""
+
+    __tablename__ = "audit_logs_archive"
+
+    id = Column(Integer, primary_key=True)
+    workspace_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=True)
+    action = Column(String, nullable=False)
+    meta = Column(JSON, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (Index("ix_audit_logs_archive_workspace_created", "workspace_id", "created_at", "id"),)
+
 
 class ApiKey(Base):
     __tablename__ = "api_keys"
@@ -110,14 +167,14 @@ class ApiKey(Base):
     id = Column(Integer, primary_key=True)
     workspace_id = Column(Integer, ForeignKey("workspaces.id"), index=True, nullable=False)
     name = Column(String, nullable=False)
+    prefix = Column(String(16), unique=True, index=True, nullable=True)
     token_hash = Column(String, nullable=False)
+    role = Column(String, default="editor", server_default="editor", nullable=False)  # editor|viewer
+    rate_limit_per_minute = Column(Integer, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
 
 
-from .database import engine
-
 # Ensure dataset models are imported so metadata includes them
-from .models_datasets import Dataset, DatasetRow, DatasetPermission  # noqa: F401
-
-Base.metadata.create_all(bind=engine)
+from .models_datasets import Dataset, DatasetRow, DatasetPermission, DatasetSnapshot, DatasetSnapshotRow  # noqa: F401,E402
@@ -2,12 +2,10 @@
 
 from __future__ import annotations
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, JSON, String, func, Index
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, JSON, String, false, func, Index
 from sqlalchemy.orm import relationship
 
 from .models import Base
-from .database import engine
-from .config import settings
 
 
 class Dataset(Base):
@@ -18,10 +16,15 @@ class Dataset(Base):
     owner_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     created_by_client = Column(String, nullable=True, index=True)
     schema = Column(JSON, nullable=False)
+    # Maintained by the row write paths (see ``app.dataset_counts``); listings read these instead of counting.
+    live_row_count = Column(Integer, nullable=False, default=0, server_default='0')
+    archived_row_count = Column(Integer, nullable=False, default=0, server_default='0')
+    approx_bytes = Column(BigInteger, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
-    owner = relationship('User', lazy='joined')
+    # Loaded on access only; listings never need the owner.
+    owner = relationship('User', lazy='select')
 
 
 class DatasetPermission(Base):
@@ -30,7 +33,7 @@ class DatasetPermission(Base):
     id = Column(Integer, primary_key=True)
     dataset_id = Column(Integer, ForeignKey('datasets.id'), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
-    role = Column(String, default='viewer', nullable=False)
+    role = Column(String, default='viewer', server_default='viewer', nullable=False)
 
     __table_args__ = (Index('ix_dataset_perm_unique', 'dataset_id', 'user_id', unique=True),)
 
@@ -41,11 +44,39 @@ class DatasetRow(Base):
     id = Column(Integer, primary_key=True)
     dataset_id = Column(Integer, ForeignKey('datasets.id'), nullable=False, index=True)
     data = Column(JSON, nullable=False)
-    archived = Column(Boolean, default=False, nullable=False)
+    # sha256 of the canonical JSON of ``data``; NULL when unknown (edited since last import).
+    content_hash = Column(String(64), nullable=True)
+    archived = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
 
-# Auto-create tables for SQLite dev convenience
-if settings.db_url.startswith('sqlite'):
-    Base.metadata.create_all(bind=engine)
+class DatasetSnapshot(Base):
+    """Named point-in-time copy of a dataset's schema and live rows.
+
+    ``full`` snapshots copy every live row up front. ``cow`` (copy-on-write)
+    snapshots copy a row only before it is first changed or archived; rows
+    with ids above ``max_row_id`` were added later and are not part of it.
+    """
+
+    __tablename__ = 'dataset_snapshots'
+
+    id = Column(Integer, primary_key=True)
+    dataset_id = Column(Integer, ForeignKey('datasets.id'), nullable=False, index=True)
+    name = Column(String(255), nullable=False)
+    mode = Column(String(8), nullable=False, default='full')  # full|cow
+    schema = Column(JSON, nullable=False)
+    max_row_id = Column(Integer, nullable=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (Index('ix_dataset_snapshots_dataset_name', 'dataset_id', 'name', unique=True),)
+
+
+class DatasetSnapshotRow(Base):
+    __tablename__ = 'dataset_snapshot_rows'
+
+    snapshot_id = Column(Integer, ForeignKey('dataset_snapshots.id'), primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    data = Column(JSON, nullable=False)
+    content_hash = Column(String(64), nullable=True)
@@ -0,0 +1,84 @@
+"""Optional LIST partitioning of ``dataset_rows`` by ``dataset_id`` (Postgres only).
+
+Migration ``0011_dataset_row_partitions`` converts ``dataset_rows`` into a
+table partitioned by ``LIST (dataset_id)`` when it runs on Postgres with
+``DATASET_ROW_PARTITIONING=list``. Each dataset then owns one partition,
+``dataset_rows_p<id>``, with its own indexes (including the merge-key index)
+and its own vacuum work. Queries filter on ``dataset_id`` and are pruned to
+that one partition, and deleting a dataset drops its partition.
+
+List partitioning is used rather than hash because every partition holds
+exactly one dataset and can be dropped on its own. Nothing in the app assumes
+partitioning: it is detected from the catalog once per engine, and the helpers
+here are no-ops on a plain table or on SQLite.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+ROWS_TABLE = "dataset_rows"
+PARTITION_PREFIX = "dataset_rows_p"
+
+_lock = threading.Lock()
+_partitioned: Dict[str, bool] = {}
+
+
+def partitioning_requested(dialect_name: str) -> bool:
+    """Whether ``DATASET_ROW_PARTITIONING=list`` asks for partitioning on a database that supports it."""
+
+    return dialect_name == "postgresql" and os.getenv("DATASET_ROW_PARTITIONING", "none").lower() == "list"
+
+
+def partition_name(dataset_id: int) -> str:
+    return f"{PARTITION_PREFIX}{int(dataset_id)}"
+
+
+def is_partitioned(db: Session) -> bool:
+    """Whether ``dataset_rows`` is partitioned on this database (cached per engine; restart after migrating)."""
+
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    key = bind.engine.url.render_as_string(hide_password=True)
+    with _lock:
+        if key in _partitioned:
+            return _partitioned[key]
+    found = db.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": ROWS_TABLE}
+    ).first()
+    with _lock:
+        _partitioned[key] = found is not None
+    return found is not None
+
+
+def rows_table(db: Session, dataset_id: int) -> str:
+    """Table that physically holds the dataset's rows (its partition, or ``dataset_rows``)."""
+
+    return partition_name(dataset_id) if is_partitioned(db) else ROWS_TABLE
+
+
+def ensure_partition(db: Session, dataset_id: int) -> None:
+    """Create the dataset's partition; call in the transaction that creates the dataset."""
+
+    if is_partitioned(db):
+        db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(dataset_id)} "
+                f"PARTITION OF {ROWS_TABLE} FOR VALUES IN ({int(dataset_id)})"
+            )
+        )
+
+
+def drop_partition(db: Session, dataset_id: int) -> bool:
+    """Drop the dataset's partition with its rows and indexes; ``False`` when not partitioned."""
+
+    if not is_partitioned(db):
+        return False
+    db.execute(text(f"DROP TABLE IF EXISTS {partition_name(dataset_id)}"))
+    return True
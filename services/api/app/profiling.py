@@ -0,0 +1,138 @@
+"""Opt-in request profiling with a standard-library stack sampler.
+
+``cProfile`` only observes the thread that enables it, while sync endpoints
+and dependencies run in the threadpool, so a profiled request is instead
+sampled with ``sys._current_frames()`` from a helper thread. Output is written
+as collapsed stacks (``frame;frame;frame count``), the input format of
+``flamegraph.pl``, speedscope and inferno.
+
+Only stacks running on behalf of the profiled request are kept: the event
+loop thread while the request's task is current, and threadpool workers while
+they run a call submitted from the request's context, recognised by the value
+of a context variable captured when sampling starts. Only one request is
+profiled at a time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import Context, ContextVar
+from typing import Any, Optional
+
+_active = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _fold(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _worker_context(frame) -> Optional[Context]:
+    """The context a threadpool worker is running its current call in.
+
+    ``anyio`` workers hold the copied context in a local of their run loop while
+    ``Context.run`` executes the call, and drop it once the call returns.
+    """
+
+    while frame is not None:
+        for value in frame.f_locals.values():
+            if isinstance(value, Context):
+                return value
+        frame = frame.f_back
+    return None
+
+
+class StackSampler:
+    """Collect folded stacks of the threads serving a request every ``interval`` seconds.
+
+    :meth:`start` must be called from the request's task while ``var`` holds a
+    value unique to the request; worker threads are sampled while they run in a
+    context where ``var`` still holds that value.
+    """
+
+    def __init__(self, var: ContextVar[Any], interval: float = 0.005) -> None:
+        self.var = var
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._marker: Any = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task[Any]] = None
+
+    def start(self) -> None:
+        self._marker = self.var.get()
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.current_task()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _serves_request(self, ident: int, frame) -> bool:
+        if ident == self._loop_thread:
+            return asyncio.current_task(self._loop) is self._task
+        context = _worker_context(frame)
+        return context is not None and context.get(self.var) is self._marker
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == own or not self._serves_request(ident, frame):
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.samples[f"{names.get(ident, ident)};{_fold(frame)}"] += 1
+            time.sleep(self.interval)
+
+
+def try_start_profile(var: ContextVar[Any], interval: float) -> Optional[StackSampler]:
+    """Start a sampler for the request identified by ``var`` unless another
+    request is already being profiled. Must be called from the request's task."""
+
+    if not _active.acquire(blocking=False):
+        return None
+    sampler = StackSampler(var, interval)
+    sampler.start()
+    return sampler
+
+
+def finish_profile(sampler: StackSampler, directory: str, label: str) -> str:
+    """Stop ``sampler`` and write its collapsed stacks; returns the file name.
+
+    Joins the sampler thread and writes a file, so call it from the threadpool.
+    """
+
+    try:
+        samples = sampler.stop()
+    finally:
+        _active.release()
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")[:80] or "request"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{os.getpid()}.folded"
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as handle:
+        for stack, count in samples.most_common():
+            handle.write(f"{stack} {count}\n")
+    return name
@@ -3,46 +3,190 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Dict, Set
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from fastapi import WebSocket
 
+from .config import settings
+from .metrics import (
+    WS_BROADCAST_LATENCY,
+    WS_BROADCASTS_IN_FLIGHT,
+    WS_CONNECTIONS,
+    WS_EVICTIONS,
+    WS_FANOUT,
+    WS_MESSAGE_BYTES,
+    WS_ROOMS,
+)
+from .row_format import encode, upsert_message
+
+WireFormat = Tuple[str, str]
+DEFAULT_FORMAT: WireFormat = ("objects", "json")
+
+
+@dataclass
+class RoomStats:
+    broadcasts: int = 0
+    messages_sent: int = 0
+    bytes_sent: int = 0
+    evictions: int = 0
+    last_broadcast_ms: Optional[float] = None
+
 
 class DatasetHub:
-    """Manage WebSocket connections per dataset and broadcast updates."""
+    """Manage WebSocket connections per dataset and broadcast updates.
+
+    Each broadcast serializes the message once and sends it to a snapshot of
+    the room concurrently, outside the hub lock, so one slow socket neither
+    blocks the rest of the room nor other rooms. A per-room send lock keeps
+    messages to a room in order. Sockets that fail or exceed
+    ``WS_SEND_TIMEOUT_SECONDS`` are evicted.
+
+    Sockets may ask for a columnar layout and/or MessagePack on connect; the
+    message is then encoded once per distinct format in the room rather than
+    once per socket.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, send_timeout: Optional[float] = None) -> None:
         self._lock = asyncio.Lock()
         self._rooms: Dict[int, Set[WebSocket]] = {}
+        self._stats: Dict[int, RoomStats] = {}
+        self._send_locks: Dict[int, asyncio.Lock] = {}
+        self._formats: Dict[WebSocket, WireFormat] = {}
+        self._in_flight = 0
+        self.send_timeout = settings.ws_send_timeout_seconds if send_timeout is None else send_timeout
 
-    async def connect(self, dataset_id: int, websocket: WebSocket) -> None:
+    async def connect(
+        self, dataset_id: int, websocket: WebSocket, layout: str = "objects", encoding: str = "json"
+    ) -> None:
         await websocket.accept()
         async with self._lock:
             self._rooms.setdefault(dataset_id, set()).add(websocket)
+            if (layout, encoding) != DEFAULT_FORMAT:
+                self._formats[websocket] = (layout, encoding)
+            self._stats.setdefault(dataset_id, RoomStats())
+            self._update_gauges()
 
     async def disconnect(self, dataset_id: int, websocket: WebSocket) -> None:
         async with self._lock:
-            connections = self._rooms.get(dataset_id)
-            if not connections:
+            self._remove(dataset_id, {websocket})
+
+    async def broadcast(self, dataset_id: int, message: dict, exclude: Optional[WebSocket] = None) -> None:
+        """Send ``message`` to every socket in the room except ``exclude`` (the sender of an edit)."""
+
+        async with self._lock:
+            if dataset_id not in self._rooms:
                 return
-            connections.discard(websocket)
-            if not connections:
-                self._rooms.pop(dataset_id, None)
+            send_lock = self._send_locks.setdefault(dataset_id, asyncio.Lock())
 
-    async def broadcast(self, dataset_id: int, message: dict) -> None:
-        dead: Set[WebSocket] = set()
+        kind = str(message.get("type", "unknown"))
+        payloads: Dict[WireFormat, Union[str, bytes]] = {}
+        self._in_flight += 1
+        WS_BROADCASTS_IN_FLIGHT.set(self._in_flight)
+        try:
+            async with send_lock:
+                started = time.perf_counter()
+                targets = [ws for ws in self._rooms.get(dataset_id, ()) if ws is not exclude]
+                formats = [self._formats.get(ws, DEFAULT_FORMAT) for ws in targets]
+                for fmt in formats:
+                    if fmt not in payloads:
+                        payloads[fmt] = self._encode(message, fmt)
+                results = await asyncio.gather(*(self._send(ws, payloads[fmt]) for ws, fmt in zip(targets, formats)))
+                elapsed = time.perf_counter() - started
+        finally:
+            self._in_flight -= 1
+            WS_BROADCASTS_IN_FLIGHT.set(self._in_flight)
+        dead = {ws for ws, ok in zip(targets, results) if not ok}
+        sizes = {fmt: len(payload.encode("utf-8") if isinstance(payload, str) else payload) for fmt, payload in payloads.items()}
+
+        WS_BROADCAST_LATENCY.labels(type=kind).observe(elapsed)
+        for size in sizes.values():
+            WS_MESSAGE_BYTES.labels(type=kind).observe(size)
+        WS_FANOUT.observe(len(targets))
         async with self._lock:
-            for ws in self._rooms.get(dataset_id, set()):
-                try:
-                    await ws.send_json(message)
-                except Exception:
-                    dead.add(ws)
+            stats = self._stats.get(dataset_id)
+            if stats is not None:
+                stats.broadcasts += 1
+                stats.messages_sent += len(targets) - len(dead)
+                stats.bytes_sent += sum(sizes[fmt] for fmt, ok in zip(formats, results) if ok)
+                stats.last_broadcast_ms = round(elapsed * 1000, 3)
             if dead:
-                room = self._rooms.get(dataset_id)
-                if room is not None:
-                    room.difference_update(dead)
-                    if not room:
-                        self._rooms.pop(dataset_id, None)
+                WS_EVICTIONS.inc(len(dead))
+                if stats is not None:
+                    stats.evictions += len(dead)
+                self._remove(dataset_id, dead)
+        if dead:
+            # Close evicted sockets so clients notice and reconnect instead of silently missing updates.
+            await asyncio.gather(*(self._close(ws) for ws in dead))
+
+    async def send(self, dataset_id: int, websocket: WebSocket, messages: List[dict]) -> bool:
+        """Send ``messages`` to one socket in its wire format, ordered with the room's broadcasts."""
+
+        async with self._lock:
+            if websocket not in self._rooms.get(dataset_id, ()):
+                return False
+            send_lock = self._send_locks.setdefault(dataset_id, asyncio.Lock())
+        fmt = self._formats.get(websocket, DEFAULT_FORMAT)
+        async with send_lock:
+            for message in messages:
+                if not await self._send(websocket, self._encode(message, fmt)):
+                    return False
+        return True
+
+    @staticmethod
+    def _encode(message: dict, fmt: WireFormat) -> Union[str, bytes]:
+        layout, encoding = fmt
+        if layout != "objects" and message.get("type") == "rows_upsert":
+            message = upsert_message(message["rows"], layout)
+        return encode(message, encoding)
+
+    async def _send(self, websocket: WebSocket, payload: Union[str, bytes]) -> bool:
+        try:
+            send = websocket.send_bytes(payload) if isinstance(payload, bytes) else websocket.send_text(payload)
+            await asyncio.wait_for(send, timeout=self.send_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _close(self, websocket: WebSocket) -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=1011), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def _remove(self, dataset_id: int, sockets: Set[WebSocket]) -> None:
+        connections = self._rooms.get(dataset_id)
+        if connections is None:
+            return
+        connections.difference_update(sockets)
+        for websocket in sockets:
+            self._formats.pop(websocket, None)
+        if not connections:
+            self._rooms.pop(dataset_id, None)
+            self._stats.pop(dataset_id, None)
+            self._send_locks.pop(dataset_id, None)
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        WS_ROOMS.set(len(self._rooms))
+        WS_CONNECTIONS.set(sum(len(room) for room in self._rooms.values()))
+
+    async def snapshot(self, limit: int = 100) -> Dict[str, Any]:
+        """Return hub totals plus per-room stats for the largest rooms."""
+
+        async with self._lock:
+            rooms: List[Dict[str, Any]] = [
+                {"dataset_id": dataset_id, "connections": len(sockets), **asdict(self._stats.get(dataset_id, RoomStats()))}
+                for dataset_id, sockets in self._rooms.items()
+            ]
+        rooms.sort(key=lambda room: room["connections"], reverse=True)
+        return {
+            "rooms": len(rooms),
+            "connections": sum(room["connections"] for room in rooms),
+            "broadcasts_in_flight": self._in_flight,
+            "largest_rooms": rooms[:limit],
+        }
 
 
 hub = DatasetHub()
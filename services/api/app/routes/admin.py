@@ -0,0 +1,99 @@
+"""Operator endpoints for diagnosing and maintaining a running instance."""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+
+from .. import schemas
+
+from ..audit import record_audit
+from ..database import get_db, get_read_db
+from ..dataset_cache import forget_dataset
+from ..dataset_counts import reconcile_counts
+from ..dataset_rows import drop_merge_index
+from ..dataset_snapshots import delete_dataset_snapshots
+from ..dependencies import require_admin_token
+from ..models_datasets import Dataset, DatasetPermission, DatasetRow
+from ..partitions import drop_partition
+from ..realtime import hub
+from .audit import audit_page
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/realtime")
+async def realtime_snapshot(limit: int = Query(default=100, ge=1, le=1000)) -> dict:
+    """Return open rooms, connection counts and per-room broadcast stats."""
+
+    return await hub.snapshot(limit=limit)
+
+
+@router.get("/audit", response_model=List[schemas.AuditLogOut])
+def list_all_audit_logs(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None, description="Value of X-Next-Cursor from the previous page"),
+    workspace_id: Optional[int] = Query(default=None),
+    action: Optional[str] = Query(default=None),
+    user_id: Optional[int] = Query(default=None),
+    dataset_id: Optional[int] = Query(default=None, description="Match events whose meta has this dataset_id"),
+    snippet_id: Optional[int] = Query(default=None, description="Match events whose meta has this snippet_id"),
+    archived: bool = Query(default=False, description="Browse archived events instead of recent ones"),
+    db: Session = Depends(get_read_db),
+) -> List[schemas.AuditLogOut]:
+    """Browse audit events across workspaces, including dataset events, which belong to none."""
+
+    return audit_page(
+        db,
+        response,
+        archived=archived,
+        workspace_id=workspace_id,
+        limit=limit,
+        cursor=cursor,
+        action=action,
+        user_id=user_id,
+        meta_filters={"dataset_id": dataset_id, "snippet_id": snippet_id},
+    )
+
+
+@router.post("/datasets/reconcile-counts")
+def reconcile_dataset_counts(
+    dataset_id: Optional[int] = Query(default=None, description="Limit to one dataset"),
+    db: Session = Depends(get_db),
+) -> dict:
+    """Recount dataset rows and sizes from ``dataset_rows`` and repair counters that drifted."""
+
+    fixed = reconcile_counts(db, dataset_id)
+    if fixed:
+        record_audit(db, action="reconcile_dataset_counts", meta={"datasets": [item["dataset_id"] for item in fixed]})
+    db.commit()
+    return {"fixed": fixed}
+
+
+@router.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: int, db: Session = Depends(get_db)) -> dict:
+    """Permanently delete a dataset with its rows, snapshots and permissions.
+
+    On a partitioned ``dataset_rows`` the rows go with a ``DROP TABLE`` of the
+    dataset's partition instead of a row-by-row ``DELETE``. This cannot be
+    undone, so it is an operator action rather than a dataset route.
+    """
+
+    dataset = db.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    created_by_client = dataset.created_by_client
+
+    delete_dataset_snapshots(db, dataset_id)
+    if not drop_partition(db, dataset_id):
+        drop_merge_index(db, dataset_id)
+        db.query(DatasetRow).filter(DatasetRow.dataset_id == dataset_id).delete(synchronize_session=False)
+    db.query(DatasetPermission).filter(DatasetPermission.dataset_id == dataset_id).delete(synchronize_session=False)
+    db.delete(dataset)
+    record_audit(db, action="delete_dataset", meta={"dataset_id": dataset_id})
+    db.commit()
+    forget_dataset(dataset_id, created_by_client)
+
+    await hub.broadcast(dataset_id, {"type": "dataset_deleted", "id": dataset_id})
+    return {"deleted": True}
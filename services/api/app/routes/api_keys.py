@@ -0,0 +1,94 @@
+"""Workspace API key management endpoints."""
+
+from datetime import datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..api_keys import forget_api_key, generate_key, hash_key
+from ..audit import record_audit
+from ..database import get_db
+from ..dependencies import get_current_user
+from ..models import ApiKey
+from ..utils import require_membership
+
+router = APIRouter(prefix="/workspaces/{workspace_id:int}", tags=["api-keys"])
+
+
+@router.post("/api-keys", response_model=schemas.ApiKeyCreated, status_code=status.HTTP_201_CREATED)
+def create_api_key(
+    workspace_id: int,
+    payload: schemas.ApiKeyCreate,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+) -> schemas.ApiKeyCreated:
+    """Create a workspace-scoped key; the plaintext token is only returned here."""
+
+    require_membership(db, user, workspace_id, roles=["admin"])
+    prefix, token = generate_key()
+    key = ApiKey(
+        workspace_id=workspace_id,
+        name=payload.name,
+        prefix=prefix,
+        token_hash=hash_key(token),
+        role=payload.role,
+        rate_limit_per_minute=payload.rate_limit_per_minute,
+        created_by=user.id,
+    )
+    db.add(key)
+    db.flush()
+    record_audit(
+        db,
+        workspace_id=workspace_id,
+        user_id=user.id,
+        api_key_id=user.api_key_id,
+        action="create_api_key",
+        meta={"api_key_id": key.id, "prefix": prefix},
+    )
+    db.commit()
+    db.refresh(key)
+    return schemas.ApiKeyCreated(**schemas.ApiKeyOut.model_validate(key).model_dump(), token=token)
+
+
+@router.get("/api-keys", response_model=List[schemas.ApiKeyOut])
+def list_api_keys(
+    workspace_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+) -> List[schemas.ApiKeyOut]:
+    """List key metadata for the workspace (never the tokens)."""
+
+    require_membership(db, user, workspace_id, roles=["admin"])
+    keys = db.query(ApiKey).filter(ApiKey.workspace_id == workspace_id).order_by(ApiKey.id).all()
+    return [schemas.ApiKeyOut.model_validate(key) for key in keys]
+
+
+@router.delete("/api-keys/{key_id:int}", response_model=schemas.ApiKeyOut)
+def revoke_api_key(
+    workspace_id: int,
+    key_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+) -> schemas.ApiKeyOut:
+    """Revoke a key; cached verifications are dropped immediately in this process."""
+
+    require_membership(db, user, workspace_id, roles=["admin"])
+    key = db.query(ApiKey).filter(ApiKey.id == key_id, ApiKey.workspace_id == workspace_id).first()
+    if key is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="API key not found")
+    if key.revoked_at is None:
+        key.revoked_at = datetime.utcnow()
+        record_audit(
+            db,
+            workspace_id=workspace_id,
+            user_id=user.id,
+            api_key_id=user.api_key_id,
+            action="revoke_api_key",
+            meta={"api_key_id": key.id},
+        )
+        db.commit()
+        db.refresh(key)
+    forget_api_key(key.prefix)
+    return schemas.ApiKeyOut.model_validate(key)
@@ -1,36 +1,76 @@
 """Audit log endpoints."""
 
-from typing import List
+import base64
+import binascii
+from datetime import datetime
+from typing import Dict, List, Tuple
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from sqlalchemy import and_, or_, select
 from sqlalchemy.orm import Session
 
 from .. import schemas
-from ..database import get_db
+from ..audit import archive_audit_logs, meta_field, meta_value
+from ..database import get_db, get_read_db, session_scope
 from ..dependencies import get_current_user
-from ..models import AuditLog
+from ..models import AuditLog, AuditLogArchive
 from ..utils import require_membership
 
 router = APIRouter(prefix="/workspaces/{workspace_id:int}", tags=["audit"])
 
 
-@router.get("/audit", response_model=List[schemas.AuditLogOut])
-def list_audit_logs(
-    workspace_id: int,
-    limit: int = Query(default=100, ge=1, le=500),
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+def _encode_cursor(created_at: datetime, log_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{log_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, log_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def audit_page(
+    db: Session,
+    response: Response,
+    *,
+    archived: bool,
+    workspace_id: int | None,
+    limit: int,
+    cursor: str | None,
+    action: str | None,
+    user_id: int | None,
+    meta_filters: Dict[str, int | None],
 ) -> List[schemas.AuditLogOut]:
-    """Return recent audit log events for the workspace."""
-
-    require_membership(db, user.id, workspace_id)
-    logs = (
-        db.query(AuditLog)
-        .filter(AuditLog.workspace_id == workspace_id)
-        .order_by(AuditLog.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+    """Return one keyset page of audit events, newest first, setting ``X-Next-Cursor`` when more may follow.
+
+    ``workspace_id=None`` spans every workspace, including events recorded
+    outside one (datasets).
+    """
+
+    model = AuditLogArchive if archived else AuditLog
+    dialect = db.get_bind().dialect.name
+    query = select(model)
+    if workspace_id is not None:
+        query = query.where(model.workspace_id == workspace_id)
+    if action:
+        query = query.where(model.action == action)
+    if user_id is not None:
+        query = query.where(model.user_id == user_id)
+    for key, value in meta_filters.items():
+        if value is not None:
+            query = query.where(meta_field(model.meta, key, dialect) == meta_value(value, dialect))
+    if cursor:
+        created_at, log_id = _decode_cursor(cursor)
+        query = query.where(
+            or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < log_id))
+        )
+    logs = db.scalars(query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)).all()
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(logs[-1].created_at, logs[-1].id)
     return [
         schemas.AuditLogOut(
             id=log.id,
@@ -42,3 +82,58 @@ def list_audit_logs(
         )
         for log in logs
     ]
+
+
+@router.get("/audit", response_model=List[schemas.AuditLogOut])
+def list_audit_logs(
+    workspace_id: int,
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=500),
+    cursor: str | None = Query(default=None, description="Value of X-Next-Cursor from the previous page"),
+    action: str | None = Query(default=None),
+    user_id: int | None = Query(default=None),
+    snippet_id: int | None = Query(default=None, description="Match events whose meta has this snippet_id"),
+    archived: bool = Query(default=False, description="Browse archived events instead of recent ones"),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user),
+) -> List[schemas.AuditLogOut]:
+    """Return audit log events for the workspace, newest first.
+
+    Pages are keyset-paginated on ``(created_at, id)``; when more rows may
+    follow, the ``X-Next-Cursor`` response header carries the next cursor.
+    Dataset events belong to no workspace; operators browse them with
+    ``GET /admin/audit?dataset_id=``.
+    """
+
+    require_membership(db, user, workspace_id)
+    return audit_page(
+        db,
+        response,
+        archived=archived,
+        workspace_id=workspace_id,
+        limit=limit,
+        cursor=cursor,
+        action=action,
+        user_id=user_id,
+        meta_filters={"snippet_id": snippet_id},
+    )
+
+
+@router.post("/audit/archive", status_code=status.HTTP_202_ACCEPTED)
+def archive_workspace_audit_logs(
+    workspace_id: int,
+    background_tasks: BackgroundTasks,
+    older_than_days: int | None = Query(default=None, ge=1, description="Defaults to AUDIT_RETENTION_DAYS"),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Schedule a job that moves old audit events to the archive table."""
+
+    require_membership(db, user, workspace_id, roles=["admin"])
+    background_tasks.add_task(_run_archive, workspace_id, older_than_days)
+    return {"status": "scheduled"}
+
+
+def _run_archive(workspace_id: int, older_than_days: int | None) -> None:
+    with session_scope() as session:
+        archive_audit_logs(session, older_than_days=older_than_days, workspace_id=workspace_id)
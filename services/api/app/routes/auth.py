@@ -1,5 +1,7 @@
 """Development auth endpoints (placeholder until OAuth)."""
 
+from datetime import datetime, timedelta, timezone
+
 from fastapi import APIRouter, Depends
 from jose import jwt
 from sqlalchemy.orm import Session
@@ -8,6 +10,7 @@ from .. import schemas
 from ..config import settings
 from ..database import get_db
 from ..models import Membership, User, Workspace
+from ..utils import invalidate_membership
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -17,8 +20,7 @@ def _get_or_create_workspace(db: Session) -> Workspace:
     if workspace is None:
         workspace = Workspace(name="Default Workspace")
         db.add(workspace)
-        db.commit()
-        db.refresh(workspace)
+        db.flush()
     return workspace
 
 
@@ -31,8 +33,7 @@ def magic_link_login(payload: schemas.MagicLinkRequest, db: Session = Depends(ge
     if user is None:
         user = User(email=email)
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        db.flush()
 
     workspace = _get_or_create_workspace(db)
     membership = (
@@ -41,9 +42,17 @@ def magic_link_login(payload: schemas.MagicLinkRequest, db: Session = Depends(ge
         .first()
     )
     if membership is None:
+        # A new user or workspace always implies a new membership, so this is the only commit.
         membership = Membership(user_id=user.id, workspace_id=workspace.id, role="admin")
         db.add(membership)
         db.commit()
-
-    token = jwt.encode({"sub": str(user.id)}, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+        invalidate_membership(user.id, workspace.id)
+
+    claims: dict = {"sub": str(user.id)}
+    if settings.auth_role_claims:
+        # Signed roles let read paths skip the membership query until the token expires.
+        rows = db.query(Membership.workspace_id, Membership.role).filter(Membership.user_id == user.id).all()
+        claims["roles"] = {str(workspace_id): role for workspace_id, role in rows}
+        claims["exp"] = datetime.now(timezone.utc) + timedelta(seconds=settings.auth_role_claims_ttl_seconds)
+    token = jwt.encode(claims, settings.jwt_secret, algorithm=settings.jwt_algorithm)
     return schemas.AuthToken(access_token=token)
@@ -1,18 +1,33 @@
 """Snippet-related endpoints for the Macro Library API."""
 
 from datetime import datetime
-import json
+import difflib
+import shutil
+import tempfile
 from typing import List
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, defer
 
 from .. import schemas
-from ..database import get_db
+from ..audit import record_audit
+from ..cache import MISSING, LRUCache
+from ..database import SessionLocal, get_db, get_read_db, session_scope
 from ..dependencies import get_current_user
-from ..models import AuditLog, Snippet, SnippetVersion
-from ..utils import record_snippet_mutation, require_membership, serialize_snippet
+from ..models import Snippet, SnippetVersion
+from ..snippet_import import ImportFormatError, import_jobs, import_snippets, run_import_job
+from ..templating import CompiledTemplate, cached_template, template_cache
+from ..utils import record_snippet_mutation, require_membership, serialize_snippet, snippet_content_hash
+from ..versioning import (
+    compact_history,
+    current_version,
+    latest_heads,
+    load_version_body,
+    record_version,
+    workspace_versions,
+)
 
 router = APIRouter(prefix="/workspaces/{workspace_id:int}", tags=["snippets"])
 
@@ -21,18 +36,23 @@ router = APIRouter(prefix="/workspaces/{workspace_id:int}", tags=["snippets"])
 def list_snippets(
     workspace_id: int,
     q: str | None = Query(default=None, description="Optional search query"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user=Depends(get_current_user),
 ) -> List[schemas.SnippetOut]:
     """Return snippets for a workspace with optional fuzzy search."""
 
-    require_membership(db, user.id, workspace_id)
-    query = db.query(Snippet).filter(Snippet.workspace_id == workspace_id, Snippet.is_archived.is_(False))
+    require_membership(db, user, workspace_id)
+    versions = workspace_versions(workspace_id)
+    query = (
+        db.query(Snippet, versions.c.version)
+        .outerjoin(versions, versions.c.snippet_id == Snippet.id)
+        .filter(Snippet.workspace_id == workspace_id, Snippet.is_archived.is_(False))
+    )
     if q:
         like = f"%{q}%"
         query = query.filter(or_(Snippet.name.ilike(like), Snippet.trigger.ilike(like), Snippet.body.ilike(like)))
-    snippets = query.order_by(Snippet.updated_at.desc()).all()
-    return [serialize_snippet(snippet) for snippet in snippets]
+    rows = query.order_by(Snippet.updated_at.desc()).all()
+    return [serialize_snippet(snippet, version=version or 1) for snippet, version in rows]
 
 
 @router.post("/snippets", response_model=schemas.SnippetOut, status_code=status.HTTP_201_CREATED)
@@ -44,7 +64,7 @@ def create_snippet(
 ) -> schemas.SnippetOut:
     """Create a new snippet and its first version."""
 
-    require_membership(db, user.id, workspace_id, roles=["admin", "editor"])
+    require_membership(db, user, workspace_id, roles=["admin", "editor"])
     existing = (
         db.query(Snippet)
         .filter(Snippet.workspace_id == workspace_id, Snippet.trigger == payload.trigger)
@@ -60,30 +80,23 @@ def create_snippet(
         body=payload.body,
         tags=payload.tags,
         variables=payload.variables,
+        content_hash=snippet_content_hash(
+            payload.name, payload.trigger, payload.body, payload.tags, payload.variables
+        ),
         created_by=user.id,
         updated_by=user.id,
     )
     db.add(snippet)
     db.flush()
 
-    version = SnippetVersion(
-        snippet_id=snippet.id,
-        version=1,
-        name=snippet.name,
-        trigger=snippet.trigger,
-        body=snippet.body,
-        tags=snippet.tags,
-        variables=snippet.variables,
-        edited_by=user.id,
-    )
-    db.add(version)
-    db.add(
-        AuditLog(
-            workspace_id=workspace_id,
-            user_id=user.id,
-            action="create_snippet",
-            meta={"snippet_id": snippet.id},
-        )
+    record_version(db, snippet, user.id)
+    record_audit(
+        db,
+        workspace_id=workspace_id,
+        user_id=user.id,
+        api_key_id=user.api_key_id,
+        action="create_snippet",
+        meta={"snippet_id": snippet.id},
     )
     db.commit()
     db.refresh(snippet)
@@ -101,7 +114,7 @@ def update_snippet(
 ) -> schemas.SnippetOut:
     """Update a snippet and append a new version."""
 
-    require_membership(db, user.id, workspace_id, roles=["admin", "editor"])
+    require_membership(db, user, workspace_id, roles=["admin", "editor"])
     snippet = (
         db.query(Snippet)
         .filter(Snippet.id == snippet_id, Snippet.workspace_id == workspace_id)
@@ -110,40 +123,28 @@ def update_snippet(
     if snippet is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snippet not found")
 
-    last_version = (
-        db.query(SnippetVersion)
-        .filter(SnippetVersion.snippet_id == snippet.id)
-        .order_by(SnippetVersion.version.desc())
-        .first()
-    )
-    next_version = (last_version.version if last_version else 0) + 1
+    content_hash = snippet_content_hash(payload.name, payload.trigger, payload.body, payload.tags, payload.variables)
+    if content_hash == snippet.content_hash:
+        # Nothing changed: keep the history as-is instead of appending a duplicate version.
+        return serialize_snippet(snippet, version=current_version(db, snippet.id))
 
+    previous_body = snippet.body
     snippet.name = payload.name
     snippet.trigger = payload.trigger
     snippet.body = payload.body
     snippet.tags = payload.tags
     snippet.variables = payload.variables
+    snippet.content_hash = content_hash
     snippet.updated_by = user.id
+    next_version = record_version(db, snippet, user.id, previous_body)
 
-    db.add(
-        SnippetVersion(
-            snippet_id=snippet.id,
-            version=next_version,
-            name=snippet.name,
-            trigger=snippet.trigger,
-            body=snippet.body,
-            tags=snippet.tags,
-            variables=snippet.variables,
-            edited_by=user.id,
-        )
-    )
-    db.add(
-        AuditLog(
-            workspace_id=workspace_id,
-            user_id=user.id,
-            action="update_snippet",
-            meta={"snippet_id": snippet.id, "version": next_version},
-        )
+    record_audit(
+        db,
+        workspace_id=workspace_id,
+        user_id=user.id,
+        api_key_id=user.api_key_id,
+        action="update_snippet",
+        meta={"snippet_id": snippet.id, "version": next_version},
     )
     db.commit()
     db.refresh(snippet)
@@ -161,7 +162,7 @@ def restore_snippet_version(
 ) -> schemas.SnippetOut:
     """Restore a snippet to a previous version (records a new version)."""
 
-    require_membership(db, user.id, workspace_id, roles=["admin", "editor"])
+    require_membership(db, user, workspace_id, roles=["admin", "editor"])
     snippet = (
         db.query(Snippet)
         .filter(Snippet.id == snippet_id, Snippet.workspace_id == workspace_id)
@@ -178,40 +179,30 @@ def restore_snippet_version(
     if version_row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version not found")
 
-    last_version = (
-        db.query(SnippetVersion)
-        .filter(SnippetVersion.snippet_id == snippet.id)
-        .order_by(SnippetVersion.version.desc())
-        .first()
+    body = load_version_body(db, version_row)
+    content_hash = version_row.content_hash or snippet_content_hash(
+        version_row.name, version_row.trigger, body, version_row.tags, version_row.variables
     )
-    next_version = (last_version.version if last_version else 0) + 1
+    if content_hash == snippet.content_hash:
+        return serialize_snippet(snippet, version=current_version(db, snippet.id))
 
+    previous_body = snippet.body
     snippet.name = version_row.name
     snippet.trigger = version_row.trigger
-    snippet.body = version_row.body
+    snippet.body = body
     snippet.tags = version_row.tags
     snippet.variables = version_row.variables
+    snippet.content_hash = content_hash
     snippet.updated_by = user.id
+    next_version = record_version(db, snippet, user.id, previous_body)
 
-    db.add(
-        SnippetVersion(
-            snippet_id=snippet.id,
-            version=next_version,
-            name=snippet.name,
-            trigger=snippet.trigger,
-            body=snippet.body,
-            tags=snippet.tags,
-            variables=snippet.variables,
-            edited_by=user.id,
-        )
-    )
-    db.add(
-        AuditLog(
-            workspace_id=workspace_id,
-            user_id=user.id,
-            action="restore_version",
-            meta={"snippet_id": snippet.id, "to_version": next_version, "from_version": version},
-        )
+    record_audit(
+        db,
+        workspace_id=workspace_id,
+        user_id=user.id,
+        api_key_id=user.api_key_id,
+        action="restore_version",
+        meta={"snippet_id": snippet.id, "to_version": next_version, "from_version": version},
     )
     db.commit()
     db.refresh(snippet)
@@ -219,23 +210,258 @@ def restore_snippet_version(
     return serialize_snippet(snippet, version=next_version)
 
 
+# Versions are immutable, so cached bodies and diffs are keyed by content hash and never go stale.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+_body_cache = LRUCache(maxsize=2048)
+_diff_cache = LRUCache(maxsize=1024)
+
+_VERSION_META_COLUMNS = (
+    SnippetVersion.version,
+    SnippetVersion.name,
+    SnippetVersion.trigger,
+    SnippetVersion.tags,
+    SnippetVersion.variables,
+    SnippetVersion.content_hash,
+    SnippetVersion.edited_by,
+    SnippetVersion.created_at,
+)
+
+
+def _ensure_snippet(db: Session, workspace_id: int, snippet_id: int) -> None:
+    found = db.execute(
+        select(Snippet.id).where(Snippet.id == snippet_id, Snippet.workspace_id == workspace_id)
+    ).first()
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snippet not found")
+
+
+def _version_meta(row) -> schemas.SnippetVersionMeta:
+    return schemas.SnippetVersionMeta(
+        version=row.version,
+        name=row.name,
+        trigger=row.trigger,
+        tags=row.tags or [],
+        variables=row.variables or {},
+        content_hash=row.content_hash,
+        edited_by=row.edited_by,
+        created_at=row.created_at,
+    )
+
+
+def _version_body(db: Session, row: SnippetVersion) -> str:
+    if row.body_hash is None:
+        return load_version_body(db, row)
+    body = _body_cache.get(row.body_hash)
+    if body is MISSING:
+        body = load_version_body(db, row)
+        _body_cache.set(row.body_hash, body)
+    return body
+
+
+def _load_versions(db: Session, snippet_id: int, versions: set[int]) -> dict[int, SnippetVersion]:
+    rows = (
+        db.query(SnippetVersion)
+        .options(defer(SnippetVersion.body), defer(SnippetVersion.delta))
+        .filter(SnippetVersion.snippet_id == snippet_id, SnippetVersion.version.in_(versions))
+        .all()
+    )
+    found = {row.version: row for row in rows}
+    if len(found) != len(versions):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version not found")
+    return found
+
+
+def _immutable(response: Response, etag: str | None) -> None:
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    if etag:
+        response.headers["ETag"] = f'"{etag}"'
+
+
+@router.get("/snippets/{snippet_id:int}/versions", response_model=List[schemas.SnippetVersionMeta])
+def list_snippet_versions(
+    workspace_id: int,
+    snippet_id: int,
+    before: int | None = Query(default=None, ge=1, description="Only return versions older than this one"),
+    limit: int = Query(default=50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user),
+) -> List[schemas.SnippetVersionMeta]:
+    """Return version metadata (newest first) without transferring bodies."""
+
+    require_membership(db, user, workspace_id)
+    _ensure_snippet(db, workspace_id, snippet_id)
+    query = select(*_VERSION_META_COLUMNS).where(SnippetVersion.snippet_id == snippet_id)
+    if before is not None:
+        query = query.where(SnippetVersion.version < before)
+    rows = db.execute(query.order_by(SnippetVersion.version.desc()).limit(limit)).all()
+    return [_version_meta(row) for row in rows]
+
+
+@router.get("/snippets/{snippet_id:int}/versions/{version:int}", response_model=schemas.SnippetVersionOut)
+def get_snippet_version(
+    workspace_id: int,
+    snippet_id: int,
+    version: int,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user),
+) -> schemas.SnippetVersionOut:
+    """Return a single version including its reconstructed body."""
+
+    require_membership(db, user, workspace_id)
+    _ensure_snippet(db, workspace_id, snippet_id)
+    row = _load_versions(db, snippet_id, {version})[version]
+    _immutable(response, row.content_hash)
+    return schemas.SnippetVersionOut(**_version_meta(row).model_dump(), body=_version_body(db, row))
+
+
+@router.get(
+    "/snippets/{snippet_id:int}/versions/{from_version:int}/diff/{to_version:int}",
+    response_model=schemas.SnippetVersionDiff,
+)
+def diff_snippet_versions(
+    workspace_id: int,
+    snippet_id: int,
+    from_version: int,
+    to_version: int,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user),
+) -> schemas.SnippetVersionDiff:
+    """Return a server-side diff of fields and body between two versions."""
+
+    require_membership(db, user, workspace_id)
+    _ensure_snippet(db, workspace_id, snippet_id)
+    rows = _load_versions(db, snippet_id, {from_version, to_version})
+    old, new = rows[from_version], rows[to_version]
+    key = (old.content_hash, new.content_hash) if old.content_hash and new.content_hash else None
+    _immutable(response, f"v{from_version}-v{to_version}-{old.content_hash}-{new.content_hash}" if key else None)
+
+    cached = _diff_cache.get(key) if key else MISSING
+    if cached is MISSING:
+        fields = {
+            name: schemas.FieldChange(old=getattr(old, name), new=getattr(new, name))
+            for name in ("name", "trigger", "tags", "variables")
+            if (getattr(old, name) or None) != (getattr(new, name) or None)
+        }
+        # Cache only the hunks: other version pairs with the same contents share them under their own labels.
+        hunks = list(
+            difflib.unified_diff(_version_body(db, old).splitlines(), _version_body(db, new).splitlines(), lineterm="")
+        )[2:]
+        cached = (fields, hunks)
+        if key:
+            _diff_cache.set(key, cached)
+    fields, hunks = cached
+    body_diff = "\n".join([f"--- v{from_version}", f"+++ v{to_version}", *hunks]) if hunks else ""
+    return schemas.SnippetVersionDiff(
+        snippet_id=snippet_id,
+        from_version=from_version,
+        to_version=to_version,
+        fields=fields,
+        body_diff=body_diff,
+    )
+
+
+def _templates(db: Session, workspace_id: int, snippet_ids: set[int]) -> dict[int, tuple[int, CompiledTemplate]]:
+    """Return ``snippet_id -> (version, template)``, compiling only bodies missing from the cache."""
+
+    rows = db.execute(
+        select(Snippet.id, Snippet.content_hash).where(
+            Snippet.id.in_(snippet_ids),
+            Snippet.workspace_id == workspace_id,
+            Snippet.is_archived.is_(False),
+        )
+    ).all()
+    missing = snippet_ids - {row.id for row in rows}
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Snippet(s) not found: {', '.join(str(i) for i in sorted(missing))}",
+        )
+    heads = latest_heads(db, snippet_ids)
+    keys = {row.id: (row.id, heads[row.id].version if row.id in heads else 1, row.content_hash) for row in rows}
+
+    templates: dict[int, tuple[int, CompiledTemplate]] = {}
+    cold = []
+    for snippet_id, key in keys.items():
+        template = template_cache.get(key, None)
+        if template is None:
+            cold.append(snippet_id)
+        else:
+            templates[snippet_id] = (key[1], template)
+    if cold:
+        bodies = db.execute(select(Snippet.id, Snippet.body, Snippet.variables).where(Snippet.id.in_(cold))).all()
+        for row in bodies:
+            key = keys[row.id]
+            templates[row.id] = (key[1], cached_template(key, row.body, row.variables))
+    return templates
+
+
+def _render(snippet_id: int, version: int, template: CompiledTemplate, values, strict: bool) -> schemas.RenderResult:
+    text, missing = template.render(values)
+    if strict and missing:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Missing values for snippet {snippet_id}: {', '.join(sorted(set(missing)))}",
+        )
+    return schemas.RenderResult(snippet_id=snippet_id, version=version, text=text, missing=missing)
+
+
+@router.post("/snippets/{snippet_id:int}/render", response_model=schemas.RenderResult)
+def render_snippet(
+    workspace_id: int,
+    snippet_id: int,
+    payload: schemas.RenderRequest,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+) -> schemas.RenderResult:
+    """Expand a snippet's placeholders using supplied values and the snippet's defaults."""
+
+    require_membership(db, user, workspace_id)
+    version, template = _templates(db, workspace_id, {snippet_id})[snippet_id]
+    return _render(snippet_id, version, template, payload.values, payload.strict)
+
+
+@router.post("/snippets/render", response_model=schemas.BatchRenderResponse)
+def render_snippets(
+    workspace_id: int,
+    payload: schemas.BatchRenderRequest,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+) -> schemas.BatchRenderResponse:
+    """Expand many snippets in one request; each distinct body is compiled at most once."""
+
+    require_membership(db, user, workspace_id)
+    if not payload.items:
+        return schemas.BatchRenderResponse(results=[])
+    templates = _templates(db, workspace_id, {item.snippet_id for item in payload.items})
+    return schemas.BatchRenderResponse(
+        results=[
+            _render(item.snippet_id, *templates[item.snippet_id], item.values, payload.strict)
+            for item in payload.items
+        ]
+    )
+
+
 @router.get("/snippets/since", response_model=List[schemas.SnippetDelta])
 def snippets_since(
     workspace_id: int,
     since_ts: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user=Depends(get_current_user),
 ) -> List[schemas.SnippetDelta]:
     """Return snippets updated after the provided ISO timestamp."""
 
-    require_membership(db, user.id, workspace_id)
+    require_membership(db, user, workspace_id)
     try:
         dt = datetime.fromisoformat(since_ts.replace("Z", ""))
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid timestamp") from exc
 
-    snippets = (
-        db.query(Snippet)
+    versions = workspace_versions(workspace_id)
+    rows = (
+        db.query(Snippet, versions.c.version)
+        .outerjoin(versions, versions.c.snippet_id == Snippet.id)
         .filter(
             Snippet.workspace_id == workspace_id,
             Snippet.updated_at > dt,
@@ -244,7 +470,7 @@ def snippets_since(
         .order_by(Snippet.updated_at.asc())
         .all()
     )
-    return [serialize_snippet(snippet) for snippet in snippets]
+    return [serialize_snippet(snippet, version=version or 1) for snippet, version in rows]
 
 
 @router.get("/export")
@@ -255,7 +481,7 @@ def export_workspace(
 ):
     """Export snippets as JSON payload."""
 
-    require_membership(db, user.id, workspace_id)
+    require_membership(db, user, workspace_id)
     snippets = (
         db.query(Snippet)
         .filter(Snippet.workspace_id == workspace_id, Snippet.is_archived.is_(False))
@@ -279,13 +505,13 @@ def export_workspace(
         ],
     }
 
-    db.add(
-        AuditLog(
-            workspace_id=workspace_id,
-            user_id=user.id,
-            action="export",
-            meta={"count": len(payload["snippets"])}
-        )
+    record_audit(
+        db,
+        workspace_id=workspace_id,
+        user_id=user.id,
+        api_key_id=user.api_key_id,
+        action="export",
+        meta={"count": len(payload["snippets"])}
     )
     db.commit()
     record_snippet_mutation("export")
@@ -295,75 +521,80 @@ def export_workspace(
 @router.post("/import")
 def import_workspace(
     workspace_id: int,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    background: bool = Query(default=False, description="Run the import as a background job"),
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    """Import snippets from a JSON payload."""
-
-    require_membership(db, user.id, workspace_id, roles=["admin", "editor"])
-    data = json.loads(file.file.read().decode("utf-8"))
-    if data.get("schema") != "text-expander.v1":
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported schema")
-
-    imported = 0
-    for snippet_data in data.get("snippets", []):
-        trigger = snippet_data["trigger"]
-        snippet = (
-            db.query(Snippet)
-            .filter(Snippet.workspace_id == workspace_id, Snippet.trigger == trigger)
-            .first()
-        )
-        if snippet is None:
-            snippet = Snippet(
-                workspace_id=workspace_id,
-                name=snippet_data["name"],
-                trigger=trigger,
-                body=snippet_data["body"],
-                tags=snippet_data.get("tags", []),
-                variables=snippet_data.get("variables", {}),
-                created_by=user.id,
-                updated_by=user.id,
-            )
-            db.add(snippet)
-            db.flush()
-            version_number = 1
-        else:
-            version_row = (
-                db.query(SnippetVersion)
-                .filter(SnippetVersion.snippet_id == snippet.id)
-                .order_by(SnippetVersion.version.desc())
-                .first()
-            )
-            version_number = (version_row.version if version_row else 0) + 1
-            snippet.name = snippet_data["name"]
-            snippet.body = snippet_data["body"]
-            snippet.tags = snippet_data.get("tags", [])
-            snippet.variables = snippet_data.get("variables", {})
-            snippet.updated_by = user.id
-
-        db.add(
-            SnippetVersion(
-                snippet_id=snippet.id,
-                version=version_number,
-                name=snippet.name,
-                trigger=snippet.trigger,
-                body=snippet.body,
-                tags=snippet.tags,
-                variables=snippet.variables,
-                edited_by=user.id,
-            )
-        )
-        imported += 1
-
-    db.add(
-        AuditLog(
-            workspace_id=workspace_id,
-            user_id=user.id,
-            action="import",
-            meta={"count": imported},
-        )
+    """Import snippets from a JSON payload.
+
+    With ``background=true`` the upload is spooled to disk and applied by a
+    background job whose progress is available from ``/import/jobs/{job_id}``.
+    """
+
+    require_membership(db, user, workspace_id, roles=["admin", "editor"])
+    if background:
+        with tempfile.NamedTemporaryFile(prefix="snippet-import-", suffix=".json", delete=False) as spool:
+            shutil.copyfileobj(file.file, spool)
+        job = import_jobs.create(workspace_id)
+        background_tasks.add_task(run_import_job, job, spool.name, user.id, SessionLocal, api_key_id=user.api_key_id)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.as_dict())
+
+    try:
+        result = import_snippets(db, workspace_id, user.id, file.file)
+    except ImportFormatError as exc:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+    record_audit(
+        db,
+        workspace_id=workspace_id,
+        user_id=user.id,
+        api_key_id=user.api_key_id,
+        action="import",
+        meta={"count": result.processed},
     )
     db.commit()
     record_snippet_mutation("import")
-    return {"imported": imported}
+    return {
+        "imported": result.processed,
+        "created": result.created,
+        "updated": result.updated,
+        "unchanged": result.unchanged,
+    }
+
+
+@router.get("/import/jobs/{job_id}")
+def get_import_job(
+    workspace_id: int,
+    job_id: str,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Return progress for a background import job."""
+
+    require_membership(db, user, workspace_id)
+    job = import_jobs.get(job_id)
+    if job is None or job.workspace_id != workspace_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return job.as_dict()
+
+
+@router.post("/snippets/compact", status_code=status.HTTP_202_ACCEPTED)
+def compact_snippet_history(
+    workspace_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Schedule a job that moves legacy inline version bodies into blob/delta storage."""
+
+    require_membership(db, user, workspace_id, roles=["admin"])
+    background_tasks.add_task(_run_compaction, workspace_id)
+    return {"status": "scheduled"}
+
+
+def _run_compaction(workspace_id: int) -> None:
+    with session_scope() as session:
+        compact_history(session, workspace_id=workspace_id)
@@ -7,24 +7,61 @@ import io
 import json
 import os
 import logging
-from datetime import datetime
 from typing import Any, Dict, List, Optional
+from urllib.parse import quote
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy import func, String
+from sqlalchemy import func, select, String
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from .database import get_db
-from .models import AuditLog
-from .models_datasets import Dataset, DatasetRow
+from .audit import record_audit
+from .column_ops import ColumnJob, ColumnOp, ColumnOpError, apply_column_op, build_update, column_jobs, plan_schema
+from .config import settings
+from .database import get_db, get_read_db
+from .dataset_arrow import FILE_SUFFIXES, MEDIA_TYPES, arrow_available, export_stream, format_for_filename, read_batches
+from .dataset_cache import get_dataset_meta, list_all_summaries, list_client_summaries, store_dataset
+from .dataset_counts import purge_archived, reconcile_counts
+from .dataset_ops import MERGE_KEY_CONFLICT, RowOpError, archive_rows
+from .dataset_ops import patch_cell as patch_cell_op
+from .dataset_ops import upsert_rows as upsert_rows_op
+from .dataset_snapshots import (
+    copy_rows,
+    create_snapshot,
+    delete_snapshot,
+    list_snapshots,
+    live_rows,
+    snapshot_dict,
+    snapshot_rows,
+)
+from .dataset_rows import (
+    MergeKeyError,
+    bulk_insert_rows,
+    ensure_merge_index,
+    merge_rows,
+    validate_merge_keys,
+)
+from .models_datasets import Dataset, DatasetRow, DatasetSnapshot
+from .partitions import ensure_partition
 from .realtime import hub
+from .row_format import (
+    LAYOUT_PATTERN,
+    encode,
+    json_array,
+    json_array_chunks,
+    layout_rows,
+    msgpack_available,
+    row_json_column,
+    wants_msgpack,
+)
 
 router = APIRouter(prefix='/datasets', tags=['datasets'])
 
 logger = logging.getLogger(__name__)
 
-
 MAX_IMPORT_BYTES = int(os.getenv('MAX_IMPORT_BYTES', 5 * 1024 * 1024))
 
 DEFAULT_COLUMNS = [
@@ -48,29 +85,42 @@ def _schema_from_columns(columns: List[str]) -> Dict[str, Any]:
     return {'columns': [{'key': col, 'type': 'string'} for col in columns]}
 
 
-def _dataset_summary(dataset: Dataset) -> Dict[str, Any]:
-    return {
-        'id': dataset.id,
-        'name': dataset.name,
-        'updated_at': dataset.updated_at.isoformat() + 'Z',
-    }
+def _require_arrow() -> None:
+    if not arrow_available():
+        raise HTTPException(status_code=501, detail='Parquet/Arrow support requires the optional pyarrow package')
+
+
+def _require_dataset(db: Session, dataset_id: int) -> Dict[str, Any]:
+    meta = get_dataset_meta(db, dataset_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail='Dataset not found')
+    return meta
+
+
+def _rows_response(payload: Dict[str, Any], accept: Optional[str]) -> Any:
+    if not wants_msgpack(accept):
+        return payload
+    if not msgpack_available():
+        raise HTTPException(status_code=406, detail='MessagePack responses are not available on this server')
+    return Response(content=encode(payload, 'msgpack'), media_type='application/msgpack')
+
+
+def _row_json_column(db: Session, layout: str, accept: Optional[str]):
+    """Return the SQL row-to-JSON expression when the response can be passed through as text."""
+
+    if not settings.row_json_passthrough or layout != 'objects' or wants_msgpack(accept):
+        return None
+    return row_json_column(db.get_bind().dialect.name)
 
 
 @router.get('/all')
-def list_all(db: Session = Depends(get_db)) -> Dict[str, List[Dict[str, Any]]]:
-    datasets = db.query(Dataset).order_by(Dataset.updated_at.desc()).all()
-    return {'all': [_dataset_summary(ds) for ds in datasets]}
+def list_all(db: Session = Depends(get_read_db)) -> Dict[str, List[Dict[str, Any]]]:
+    return {'all': list_all_summaries(db)}
 
 
 @router.get('/mine-local')
-def list_mine_local(client_id: str = Query(..., description='Anonymous client identifier'), db: Session = Depends(get_db)) -> List[Dict[str, Any]]:
-    datasets = (
-        db.query(Dataset)
-        .filter(Dataset.created_by_client == client_id)
-        .order_by(Dataset.updated_at.desc())
-        .all()
-    )
-    return [_dataset_summary(ds) for ds in datasets]
+def list_mine_local(client_id: str = Query(..., description='Anonymous client identifier'), db: Session = Depends(get_read_db)) -> List[Dict[str, Any]]:
+    return list_client_summaries(db, client_id)
 
 
 class DatasetCreate(BaseModel):
@@ -97,45 +147,25 @@ def create_dataset(payload: DatasetCreate, db: Session = Depends(get_db)) -> Dic
 
     dataset = Dataset(name=name, schema=schema, created_by_client=payload.created_by_client)
     db.add(dataset)
+    db.flush()
+    ensure_partition(db, dataset.id)
+    record_audit(
+        db,
+        workspace_id=None,
+        user_id=None,
+        action='create_dataset',
+        meta={'dataset_id': dataset.id},
+    )
     db.commit()
-    db.refresh(dataset)
-
-    try:
-        db.add(
-            AuditLog(
-                workspace_id=None,
-                user_id=None,
-                action='create_dataset',
-                meta={'dataset_id': dataset.id},
-            )
-        )
-        db.commit()
-    except Exception as exc:
-        db.rollback()
-        logger.exception(
-            'dataset_create_audit_failed',
-            extra={'dataset_id': dataset.id, 'error': str(exc)},
-        )
 
-    return {
-        'id': dataset.id,
-        'name': dataset.name,
-        'schema': dataset.schema,
-        'updated_at': dataset.updated_at.isoformat() + 'Z',
-    }
+    detail = store_dataset(dataset)
+    return {key: detail[key] for key in ('id', 'name', 'schema', 'updated_at')}
 
 
 @router.get('/{dataset_id}')
-def get_dataset(dataset_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
-    dataset = db.get(Dataset, dataset_id)
-    if not dataset:
-        raise HTTPException(status_code=404, detail='Dataset not found')
-    return {
-        'id': dataset.id,
-        'name': dataset.name,
-        'schema': dataset.schema,
-        'updated_at': dataset.updated_at.isoformat() + 'Z',
-    }
+def get_dataset(dataset_id: int, db: Session = Depends(get_read_db)) -> Dict[str, Any]:
+    meta = _require_dataset(db, dataset_id)
+    return {key: meta[key] for key in ('id', 'name', 'schema', 'updated_at')}
 
 
 @router.get('/{dataset_id}/rows')
@@ -144,29 +174,30 @@ def list_rows(
     q: Optional[str] = Query(default=None),
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=500, ge=1, le=2000),
-    db: Session = Depends(get_db),
+    layout: str = Query(default='objects', pattern=LAYOUT_PATTERN),
+    accept: Optional[str] = Header(default=None),
+    db: Session = Depends(get_read_db),
 ) -> Dict[str, Any]:
-    dataset = db.get(Dataset, dataset_id)
-    if not dataset:
-        raise HTTPException(status_code=404, detail='Dataset not found')
+    dataset = _require_dataset(db, dataset_id)
 
-    query = db.query(DatasetRow).filter(
+    query = db.query(DatasetRow.id, DatasetRow.data).filter(
         DatasetRow.dataset_id == dataset_id,
         DatasetRow.archived.is_(False),
     )
     if q:
         like = f'%{q}%'
         query = query.filter(func.cast(DatasetRow.data, String).ilike(like))
+        total = query.count()
+    else:
+        total = db.scalar(select(Dataset.live_row_count).where(Dataset.id == dataset_id)) or 0
+    query = query.order_by(DatasetRow.id.asc()).offset(offset).limit(limit)
+    row_json = _row_json_column(db, layout, accept)
+    if row_json is not None:
+        texts = [text for (text,) in query.with_entities(row_json)]
+        return Response(content=f'{{"total":{total},"rows":{json_array(texts)}}}', media_type='application/json')
 
-    total = query.count()
-    rows = (
-        query.order_by(DatasetRow.id.asc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    payload = [{**row.data, 'id': row.id} for row in rows]
-    return {'total': total, 'rows': payload}
+    rows = query.all()
+    return _rows_response({'total': total, **layout_rows(rows, layout, dataset['schema'])}, accept)
 
 
 class CellPatch(BaseModel):
@@ -182,30 +213,15 @@ async def patch_cell(
     background: BackgroundTasks,
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
-    row = (
-        db.query(DatasetRow)
-        .filter(
-            DatasetRow.dataset_id == dataset_id,
-            DatasetRow.id == payload.id,
-            DatasetRow.archived.is_(False),
-        )
-        .first()
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail='Row not found')
-
-    data = dict(row.data)
-    data[payload.key] = payload.value
-    row.data = data
-    db.commit()
+    try:
+        message = patch_cell_op(db, dataset_id, payload.id, payload.key, payload.value)
+        db.commit()
+    except RowOpError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc)) from exc
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=MERGE_KEY_CONFLICT) from exc
 
-    message = {
-        'type': 'cell',
-        'row_id': row.id,
-        'key': payload.key,
-        'value': payload.value,
-        'updated_at': datetime.utcnow().isoformat() + 'Z',
-    }
     background.add_task(hub.broadcast, dataset_id, message)
     return {'ok': True, 'applied': message}
 
@@ -221,28 +237,14 @@ async def upsert_rows(
     background: BackgroundTasks,
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
-    dataset = db.get(Dataset, dataset_id)
-    if not dataset:
-        raise HTTPException(status_code=404, detail='Dataset not found')
+    _require_dataset(db, dataset_id)
 
-    created_rows: List[Dict[str, Any]] = []
-    for item in payload.rows:
-        row_id = item.get('id')
-        data = {k: v for k, v in item.items() if k != 'id'}
-        if row_id:
-            row = (
-                db.query(DatasetRow)
-                .filter(DatasetRow.id == row_id, DatasetRow.dataset_id == dataset_id)
-                .first()
-            )
-            if row:
-                row.data = data
-        else:
-            row = DatasetRow(dataset_id=dataset_id, data=data)
-            db.add(row)
-            db.flush()
-            created_rows.append({**row.data, 'id': row.id})
-    db.commit()
+    try:
+        created_rows = upsert_rows_op(db, dataset_id, payload.rows)
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=MERGE_KEY_CONFLICT) from exc
 
     if created_rows:
         background.add_task(hub.broadcast, dataset_id, {'type': 'rows_upsert', 'rows': created_rows})
@@ -275,45 +277,205 @@ async def add_column(
         raise HTTPException(status_code=409, detail='Column already exists')
 
     columns.append({'key': key, 'type': 'string'})
-    dataset.schema = {'columns': columns}
+    dataset.schema = {**dataset.schema, 'columns': columns}
     db.commit()
+    store_dataset(dataset)
 
     background.add_task(hub.broadcast, dataset_id, {'type': 'column_add', 'key': key})
     return {'schema': dataset.schema}
 
 
+class ColumnRename(BaseModel):
+    key: str
+    new_key: str
+
+
+class ColumnDrop(BaseModel):
+    key: str
+
+
+class ColumnRetype(BaseModel):
+    key: str
+    type: str = Field(..., pattern='^(string|number|boolean)$')
+
+
+class ColumnFill(BaseModel):
+    key: str
+    value: Any
+    only_missing: bool = True
+
+
+@router.post('/{dataset_id}/columns/rename')
+async def rename_column(dataset_id: int, payload: ColumnRename, background: BackgroundTasks, db: Session = Depends(get_db)):
+    return await _column_operation(db, background, dataset_id, ColumnOp(op='rename', key=payload.key, new_key=payload.new_key))
+
+
+@router.post('/{dataset_id}/columns/drop')
+async def drop_column(dataset_id: int, payload: ColumnDrop, background: BackgroundTasks, db: Session = Depends(get_db)):
+    return await _column_operation(db, background, dataset_id, ColumnOp(op='drop', key=payload.key))
+
+
+@router.post('/{dataset_id}/columns/retype')
+async def retype_column(dataset_id: int, payload: ColumnRetype, background: BackgroundTasks, db: Session = Depends(get_db)):
+    return await _column_operation(db, background, dataset_id, ColumnOp(op='retype', key=payload.key, type=payload.type))
+
+
+@router.post('/{dataset_id}/columns/fill')
+async def fill_column(dataset_id: int, payload: ColumnFill, background: BackgroundTasks, db: Session = Depends(get_db)):
+    op = ColumnOp(op='fill', key=payload.key, value=payload.value, only_missing=payload.only_missing)
+    return await _column_operation(db, background, dataset_id, op)
+
+
+@router.get('/{dataset_id}/columns/jobs/{job_id}')
+def get_column_job(dataset_id: int, job_id: str) -> Dict[str, Any]:
+    job = column_jobs.get(job_id)
+    if job is None or job.dataset_id != dataset_id:
+        raise HTTPException(status_code=404, detail='Column job not found')
+    return job.as_dict()
+
+
+@router.post('/{dataset_id}/columns/jobs/{job_id}/resume')
+async def resume_column_job(dataset_id: int, job_id: str, background: BackgroundTasks, db: Session = Depends(get_db)):
+    """Start a new job that continues a failed one from its ``next_id`` and then updates the schema."""
+
+    job = column_jobs.get(job_id)
+    if job is None or job.dataset_id != dataset_id:
+        raise HTTPException(status_code=404, detail='Column job not found')
+    if not job.resumable:
+        raise HTTPException(status_code=409, detail='Only failed column jobs can be resumed')
+    return await _column_operation(db, background, dataset_id, job.spec, start_id=job.next_id)
+
+
+async def _column_operation(
+    db: Session, background: BackgroundTasks, dataset_id: int, op: ColumnOp, start_id: Optional[int] = None
+):
+    """Validate ``op``, then run it inline for small datasets or as a background job for large ones."""
+
+    dataset = db.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail='Dataset not found')
+    try:
+        schema = plan_schema(dataset.schema, op)
+        build_update(op, db.get_bind().dialect.name)
+    except ColumnOpError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc)) from exc
+
+    rows = db.query(func.count(DatasetRow.id)).filter(DatasetRow.dataset_id == dataset_id)
+    if start_id is not None:
+        rows = rows.filter(DatasetRow.id >= start_id)
+    rows = rows.scalar()
+    bind = db.get_bind()
+    # Release the read transaction; the job writes through its own session.
+    db.rollback()
+    job = column_jobs.start(dataset_id, op, start_id=start_id)
+    if job is None:
+        raise HTTPException(status_code=409, detail='A column operation is already running for this dataset')
+
+    if rows > settings.column_op_chunk_rows:
+        background.add_task(_run_column_job, job, op, schema, bind)
+        return JSONResponse(status_code=202, content=job.as_dict())
+
+    await _run_column_job(job, op, schema, bind)
+    if job.status == 'failed':
+        # The job status (with next_id) stays available for a resume.
+        location = f'/datasets/{dataset_id}/columns/jobs/{job.id}'
+        raise HTTPException(status_code=500, detail=job.error, headers={'Location': location})
+    return {'status': job.status, 'rows_changed': job.rows_changed, 'schema': _require_dataset(db, dataset_id)['schema']}
+
+
+async def _run_column_job(job: ColumnJob, op: ColumnOp, schema: Dict[str, Any], bind) -> None:
+    try:
+        schema = await run_in_threadpool(_execute_column_job, job, op, schema, bind)
+    except ColumnOpError as exc:
+        column_jobs.finish(job, error=f'Rows were rewritten but the schema changed meanwhile ({exc}); resume once resolved')
+        return
+    except Exception:
+        logger.exception('column_job_failed', extra={'job_id': job.id, 'dataset_id': job.dataset_id})
+        column_jobs.finish(job, error='Column operation failed')
+        return
+    column_jobs.finish(job)
+    message = {'type': 'schema_change', 'op': op.op, 'key': op.key, 'schema': schema}
+    if op.new_key:
+        message['new_key'] = op.new_key
+    await hub.broadcast(job.dataset_id, message)
+
+
+def _execute_column_job(job: ColumnJob, op: ColumnOp, schema: Dict[str, Any], bind) -> Dict[str, Any]:
+    def _progress(rows_changed: int, ranges_done: int, next_id: int) -> None:
+        job.rows_changed = rows_changed
+        job.ranges_done = ranges_done
+        job.next_id = next_id
+
+    job.status = 'running'
+    with Session(bind=bind) as session:
+        apply_column_op(
+            session, job.dataset_id, op, settings.column_op_chunk_rows, on_progress=_progress, start_id=job.next_id
+        )
+        # Rewritten rows change size in SQL, so recount rather than track per row.
+        reconcile_counts(session, job.dataset_id)
+        session.commit()
+        dataset = session.get(Dataset, job.dataset_id)
+        # Re-plan against the current schema so columns added meanwhile are kept. If the
+        # change no longer applies, fail rather than overwrite the schema with a stale plan.
+        schema = plan_schema(dataset.schema, op)
+        dataset.schema = schema
+        record_audit(
+            session,
+            action='dataset_column_op',
+            meta={'dataset_id': job.dataset_id, 'op': op.op, 'key': op.key, 'rows_changed': job.rows_changed},
+        )
+        session.commit()
+        job.schema_updated = True
+        store_dataset(dataset)
+    return schema
+
+
 @router.delete('/{dataset_id}/rows')
 async def delete_rows(
     dataset_id: int,
     ids: List[int] = Query(..., description='Row IDs to archive'),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
-    rows = (
-        db.query(DatasetRow)
-        .filter(DatasetRow.dataset_id == dataset_id, DatasetRow.id.in_(ids))
-        .all()
-    )
-    if not rows:
+    deleted = archive_rows(db, dataset_id, ids)
+    if not deleted:
         return {'deleted': 0}
-
-    for row in rows:
-        row.archived = True
     db.commit()
 
     await hub.broadcast(dataset_id, {'type': 'delete_rows', 'ids': ids})
-    return {'deleted': len(rows)}
+    return {'deleted': deleted}
+
+
+@router.post('/{dataset_id}/rows/purge')
+def purge_rows(dataset_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """Permanently delete the dataset's archived rows; snapshots keep their own copies."""
+
+    _require_dataset(db, dataset_id)
+    freed = purge_archived(db, dataset_id)
+    if freed['rows']:
+        record_audit(db, action='purge_rows', meta={'dataset_id': dataset_id, 'rows': freed['rows']})
+    db.commit()
+    return {'purged': freed['rows'], 'bytes_freed': freed['bytes']}
 
 
 @router.post('/{dataset_id}/import')
 async def import_dataset(
     dataset_id: int,
     file: UploadFile = File(...),
+    mode: str = Query(default='append', pattern='^(append|merge)$'),
+    key: Optional[List[str]] = Query(default=None, description='Merge key column(s); defaults to the stored merge keys'),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
     dataset = db.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail='Dataset not found')
 
+    merge_keys: List[str] = []
+    if mode == 'merge':
+        try:
+            merge_keys = validate_merge_keys(key or dataset.schema.get('merge_keys') or [])
+        except MergeKeyError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
     raw = file.file.read()
     if not raw:
         raise HTTPException(status_code=400, detail='Empty file')
@@ -321,12 +483,18 @@ async def import_dataset(
         raise HTTPException(status_code=413, detail='Import too large')
 
     filename = (file.filename or '').lower()
+    arrow_format = format_for_filename(filename)
+    if arrow_format:
+        _require_arrow()
 
     rows_to_add: List[Dict[str, Any]] = []
+    batches: List[List[Dict[str, Any]]] = []
     detected_columns: List[str] = []
 
     try:
-        if filename.endswith('.json'):
+        if arrow_format:
+            detected_columns, batches = read_batches(raw, arrow_format)
+        elif filename.endswith('.json'):
             data = json.loads(raw.decode('utf-8'))
             if isinstance(data, dict) and isinstance(data.get('rows'), list):
                 rows_to_add = data['rows']
@@ -347,17 +515,22 @@ async def import_dataset(
         logger.exception("import_dataset_failed", extra={'dataset_id': dataset_id})
         raise HTTPException(status_code=400, detail='Failed to parse import file') from exc
 
+    if merge_keys:
+        return await _merge_import(db, dataset, merge_keys, detected_columns, batches or [rows_to_add])
+
     if detected_columns:
-        dataset.schema = _schema_from_columns(detected_columns)
+        dataset.schema = {**dataset.schema, **_schema_from_columns(detected_columns)}
 
     created_rows: List[Dict[str, Any]] = []
-    if rows_to_add:
-        for row in rows_to_add:
-            dataset_row = DatasetRow(dataset_id=dataset_id, data=row)
-            db.add(dataset_row)
-            db.flush()
-            created_rows.append({**dataset_row.data, 'id': dataset_row.id})
-    db.commit()
+    try:
+        for batch in batches or [rows_to_add]:
+            created_rows.extend(bulk_insert_rows(db, dataset_id, batch))
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=MERGE_KEY_CONFLICT) from exc
+    if detected_columns:
+        store_dataset(dataset)
 
     if created_rows:
         await hub.broadcast(dataset_id, {'type': 'rows_upsert', 'rows': created_rows})
@@ -365,29 +538,199 @@ async def import_dataset(
     return {'status': 'ok', 'rows_added': len(created_rows), 'schema': dataset.schema}
 
 
+async def _merge_import(
+    db: Session,
+    dataset: Dataset,
+    merge_keys: List[str],
+    detected_columns: List[str],
+    batches: List[List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    dataset_id = dataset.id
+    keys_changed = dataset.schema.get('merge_keys') != merge_keys
+    # End the read transaction first: the index build waits for open transactions.
+    db.commit()
+    try:
+        ensure_merge_index(db, dataset_id, merge_keys, replace=keys_changed)
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=MERGE_KEY_CONFLICT) from exc
+
+    columns = list(dataset.schema.get('columns', []))
+    known = {col.get('key') for col in columns}
+    columns += [{'key': col, 'type': 'string'} for col in detected_columns if col not in known]
+    dataset.schema = {**dataset.schema, 'columns': columns, 'merge_keys': merge_keys}
+
+    rows = [row for batch in batches for row in batch]
+    try:
+        result = merge_rows(db, dataset.id, merge_keys, rows)
+        db.commit()
+    except MergeKeyError as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=MERGE_KEY_CONFLICT) from exc
+    store_dataset(dataset)
+
+    if result.changed_rows:
+        await hub.broadcast(dataset.id, {'type': 'rows_upsert', 'rows': result.changed_rows})
+
+    return {
+        'status': 'ok',
+        'rows_added': len(result.inserted),
+        'rows_updated': len(result.updated),
+        'rows_unchanged': result.unchanged,
+        'schema': dataset.schema,
+    }
+
+
+def _stream_rows(db: Session, query, columns: List[str], fmt: str):
+    # The request session is closed before a streamed body is sent, so read on a
+    # session of our own and let the driver hand rows over batch by batch.
+    with Session(bind=db.get_bind()) as session:
+        rows = session.execute(query.statement.execution_options(yield_per=1000))
+        yield from export_stream(rows, columns, fmt)
+
+
 @router.get('/{dataset_id}/export')
 def export_dataset(
     dataset_id: int,
-    fmt: str = Query(default='json', pattern='^(json|csv)$'),
-    db: Session = Depends(get_db),
+    fmt: str = Query(default='json', pattern='^(json|csv|parquet|arrow)$'),
+    layout: str = Query(default='objects', pattern=LAYOUT_PATTERN),
+    accept: Optional[str] = Header(default=None),
+    db: Session = Depends(get_read_db),
 ) -> Dict[str, Any]:
-    dataset = db.get(Dataset, dataset_id)
-    if not dataset:
-        raise HTTPException(status_code=404, detail='Dataset not found')
+    dataset = _require_dataset(db, dataset_id)
 
-    rows = db.query(DatasetRow).filter(
+    query = db.query(DatasetRow.id, DatasetRow.data).filter(
         DatasetRow.dataset_id == dataset_id,
         DatasetRow.archived.is_(False),
-    ).all()
+    )
+
+    if fmt in MEDIA_TYPES:
+        _require_arrow()
+        columns = [col['key'] for col in dataset['schema'].get('columns', []) if col.get('key') != 'id']
+        return StreamingResponse(
+            _stream_rows(db, query.order_by(DatasetRow.id.asc()), columns, fmt),
+            media_type=MEDIA_TYPES[fmt],
+            headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(dataset['name'])}.{FILE_SUFFIXES[fmt]}"},
+        )
 
+    row_json = _row_json_column(db, layout, accept) if fmt == 'json' else None
+    if row_json is not None:
+        # Rows are fetched here because the session is closed before a streamed body is sent.
+        texts = [text for (text,) in query.with_entities(row_json).order_by(DatasetRow.id.asc())]
+        prefix = '{"filename":%s,"content":' % json.dumps(f"{dataset['name']}.json")
+        return StreamingResponse(json_array_chunks(prefix, texts, '}'), media_type='application/json')
+
+    rows = query.all()
     if fmt == 'csv':
         output = io.StringIO()
-        headers = [col['key'] for col in dataset.schema.get('columns', [])]
+        headers = [col['key'] for col in dataset['schema'].get('columns', [])]
         writer = csv.DictWriter(output, fieldnames=headers)
         writer.writeheader()
         for row in rows:
             writer.writerow({key: row.data.get(key, '') for key in headers})
-        return {'filename': f'{dataset.name}.csv', 'content': output.getvalue()}
+        return {'filename': f"{dataset['name']}.csv", 'content': output.getvalue()}
+
+    if layout == 'objects':
+        content: Any = [{**data, 'id': row_id} for row_id, data in rows]
+    else:
+        content = layout_rows(rows, layout, dataset['schema'])
+    return _rows_response({'filename': f"{dataset['name']}.json", 'content': content}, accept)
+
+
+class DatasetClone(BaseModel):
+    name: Optional[str] = Field(default=None, max_length=255)
+    snapshot_id: Optional[int] = None
+    created_by_client: Optional[str] = None
+
+
+@router.post('/{dataset_id}/clone', status_code=201)
+def clone_dataset(dataset_id: int, payload: DatasetClone, db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """Copy a dataset (or one of its snapshots) into a new dataset with one ``INSERT ... SELECT``."""
+
+    source = db.get(Dataset, dataset_id)
+    if not source:
+        raise HTTPException(status_code=404, detail='Dataset not found')
+    if payload.snapshot_id is not None:
+        snapshot = _require_snapshot(db, dataset_id, payload.snapshot_id)
+        schema, rows = snapshot.schema, snapshot_rows(snapshot)
+    else:
+        schema, rows = source.schema, live_rows(dataset_id)
+
+    name = (payload.name or '').strip() or f'{source.name} (copy)'
+    dataset = Dataset(name=name, schema=schema, created_by_client=payload.created_by_client)
+    db.add(dataset)
+    db.flush()
+    ensure_partition(db, dataset.id)
+    copied = copy_rows(db, rows, dataset.id)
+    reconcile_counts(db, dataset.id)
+    record_audit(
+        db,
+        action='clone_dataset',
+        meta={'dataset_id': dataset.id, 'source_dataset_id': dataset_id, 'snapshot_id': payload.snapshot_id},
+    )
+    clone_id = dataset.id
+    db.commit()
+    if schema.get('merge_keys'):
+        # After the commit, since a concurrent build waits for open transactions.
+        ensure_merge_index(db, clone_id, schema['merge_keys'])
+        db.commit()
+
+    detail = store_dataset(dataset)
+    return {**{key: detail[key] for key in ('id', 'name', 'schema', 'updated_at')}, 'rows_copied': copied}
+
+
+class SnapshotCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=255)
+    mode: str = Field(default='full', pattern='^(full|cow)$')
 
-    payload = [{**row.data, 'id': row.id} for row in rows]
-    return {'filename': f'{dataset.name}.json', 'content': payload}
+
+def _require_snapshot(db: Session, dataset_id: int, snapshot_id: int) -> DatasetSnapshot:
+    snapshot = db.get(DatasetSnapshot, snapshot_id)
+    if snapshot is None or snapshot.dataset_id != dataset_id:
+        raise HTTPException(status_code=404, detail='Snapshot not found')
+    return snapshot
+
+
+@router.post('/{dataset_id}/snapshots', status_code=201)
+def create_dataset_snapshot(dataset_id: int, payload: SnapshotCreate, db: Session = Depends(get_db)) -> Dict[str, Any]:
+    dataset = db.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail='Dataset not found')
+    try:
+        snapshot = create_snapshot(db, dataset, payload.name.strip(), payload.mode)
+        record_audit(db, action='create_snapshot', meta={'dataset_id': dataset_id, 'snapshot_id': snapshot.id})
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail='Snapshot name already exists') from exc
+    return snapshot_dict(snapshot)
+
+
+@router.get('/{dataset_id}/snapshots')
+def list_dataset_snapshots(dataset_id: int, db: Session = Depends(get_read_db)) -> List[Dict[str, Any]]:
+    _require_dataset(db, dataset_id)
+    return [snapshot_dict(snapshot) for snapshot in list_snapshots(db, dataset_id)]
+
+
+@router.get('/{dataset_id}/snapshots/{snapshot_id}/rows')
+def list_snapshot_rows(
+    dataset_id: int,
+    snapshot_id: int,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=500, ge=1, le=2000),
+    db: Session = Depends(get_read_db),
+) -> Dict[str, Any]:
+    snapshot = _require_snapshot(db, dataset_id, snapshot_id)
+    rows = snapshot_rows(snapshot)
+    page = db.execute(select(rows.c.id, rows.c.data).order_by(rows.c.id).offset(offset).limit(limit)).all()
+    return {'total': snapshot.row_count, 'schema': snapshot.schema, 'rows': [{**data, 'id': row_id} for row_id, data in page]}
+
+
+@router.delete('/{dataset_id}/snapshots/{snapshot_id}')
+def delete_dataset_snapshot(dataset_id: int, snapshot_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
+    delete_snapshot(db, _require_snapshot(db, dataset_id, snapshot_id))
+    db.commit()
+    return {'deleted': True}
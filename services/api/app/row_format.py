@@ -0,0 +1,140 @@
+"""Wire layouts and encodings for dataset rows.
+
+``objects`` (the default) sends one JSON object per row. The columnar
+layouts send the column keys once and then bare values:
+
+* ``rows``:    ``{"columns": ["id", "A", "B"], "rows": [[1, "a", "b"], ...]}``
+* ``columns``: ``{"columns": ["id", "A", "B"], "values": [[1, ...], ["a", ...], ["b", ...]]}``
+
+Missing cells are ``null``. Column order follows the dataset schema; keys
+found in row data but not in the schema are appended in first-seen order.
+Any layout can be encoded as JSON or, when the optional ``msgpack`` package
+is installed, MessagePack.
+
+For the default layout on Postgres and SQLite, :func:`row_json_column` makes
+the database return each row as finished JSON text (data plus ``id``) so the
+rows are never parsed into dicts and re-encoded on the way out. The text has
+the same keys in the same order as the Python encoding; Postgres only adds
+insignificant whitespace.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, Text, case, cast, func, literal, null, select, union_all
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from .models_datasets import DatasetRow
+
+try:  # Optional dependency; JSON is always available.
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+LAYOUTS = ("objects", "rows", "columns")
+ENCODINGS = ("json", "msgpack")
+LAYOUT_PATTERN = "^(objects|rows|columns)$"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+JSON_CHUNK_ROWS = 1000
+
+RowItem = Tuple[int, Mapping[str, Any]]
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def column_keys(schema: Optional[Mapping[str, Any]], rows: Iterable[RowItem]) -> List[str]:
+    keys = [col["key"] for col in (schema or {}).get("columns", []) if col.get("key") and col["key"] != "id"]
+    known = set(keys)
+    for _, data in rows:
+        if len(data) > len(known) or not known.issuperset(data):
+            for key in data:
+                if key not in known and key != "id":
+                    known.add(key)
+                    keys.append(key)
+    return keys
+
+
+def layout_rows(rows: Sequence[RowItem], layout: str, schema: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """Return ``{"rows": [...]}`` for ``objects`` or the columnar payload for the others."""
+
+    if layout == "objects":
+        return {"rows": [{**data, "id": row_id} for row_id, data in rows]}
+    keys = column_keys(schema, rows)
+    header = ["id", *keys]
+    if layout == "rows":
+        return {"columns": header, "rows": [[row_id, *[data.get(key) for key in keys]] for row_id, data in rows]}
+    values = [[row_id for row_id, _ in rows]]
+    values.extend([data.get(key) for _, data in rows] for key in keys)
+    return {"columns": header, "values": values}
+
+
+def encode(payload: Any, encoding: str) -> bytes | str:
+    """Serialize ``payload``; JSON returns ``str`` and MessagePack ``bytes``."""
+
+    if encoding == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("MessagePack encoding requires the optional 'msgpack' package")
+        return msgpack.packb(payload, use_bin_type=True, default=str)
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
+
+def decode(raw: bytes | str) -> Any:
+    """Parse an inbound message: text frames are JSON, binary frames MessagePack."""
+
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if msgpack is None:
+        raise RuntimeError("MessagePack decoding requires the optional 'msgpack' package")
+    return msgpack.unpackb(raw, raw=False)
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    return bool(accept) and any(media in accept for media in MSGPACK_MEDIA_TYPES)
+
+
+def upsert_message(rows: Sequence[Dict[str, Any]], layout: str) -> Dict[str, Any]:
+    """Re-shape a ``rows_upsert`` broadcast (rows as objects with ``id``) into ``layout``."""
+
+    if layout == "objects":
+        return {"type": "rows_upsert", "rows": list(rows)}
+    items = [(row["id"], {key: value for key, value in row.items() if key != "id"}) for row in rows]
+    return {"type": "rows_upsert", "layout": layout, **layout_rows(items, layout)}
+
+
+def row_json_column(dialect: str):
+    """SQL expression rendering a row as ``{**data, "id": id}`` JSON text, or ``None`` if unsupported."""
+
+    if dialect == "postgresql":
+        # Rebuild the object as ``json`` in stored key order: jsonb would sort the keys.
+        # A stray "id" keeps its position with the row id as value, as in the dict merge;
+        # otherwise "id" is appended last.
+        entry = func.json_each(DatasetRow.data).table_valued("key", "value", with_ordinality="position")
+        entry = entry.render_derived(name="entry")
+        row_id = func.to_json(DatasetRow.id)
+        value = case((entry.c.key == "id", row_id), else_=entry.c.value).label("value")
+        stored = select(entry.c.key, value, entry.c.position)
+        appended = select(literal("id"), row_id, null().cast(Integer)).where(DatasetRow.data.op("->")("id").is_(None))
+        cells = union_all(stored.correlate(DatasetRow), appended.correlate(DatasetRow)).subquery("cells")
+        ordered = aggregate_order_by(cells.c.value, cells.c.position.asc().nulls_last())
+        return cast(select(func.json_object_agg(cells.c.key, ordered)).scalar_subquery(), Text)
+    if dialect == "sqlite":
+        return func.json_set(DatasetRow.data, "$.id", DatasetRow.id, type_=Text)
+    return None
+
+
+def json_array(items: Sequence[str]) -> str:
+    return "[" + ",".join(items) + "]"
+
+
+def json_array_chunks(prefix: str, items: Sequence[str], suffix: str) -> Iterator[str]:
+    """Yield ``prefix + [items...] + suffix`` in pieces of ``JSON_CHUNK_ROWS`` pre-encoded items."""
+
+    yield prefix + "["
+    for start in range(0, len(items), JSON_CHUNK_ROWS):
+        yield ("," if start else "") + ",".join(items[start : start + JSON_CHUNK_ROWS])
+    yield "]" + suffix
@@ -1,7 +1,7 @@
 """Pydantic schemas for request/response models."""
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -35,6 +35,83 @@ class SnippetOut(SnippetBase):
         from_attributes = True
 
 
+class SnippetVersionMeta(BaseModel):
+    version: int
+    name: str
+    trigger: str
+    tags: List[str] = Field(default_factory=list)
+    variables: Dict[str, str] = Field(default_factory=dict)
+    content_hash: Optional[str] = None
+    edited_by: Optional[int] = None
+    created_at: datetime
+
+
+class SnippetVersionOut(SnippetVersionMeta):
+    body: str
+
+
+class FieldChange(BaseModel):
+    old: Any = None
+    new: Any = None
+
+
+class SnippetVersionDiff(BaseModel):
+    snippet_id: int
+    from_version: int
+    to_version: int
+    fields: Dict[str, FieldChange] = Field(default_factory=dict)
+    body_diff: str = ""
+
+
+class RenderRequest(BaseModel):
+    values: Dict[str, str] = Field(default_factory=dict)
+    strict: bool = False
+
+
+class RenderItem(BaseModel):
+    snippet_id: int
+    values: Dict[str, str] = Field(default_factory=dict)
+
+
+class BatchRenderRequest(BaseModel):
+    items: List[RenderItem] = Field(..., max_length=5000)
+    strict: bool = False
+
+
+class RenderResult(BaseModel):
+    snippet_id: int
+    version: int
+    text: str
+    missing: List[str] = Field(default_factory=list)
+
+
+class BatchRenderResponse(BaseModel):
+    results: List[RenderResult]
+
+
+class ApiKeyCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=128)
+    role: Literal["editor", "viewer"] = "editor"
+    rate_limit_per_minute: Optional[int] = Field(default=None, ge=1, le=100_000)
+
+
+class ApiKeyOut(BaseModel):
+    id: int
+    name: str
+    prefix: Optional[str]
+    role: str
+    rate_limit_per_minute: Optional[int]
+    created_at: datetime
+    revoked_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ApiKeyCreated(ApiKeyOut):
+    token: str = Field(..., description="Shown once; only its hash is stored")
+
+
 class HealthStatus(BaseModel):
     status: str
 
@@ -58,7 +135,7 @@ class SnippetDelta(SnippetOut):
 
 class AuditLogOut(BaseModel):
     id: int
-    workspace_id: int
+    workspace_id: Optional[int]
     user_id: Optional[int]
     action: str
     meta: Dict[str, Any] | None = None
@@ -0,0 +1,415 @@
+"""Bulk snippet import engine with set-based writes.
+
+The engine streams a ``text-expander.v1`` document, groups snippets into
+batches and resolves each batch with a constant number of statements: one
+prefetch of the workspace triggers, one bulk insert for new snippets, one
+grouped latest-version lookup, one bulk update and bulk blob/version inserts.
+Snippets whose content hash matches the stored one are skipped entirely.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import logging
+import os
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from .audit import record_audit
+from .models import Snippet, SnippetVersion
+from .utils import snippet_content_hash
+from .versioning import DELTA_MIN_CHARS, PendingVersion, build_version_rows, latest_heads
+
+logger = logging.getLogger(__name__)
+
+IMPORT_SCHEMA = "text-expander.v1"
+DEFAULT_BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+
+class ImportFormatError(ValueError):
+    """Raised when the import document is malformed or uses another schema."""
+
+
+class _JsonStream:
+    """Minimal pull parser that decodes one JSON value at a time from a byte stream."""
+
+    def __init__(self, stream: IO[Any], chunk_size: int = CHUNK_SIZE) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        if not chunk:
+            self._buf += self._decoder.decode(b"", final=True)
+            self._eof = True
+            return False
+        self._buf += chunk if isinstance(chunk, str) else self._decoder.decode(chunk)
+        return True
+
+    def next_char(self) -> str:
+        """Consume and return the next non-whitespace character ("" at EOF)."""
+
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                char = self._buf[self._pos]
+                self._pos += 1
+                return char
+            if not self._fill():
+                return ""
+
+    def peek(self) -> str:
+        char = self.next_char()
+        if char:
+            self._pos -= 1
+        return char
+
+    def expect(self, expected: str) -> None:
+        char = self.next_char()
+        if char != expected:
+            raise ImportFormatError(f"Expected '{expected}' but found '{char or 'EOF'}'")
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as exc:
+                if self._fill():
+                    continue
+                raise ImportFormatError(f"Invalid JSON: {exc.msg}") from exc
+            # A number touching the end of the buffer may continue in the next chunk.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+
+def iter_import_document(stream: IO[Any], chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Yield ``("schema", value)`` and ``("snippet", dict)`` events without loading the whole file."""
+
+    parser = _JsonStream(stream, chunk_size)
+    parser.expect("{")
+    if parser.peek() == "}":
+        parser.next_char()
+        return
+    while True:
+        key = parser.value()
+        if not isinstance(key, str):
+            raise ImportFormatError("Object keys must be strings")
+        parser.expect(":")
+        if key == "snippets":
+            parser.expect("[")
+            if parser.peek() == "]":
+                parser.next_char()
+            else:
+                while True:
+                    yield "snippet", parser.value()
+                    char = parser.next_char()
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ImportFormatError("Malformed snippets array")
+        else:
+            value = parser.value()
+            if key == "schema":
+                yield "schema", value
+        char = parser.next_char()
+        if char == "}":
+            return
+        if char != ",":
+            raise ImportFormatError("Malformed import document")
+
+
+@dataclass
+class ImportResult:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+def _normalize(item: Any) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        raise ImportFormatError("Snippet entries must be objects")
+    missing = [name for name in ("name", "trigger", "body") if not item.get(name)]
+    if missing:
+        raise ImportFormatError(f"Snippet missing required field(s): {', '.join(missing)}")
+    # Same limits as ``schemas.SnippetBase`` so imported snippets can be served back.
+    for name, limit in (("name", 128), ("trigger", 64)):
+        if len(item[name]) > limit:
+            raise ImportFormatError(f"Snippet {name} longer than {limit} characters: {item[name][:limit]}...")
+    return {
+        "name": item["name"],
+        "trigger": item["trigger"],
+        "body": item["body"],
+        "tags": item.get("tags") or [],
+        "variables": item.get("variables") or {},
+    }
+
+
+class SnippetImporter:
+    """Apply import batches to a workspace using set-based statements."""
+
+    def __init__(self, db: Session, workspace_id: int, user_id: Optional[int]) -> None:
+        self.db = db
+        self.workspace_id = workspace_id
+        self.user_id = user_id
+        self.result = ImportResult()
+        rows = db.execute(
+            select(Snippet.trigger, Snippet.id, Snippet.content_hash).where(Snippet.workspace_id == workspace_id)
+        ).all()
+        self._existing: Dict[str, Tuple[int, Optional[str]]] = {
+            trigger: (snippet_id, content_hash) for trigger, snippet_id, content_hash in rows
+        }
+
+    def apply(self, items: List[Any]) -> None:
+        # Later duplicates of a trigger within one batch win, matching sequential semantics.
+        batch: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            fields = _normalize(item)
+            batch[fields["trigger"]] = fields
+        self.result.processed += len(items)
+
+        to_create: List[Dict[str, Any]] = []
+        to_update: List[Dict[str, Any]] = []
+        for trigger, fields in batch.items():
+            fields["content_hash"] = snippet_content_hash(**fields)
+            current = self._existing.get(trigger)
+            if current is None:
+                to_create.append(fields)
+            elif current[1] == fields["content_hash"]:
+                self.result.unchanged += 1
+            else:
+                to_update.append({**fields, "id": current[0]})
+
+        pending: List[PendingVersion] = []
+        if to_create:
+            created = self.db.execute(
+                insert(Snippet).returning(Snippet.id, Snippet.trigger),
+                [
+                    {
+                        **fields,
+                        "workspace_id": self.workspace_id,
+                        "created_by": self.user_id,
+                        "updated_by": self.user_id,
+                    }
+                    for fields in to_create
+                ],
+            ).all()
+            ids = {trigger: snippet_id for snippet_id, trigger in created}
+            for fields in to_create:
+                snippet_id = ids[fields["trigger"]]
+                self._existing[fields["trigger"]] = (snippet_id, fields["content_hash"])
+                pending.append(self._pending(snippet_id, 1, fields))
+            self.result.created += len(to_create)
+
+        if to_update:
+            ids = [fields["id"] for fields in to_update]
+            heads = latest_heads(self.db, ids)
+            # Only large bodies are delta candidates, so only those need their previous text.
+            large = [fields["id"] for fields in to_update if len(fields["body"]) >= DELTA_MIN_CHARS]
+            previous_bodies: Dict[int, str] = {}
+            if large:
+                previous_bodies = dict(
+                    self.db.execute(select(Snippet.id, Snippet.body).where(Snippet.id.in_(large))).all()
+                )
+            self.db.execute(
+                update(Snippet),
+                [
+                    {
+                        "id": fields["id"],
+                        "name": fields["name"],
+                        "body": fields["body"],
+                        "tags": fields["tags"],
+                        "variables": fields["variables"],
+                        "content_hash": fields["content_hash"],
+                        "updated_by": self.user_id,
+                    }
+                    for fields in to_update
+                ],
+            )
+            for fields in to_update:
+                self._existing[fields["trigger"]] = (fields["id"], fields["content_hash"])
+                head = heads.get(fields["id"])
+                previous = None
+                if head is not None and fields["id"] in previous_bodies:
+                    previous = (previous_bodies[fields["id"]], head.delta_depth)
+                pending.append(
+                    self._pending(fields["id"], head.version + 1 if head else 1, fields, previous)
+                )
+            self.result.updated += len(to_update)
+
+        if pending:
+            self.db.execute(insert(SnippetVersion), build_version_rows(self.db, pending))
+
+    def _pending(
+        self,
+        snippet_id: int,
+        version: int,
+        fields: Dict[str, Any],
+        previous: Optional[Tuple[str, int]] = None,
+    ) -> PendingVersion:
+        return PendingVersion(
+            snippet_id=snippet_id,
+            version=version,
+            name=fields["name"],
+            trigger=fields["trigger"],
+            body=fields["body"],
+            tags=fields["tags"],
+            variables=fields["variables"],
+            edited_by=self.user_id,
+            content_hash=fields["content_hash"],
+            previous=previous,
+        )
+
+
+def import_snippets(
+    db: Session,
+    workspace_id: int,
+    user_id: Optional[int],
+    stream: IO[Any],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_progress: Optional[Callable[[ImportResult], None]] = None,
+) -> ImportResult:
+    """Stream snippets from ``stream`` into the workspace without committing.
+
+    The caller owns the transaction so that a schema mismatch discovered after
+    the snippets array (or any other failure) can be rolled back as a whole.
+    """
+
+    importer = SnippetImporter(db, workspace_id, user_id)
+    schema_seen = False
+    batch: List[Any] = []
+    for kind, value in iter_import_document(stream):
+        if kind == "schema":
+            if value != IMPORT_SCHEMA:
+                raise ImportFormatError("Unsupported schema")
+            schema_seen = True
+            continue
+        batch.append(value)
+        if len(batch) >= batch_size:
+            importer.apply(batch)
+            batch = []
+            if on_progress is not None:
+                on_progress(importer.result)
+    if batch:
+        importer.apply(batch)
+    if not schema_seen:
+        raise ImportFormatError("Unsupported schema")
+    if on_progress is not None:
+        on_progress(importer.result)
+    return importer.result
+
+
+@dataclass
+class ImportJob:
+    id: str
+    workspace_id: int
+    status: str = "pending"  # pending|running|succeeded|failed
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        payload["created_at"] = self.created_at.isoformat() + "Z"
+        payload["finished_at"] = self.finished_at.isoformat() + "Z" if self.finished_at else None
+        return payload
+
+
+class ImportJobRegistry:
+    """Bounded in-process registry of background import jobs."""
+
+    def __init__(self, max_jobs: int = 200) -> None:
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ImportJob] = {}
+        self._max_jobs = max_jobs
+
+    def create(self, workspace_id: int) -> ImportJob:
+        job = ImportJob(id=uuid.uuid4().hex, workspace_id=workspace_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.pop(next(iter(self._jobs)))
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+import_jobs = ImportJobRegistry()
+
+
+def run_import_job(
+    job: ImportJob,
+    path: str,
+    user_id: Optional[int],
+    session_factory: Callable[[], Session],
+    api_key_id: Optional[int] = None,
+) -> None:
+    """Execute an import job from a spooled file, updating ``job`` as batches land.
+
+    The spooled file at ``path`` is removed once the job finishes.
+    """
+
+    def _progress(result: ImportResult) -> None:
+        job.processed = result.processed
+        job.created = result.created
+        job.updated = result.updated
+        job.unchanged = result.unchanged
+
+    job.status = "running"
+    db = session_factory()
+    try:
+        with open(path, "rb") as stream:
+            result = import_snippets(db, job.workspace_id, user_id, stream, on_progress=_progress)
+        record_audit(
+            db,
+            workspace_id=job.workspace_id,
+            user_id=user_id,
+            api_key_id=api_key_id,
+            action="import",
+            meta={"count": result.processed, "job_id": job.id},
+        )
+        db.commit()
+        job.status = "succeeded"
+    except Exception as exc:
+        db.rollback()
+        job.status = "failed"
+        job.error = str(exc) if isinstance(exc, ImportFormatError) else "Import failed"
+        logger.exception("snippet_import_job_failed", extra={"job_id": job.id})
+    finally:
+        db.close()
+        job.finished_at = datetime.utcnow()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
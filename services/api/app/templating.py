@@ -0,0 +1,68 @@
+"""Compiled snippet templates for server-side rendering.
+
+Placeholders use ``{{ name }}``; ``Snippet.variables`` maps placeholder names
+to default values. A body is parsed once into alternating literal and
+placeholder segments so each expansion is a single join.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .cache import LRUCache
+
+PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][\w.-]*)\s*\}\}")
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    # Even indexes are literals, odd indexes are placeholder names.
+    parts: Tuple[str, ...]
+    defaults: Mapping[str, str]
+    # Original placeholder text, echoed back when a value is missing.
+    raw: Tuple[str, ...] = ()
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self.parts[1::2]
+
+    def render(self, values: Optional[Mapping[str, str]] = None) -> Tuple[str, List[str]]:
+        """Return the expanded text and the placeholders left unresolved."""
+
+        values = values or {}
+        out: List[str] = []
+        missing: List[str] = []
+        for index, part in enumerate(self.parts):
+            if index % 2 == 0:
+                out.append(part)
+                continue
+            value = values.get(part)
+            if value is None:
+                value = self.defaults.get(part)
+            if value is None:
+                missing.append(part)
+                value = self.raw[index // 2]
+            out.append(str(value))
+        return "".join(out), missing
+
+
+def compile_template(body: str, defaults: Optional[Mapping[str, str]] = None) -> CompiledTemplate:
+    return CompiledTemplate(
+        parts=tuple(PLACEHOLDER.split(body)),
+        defaults=dict(defaults or {}),
+        raw=tuple(match.group(0) for match in PLACEHOLDER.finditer(body)),
+    )
+
+
+# Keyed by (snippet_id, version, content_hash); the hash guards against reused ids.
+template_cache = LRUCache(maxsize=4096)
+
+
+def cached_template(key: tuple, body: str, defaults: Optional[Dict[str, str]]) -> CompiledTemplate:
+    template = template_cache.get(key, None)
+    if template is None:
+        template = compile_template(body, defaults)
+        template_cache.set(key, template)
+    return template
@@ -1,38 +1,65 @@
 """Utility helpers for workspace membership and snippet responses."""
 
 from datetime import datetime
-from typing import Optional
+import hashlib
+import json
+from typing import Any, Optional
 
 from fastapi import HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from .cache import MISSING, LRUCache
+from .config import settings
 from .metrics import SNIPPET_MUTATIONS
 from .models import Membership, Snippet, SnippetVersion
 from .schemas import SnippetOut
 
 
+# (user_id, workspace_id) -> role, or None for "not a member".
+_membership_cache = LRUCache(maxsize=50_000, ttl=settings.auth_cache_ttl_seconds)
+
+
 def require_membership(
     db: Session,
-    user_id: int,
+    user: Any,
     workspace_id: int,
     roles: Optional[list[str]] = None,
-) -> Membership:
-    membership = (
-        db.execute(
-            select(Membership).where(
-                Membership.user_id == user_id,
-                Membership.workspace_id == workspace_id,
-            )
-        )
-        .scalars()
-        .first()
-    )
-    if membership is None:
+) -> str:
+    """Return the caller's role in the workspace, raising 403 if it is missing or insufficient.
+
+    Roles signed into the token are trusted first; otherwise the role comes
+    from a short-TTL cache and the database is only queried on a miss.
+    """
+
+    claims = getattr(user, "roles", None)
+    role = claims.get(workspace_id) if claims else None
+    if role is None and not getattr(user, "scoped", False):
+        key = (user.id, workspace_id)
+        role = _membership_cache.get(key)
+        if role is MISSING:
+            role = db.execute(
+                select(Membership.role).where(
+                    Membership.user_id == user.id,
+                    Membership.workspace_id == workspace_id,
+                )
+            ).scalar_one_or_none()
+            _membership_cache.set(key, role)
+    if role is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a workspace member")
-    if roles and membership.role not in roles:
+    if roles and role not in roles:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient role")
-    return membership
+    return role
+
+
+def invalidate_membership(user_id: int, workspace_id: int) -> None:
+    """Forget the cached role after a membership is created, changed or removed."""
+
+    _membership_cache.pop((user_id, workspace_id))
+
+
+def clear_membership_cache() -> None:
+    _membership_cache.clear()
 
 
 def serialize_snippet(snippet: Snippet, version: Optional[int] = None) -> SnippetOut:
@@ -58,6 +85,24 @@ def serialize_snippet(snippet: Snippet, version: Optional[int] = None) -> Snippe
     )
 
 
+def snippet_content_hash(
+    name: str,
+    trigger: str,
+    body: str,
+    tags: Optional[list[str]],
+    variables: Optional[dict[str, Any]],
+) -> str:
+    """Return a stable SHA-256 digest of the user-visible snippet fields."""
+
+    payload = json.dumps(
+        [name, trigger, body, tags or [], variables or {}],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def record_snippet_mutation(action: str) -> None:
     """Increment metrics counter for snippet mutations."""
 
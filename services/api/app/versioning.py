@@ -0,0 +1,342 @@
+"""Content-addressed snippet version storage.
+
+Version rows never carry a copy of the body. Each body is hashed; identical
+bodies share one ``SnippetBlob`` row, and large bodies that differ only a
+little from the previous version are stored as a line delta against it.
+Delta chains are capped at ``MAX_DELTA_CHAIN`` so reconstructing any version
+costs at most two queries and a bounded number of patch applications.
+"""
+
+from __future__ import annotations
+
+import difflib
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import Snippet, SnippetBlob, SnippetVersion
+from .utils import snippet_content_hash
+
+logger = logging.getLogger(__name__)
+
+DELTA_MIN_CHARS = 2048
+DELTA_MAX_RATIO = 0.5
+MAX_DELTA_CHAIN = 16
+
+Delta = List[Union[str, List[int]]]
+
+
+def body_hash(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def make_delta(base: str, target: str) -> Delta:
+    """Encode ``target`` as line ranges copied from ``base`` plus inserted text."""
+
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops: Delta = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+    return ops
+
+
+def apply_delta(base: str, delta: Delta) -> str:
+    base_lines = base.splitlines(keepends=True)
+    return "".join("".join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in delta)
+
+
+@dataclass
+class VersionHead:
+    version: int
+    content_hash: Optional[str]
+    delta_depth: int
+
+
+def latest_heads(db: Session, snippet_ids: Iterable[int]) -> Dict[int, VersionHead]:
+    """Return the newest version metadata for each snippet in a single query."""
+
+    ids = list(snippet_ids)
+    if not ids:
+        return {}
+    newest = (
+        select(SnippetVersion.snippet_id, func.max(SnippetVersion.version).label("version"))
+        .where(SnippetVersion.snippet_id.in_(ids))
+        .group_by(SnippetVersion.snippet_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            SnippetVersion.snippet_id,
+            SnippetVersion.version,
+            SnippetVersion.content_hash,
+            SnippetVersion.delta_depth,
+        ).join(
+            newest,
+            and_(
+                SnippetVersion.snippet_id == newest.c.snippet_id,
+                SnippetVersion.version == newest.c.version,
+            ),
+        )
+    ).all()
+    return {row.snippet_id: VersionHead(row.version, row.content_hash, row.delta_depth or 0) for row in rows}
+
+
+@dataclass
+class PendingVersion:
+    snippet_id: int
+    version: int
+    name: str
+    trigger: str
+    body: str
+    tags: Optional[List[str]]
+    variables: Optional[Dict[str, Any]]
+    edited_by: Optional[int]
+    content_hash: Optional[str] = None
+    # Body and delta depth of ``version - 1`` when a delta against it is allowed.
+    previous: Optional[Tuple[str, int]] = None
+
+
+class _BlobWriter:
+    """Collect blob rows for one write and insert the missing ones in bulk."""
+
+    def __init__(self, db: Session, hashes: Set[str]) -> None:
+        self.db = db
+        self.known: Set[str] = set()
+        if hashes:
+            self.known = set(
+                db.scalars(select(SnippetBlob.content_hash).where(SnippetBlob.content_hash.in_(hashes)))
+            )
+        self.pending: Dict[str, str] = {}
+
+    def has(self, digest: str) -> bool:
+        return digest in self.known or digest in self.pending
+
+    def add(self, digest: str, body: str) -> None:
+        if not self.has(digest):
+            self.pending[digest] = body
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        rows = [
+            {"content_hash": digest, "body": body, "size": len(body)}
+            for digest, body in self.pending.items()
+        ]
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            dialect_insert = None
+        if dialect_insert is not None:
+            stmt = dialect_insert(SnippetBlob.__table__).on_conflict_do_nothing(index_elements=["content_hash"])
+            self.db.execute(stmt, rows)
+        else:
+            self.db.execute(insert(SnippetBlob.__table__), rows)
+        self.known.update(self.pending)
+        self.pending.clear()
+
+
+def _encode_body(
+    body: str,
+    version: int,
+    previous: Optional[Tuple[str, int]],
+    blobs: _BlobWriter,
+) -> Dict[str, Any]:
+    digest = body_hash(body)
+    storage: Dict[str, Any] = {"body": None, "body_hash": digest, "base_version": None, "delta": None, "delta_depth": 0}
+    if blobs.has(digest):
+        return storage
+    if previous is not None and len(body) >= DELTA_MIN_CHARS and previous[1] < MAX_DELTA_CHAIN:
+        delta = make_delta(previous[0], body)
+        if len(json.dumps(delta)) <= len(body) * DELTA_MAX_RATIO:
+            storage.update(base_version=version - 1, delta=delta, delta_depth=previous[1] + 1)
+            return storage
+    blobs.add(digest, body)
+    return storage
+
+
+def build_version_rows(db: Session, pending: Sequence[PendingVersion]) -> List[Dict[str, Any]]:
+    """Encode pending versions, writing any new blobs, and return rows for a bulk insert."""
+
+    blobs = _BlobWriter(db, {body_hash(item.body) for item in pending})
+    rows = []
+    for item in pending:
+        rows.append(
+            {
+                "snippet_id": item.snippet_id,
+                "version": item.version,
+                "name": item.name,
+                "trigger": item.trigger,
+                "tags": item.tags,
+                "variables": item.variables,
+                "content_hash": item.content_hash
+                or snippet_content_hash(item.name, item.trigger, item.body, item.tags, item.variables),
+                "edited_by": item.edited_by,
+                **_encode_body(item.body, item.version, item.previous, blobs),
+            }
+        )
+    blobs.flush()
+    return rows
+
+
+def record_version(db: Session, snippet: Snippet, edited_by: Optional[int], previous_body: Optional[str] = None) -> int:
+    """Append the snippet's current state as its next version and return the version number.
+
+    ``previous_body`` is the body before this change; when supplied the new
+    version may be stored as a delta against the previous one.
+    """
+
+    head = latest_heads(db, [snippet.id]).get(snippet.id)
+    version = head.version + 1 if head else 1
+    rows = build_version_rows(
+        db,
+        [
+            PendingVersion(
+                snippet_id=snippet.id,
+                version=version,
+                name=snippet.name,
+                trigger=snippet.trigger,
+                body=snippet.body,
+                tags=snippet.tags,
+                variables=snippet.variables,
+                edited_by=edited_by,
+                content_hash=snippet.content_hash,
+                previous=(previous_body, head.delta_depth) if head and previous_body is not None else None,
+            )
+        ],
+    )
+    db.execute(insert(SnippetVersion), rows)
+    return version
+
+
+def workspace_versions(workspace_id: int):
+    """Subquery of ``(snippet_id, version)``, each snippet's newest version in one workspace.
+
+    Outer-join it onto a snippet listing instead of loading ``Snippet.versions`` per row.
+    """
+
+    return (
+        select(SnippetVersion.snippet_id, func.max(SnippetVersion.version).label("version"))
+        .join(Snippet, Snippet.id == SnippetVersion.snippet_id)
+        .where(Snippet.workspace_id == workspace_id)
+        .group_by(SnippetVersion.snippet_id)
+        .subquery()
+    )
+
+
+def current_version(db: Session, snippet_id: int) -> int:
+    head = latest_heads(db, [snippet_id]).get(snippet_id)
+    return head.version if head else 1
+
+
+def load_version_body(db: Session, row: SnippetVersion) -> str:
+    """Reconstruct the body of a version row from inline, blob or delta storage."""
+
+    if row.body is not None:
+        return row.body
+    if row.delta is None:
+        return db.scalar(select(SnippetBlob.body).where(SnippetBlob.content_hash == row.body_hash))
+
+    chain = {
+        item.version: item
+        for item in db.execute(
+            select(
+                SnippetVersion.version,
+                SnippetVersion.body,
+                SnippetVersion.body_hash,
+                SnippetVersion.base_version,
+                SnippetVersion.delta,
+            ).where(
+                SnippetVersion.snippet_id == row.snippet_id,
+                SnippetVersion.version >= row.version - row.delta_depth,
+                SnippetVersion.version < row.version,
+            )
+        )
+    }
+    deltas = [row.delta]
+    base = chain[row.base_version]
+    while base.delta is not None:
+        deltas.append(base.delta)
+        base = chain[base.base_version]
+    body = base.body
+    if body is None:
+        body = db.scalar(select(SnippetBlob.body).where(SnippetBlob.content_hash == base.body_hash))
+    for delta in reversed(deltas):
+        body = apply_delta(body, delta)
+    return body
+
+
+def compact_history(db: Session, workspace_id: Optional[int] = None, batch_size: int = 200) -> Dict[str, int]:
+    """Move inline version bodies into blob/delta storage, committing per batch.
+
+    Returns counts of compacted versions and snippets. Version numbers and
+    visible content are unchanged; only the storage representation moves.
+    """
+
+    stats = {"snippets": 0, "versions": 0}
+    query = select(SnippetVersion.snippet_id).where(SnippetVersion.body.is_not(None)).distinct()
+    if workspace_id is not None:
+        query = query.join(Snippet, Snippet.id == SnippetVersion.snippet_id).where(Snippet.workspace_id == workspace_id)
+    snippet_ids = list(db.scalars(query.order_by(SnippetVersion.snippet_id)))
+
+    for start in range(0, len(snippet_ids), batch_size):
+        chunk = snippet_ids[start:start + batch_size]
+        versions = db.scalars(
+            select(SnippetVersion)
+            .where(SnippetVersion.snippet_id.in_(chunk))
+            .order_by(SnippetVersion.snippet_id, SnippetVersion.version)
+        ).all()
+        stored = {row.body_hash for row in versions if row.body is None and row.delta is None}
+        blob_bodies: Dict[str, str] = {}
+        if stored:
+            blob_bodies = dict(
+                db.execute(
+                    select(SnippetBlob.content_hash, SnippetBlob.body).where(SnippetBlob.content_hash.in_(stored))
+                ).all()
+            )
+        blobs = _BlobWriter(db, {body_hash(row.body) for row in versions if row.body is not None})
+
+        updates = []
+        previous: Optional[Tuple[int, int, str, int]] = None  # (snippet_id, version, body, depth)
+        for row in versions:
+            follows = previous is not None and previous[:2] == (row.snippet_id, row.version - 1)
+            if row.body is not None:
+                body = row.body
+                encoded = _encode_body(body, row.version, previous[2:] if follows else None, blobs)
+                updates.append(
+                    {
+                        "id": row.id,
+                        "content_hash": row.content_hash
+                        or snippet_content_hash(row.name, row.trigger, body, row.tags, row.variables),
+                        **encoded,
+                    }
+                )
+                depth = encoded["delta_depth"]
+            elif row.delta is not None:
+                body = apply_delta(previous[2], row.delta) if follows else load_version_body(db, row)
+                depth = row.delta_depth
+            else:
+                body = blob_bodies[row.body_hash]
+                depth = 0
+            previous = (row.snippet_id, row.version, body, depth)
+
+        blobs.flush()
+        if updates:
+            db.execute(update(SnippetVersion), updates)
+        db.commit()
+        stats["snippets"] += len(chunk)
+        stats["versions"] += len(updates)
+        logger.info("snippet_history_compacted", extra={"snippets": len(chunk), "versions": len(updates)})
+    return stats
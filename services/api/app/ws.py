@@ -1,22 +1,136 @@
-"""WebSocket endpoints for realtime dataset collaboration."""
+"""WebSocket endpoints for realtime dataset collaboration.
+
+Every socket receives the dataset's broadcasts. A socket may also send edits
+(see :mod:`.dataset_ops` for the op protocol): inbound frames are queued, and
+one worker per socket applies whatever has queued up, up to
+``WS_OP_BATCH_MAX`` ops, in a threadpool with a single commit. It then
+broadcasts the changes to the other sockets and acks each op to the sender.
+"""
 
 from __future__ import annotations
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import APIRouter, Depends, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import sessionmaker
 
+from .config import settings
+from .database import get_session_factory
+from .dataset_cache import get_dataset_meta
+from .dataset_ops import OP_NAMES, BatchResult, RowOp, RowOpError, apply_batch, parse_op
+from .metrics import WS_OP_BATCH_SIZE, WS_OPS
 from .realtime import hub
+from .row_format import ENCODINGS, LAYOUTS, decode, msgpack_available
+
+logger = logging.getLogger(__name__)
 
 ws_router = APIRouter()
 
+# Unread frames beyond this stop the reader, which pushes back on the client through TCP.
+OP_QUEUE_SIZE = 1000
+
+Frame = Union[str, bytes]
+
 
 @ws_router.websocket('/ws/datasets/{dataset_id}')
-async def dataset_ws(websocket: WebSocket, dataset_id: int) -> None:
-    await hub.connect(dataset_id, websocket)
+async def dataset_ws(
+    websocket: WebSocket,
+    dataset_id: int,
+    layout: str = 'objects',
+    encoding: str = 'json',
+    session_factory: sessionmaker = Depends(get_session_factory),
+) -> None:
+    if layout not in LAYOUTS or encoding not in ENCODINGS or (encoding == 'msgpack' and not msgpack_available()):
+        # Accept first: a close before the handshake reaches the client as a bare HTTP 403.
+        # 1003: the requested wire format is not supported by this server.
+        await websocket.accept()
+        await websocket.close(code=1003, reason='Unsupported layout or encoding')
+        return
+    await hub.connect(dataset_id, websocket, layout=layout, encoding=encoding)
+    queue: asyncio.Queue[Optional[Frame]] = asyncio.Queue(maxsize=OP_QUEUE_SIZE)
+    worker = asyncio.create_task(_apply_ops(dataset_id, websocket, queue, session_factory))
     try:
         while True:
-            # We only keep the connection alive; edits flow through REST then broadcast.
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        pass
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            frame = message.get('text') if message.get('text') is not None else message.get('bytes')
+            if frame is not None:
+                await queue.put(frame)
     finally:
         await hub.disconnect(dataset_id, websocket)
+        # Let the worker finish the ops already received; their writes still reach other peers.
+        await queue.put(None)
+        await worker
+
+
+def _op_label(raw: Any) -> str:
+    # The op name is client input; only known ops become label values so series stay bounded.
+    op = raw.get('op') if isinstance(raw, dict) else None
+    return op if op in OP_NAMES else 'unknown'
+
+
+def _parse_frames(frames: List[Frame]) -> Tuple[List[RowOp], List[Dict[str, Any]]]:
+    ops: List[RowOp] = []
+    errors: List[Dict[str, Any]] = []
+    for frame in frames:
+        try:
+            payload = decode(frame)
+        except Exception:
+            errors.append({'type': 'error', 'op_id': None, 'status': 400, 'detail': 'Malformed message'})
+            continue
+        for raw in payload if isinstance(payload, list) else [payload]:
+            try:
+                ops.append(parse_op(raw))
+            except RowOpError as exc:
+                op_id = raw.get('op_id') if isinstance(raw, dict) else None
+                errors.append({'type': 'error', 'op_id': op_id, 'status': exc.status_code, 'detail': str(exc)})
+                WS_OPS.labels(op=_op_label(raw), outcome='invalid').inc()
+    return ops, errors
+
+
+def _apply_in_thread(session_factory: sessionmaker, dataset_id: int, ops: List[RowOp]) -> BatchResult:
+    # A session per batch, so a long-lived socket holds no connection between edits.
+    with session_factory() as db:
+        if get_dataset_meta(db, dataset_id) is None:
+            raise RowOpError('Dataset not found', status_code=404)
+        return apply_batch(db, dataset_id, ops)
+
+
+async def _apply_ops(dataset_id: int, websocket: WebSocket, queue: asyncio.Queue, session_factory: sessionmaker) -> None:
+    done = False
+    while not done:
+        frame = await queue.get()
+        if frame is None:
+            return
+        frames = [frame]
+        while len(frames) < settings.ws_op_batch_max and not queue.empty():
+            frame = queue.get_nowait()
+            if frame is None:
+                done = True
+                break
+            frames.append(frame)
+
+        ops, replies = _parse_frames(frames)
+        for start in range(0, len(ops), settings.ws_op_batch_max):
+            batch = ops[start : start + settings.ws_op_batch_max]
+            try:
+                result = await run_in_threadpool(_apply_in_thread, session_factory, dataset_id, batch)
+            except RowOpError as exc:
+                replies += [{'type': 'error', 'op_id': op.op_id, 'status': exc.status_code, 'detail': str(exc)} for op in batch]
+                continue
+            except Exception:
+                logger.exception('ws_ops_failed', extra={'dataset_id': dataset_id, 'ops': len(batch)})
+                replies += [{'type': 'error', 'op_id': op.op_id, 'status': 500, 'detail': 'Edit failed'} for op in batch]
+                continue
+            WS_OP_BATCH_SIZE.observe(len(batch))
+            for op, outcome in zip(batch, result.outcomes):
+                WS_OPS.labels(op=op.op, outcome='error' if outcome.error else 'ok').inc()
+                if outcome.broadcast is not None:
+                    await hub.broadcast(dataset_id, outcome.broadcast, exclude=websocket)
+                replies.append(outcome.reply())
+        if replies:
+            await hub.send(dataset_id, websocket, replies)
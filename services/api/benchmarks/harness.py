@@ -0,0 +1,218 @@
+"""Benchmark scenarios for the API, driven through an in-process client.
+
+Every scenario takes a ``TestClient`` (or anything with the same interface)
+so the same code runs from the CLI in :mod:`.run` against a fresh database
+and from the test-suite as a smoke test with a tiny corpus.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+CORPUS_PATH = Path(__file__).resolve().parents[3] / "olecystitis..csv"
+SEARCH_TERMS = ("hydrocephalus", "fracture", "CASE STUDY", "no evidence")
+
+
+@dataclass
+class BenchOptions:
+    clients: int = 25
+    patches: int = 200
+    upsert_batches: int = 10
+    upsert_batch_size: int = 100
+    page_size: int = 500
+    fanout_messages: int = 20
+
+
+def load_corpus(path: Path = CORPUS_PATH, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    """Return ``Label,Expansion,Diagnosis`` records from the bundled corpus."""
+
+    with open(path, encoding="utf-8", errors="replace", newline="") as handle:
+        rows = [
+            {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            for row in csv.DictReader(handle)
+        ]
+    return rows[:limit] if limit else rows
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples`` (which need not be sorted)."""
+
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: Sequence[float], elapsed: Optional[float] = None, units: Optional[int] = None) -> Dict[str, Any]:
+    """Summarize per-operation latencies (seconds) as milliseconds plus throughput."""
+
+    elapsed = sum(latencies) if elapsed is None else elapsed
+    units = len(latencies) if units is None else units
+    return {
+        "ops": len(latencies),
+        "seconds": round(elapsed, 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+        "per_second": round(units / elapsed, 1) if elapsed else None,
+    }
+
+
+def _timed(call: Callable[[], Any]) -> tuple[Any, float]:
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+
+def _ok(response, expected: Iterable[int] = (200, 201, 202)):
+    if response.status_code not in tuple(expected):
+        raise RuntimeError(f"{response.request.method} {response.request.url} -> {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def _csv_bytes(corpus: Sequence[Dict[str, str]]) -> bytes:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=["Label", "Expansion", "Diagnosis"])
+    writer.writeheader()
+    writer.writerows(corpus)
+    return output.getvalue().encode("utf-8")
+
+
+def _snippet_document(corpus: Sequence[Dict[str, str]]) -> bytes:
+    snippets, seen = [], set()
+    for row in corpus:
+        # Labels are long dotted paths; keep them unique within the trigger length limit.
+        trigger = ";" + row["Label"].lower()[-63:]
+        if not row["Label"] or not row["Expansion"] or trigger in seen:
+            continue
+        seen.add(trigger)
+        tags = [row["Diagnosis"]] if row["Diagnosis"] else []
+        snippets.append({"name": row["Label"][:128], "trigger": trigger, "body": row["Expansion"], "tags": tags})
+    return json.dumps({"schema": "text-expander.v1", "snippets": snippets}).encode("utf-8")
+
+
+def bench_datasets(client, corpus: Sequence[Dict[str, str]], options: BenchOptions) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    dataset = _ok(client.post("/datasets", json={"name": "bench", "columns": ["Label", "Expansion", "Diagnosis"]})).json()
+    base = f"/datasets/{dataset['id']}"
+
+    _, elapsed = _timed(lambda: _ok(client.post(f"{base}/import", files={"file": ("corpus.csv", _csv_bytes(corpus), "text/csv")})))
+    results["dataset_import"] = summarize([elapsed], units=len(corpus))
+
+    for fmt in ("json", "csv"):
+        _, elapsed = _timed(lambda: _ok(client.get(f"{base}/export", params={"fmt": fmt})))
+        results[f"dataset_export_{fmt}"] = summarize([elapsed], units=len(corpus))
+
+    latencies, offset, row_ids = [], 0, []
+    while True:
+        response, elapsed = _timed(lambda: _ok(client.get(f"{base}/rows", params={"offset": offset, "limit": options.page_size})))
+        latencies.append(elapsed)
+        rows = response.json()["rows"]
+        row_ids += [row["id"] for row in rows]
+        offset += options.page_size
+        if len(rows) < options.page_size:
+            break
+    results["list_rows_paging"] = summarize(latencies, units=len(row_ids))
+
+    latencies = [
+        _timed(lambda: _ok(client.get(f"{base}/rows", params={"q": term, "limit": 100})))[1] for term in SEARCH_TERMS
+    ]
+    results["list_rows_search"] = summarize(latencies)
+
+    latencies = []
+    for index in range(options.patches):
+        payload = {"id": row_ids[index % len(row_ids)], "key": "Diagnosis", "value": f"bench {index}"}
+        latencies.append(_timed(lambda: _ok(client.post(f"{base}/rows/patch", json=payload)))[1])
+    results["patch_cell"] = summarize(latencies)
+
+    latencies = []
+    for batch in range(options.upsert_batches):
+        rows = [
+            {"Label": f"BENCH.{batch}.{index}", "Expansion": "Synthetic row", "Diagnosis": "bench"}
+            for index in range(options.upsert_batch_size)
+        ]
+        latencies.append(_timed(lambda: _ok(client.post(f"{base}/rows/upsert", json={"rows": rows})))[1])
+    results["rows_upsert"] = summarize(latencies, units=options.upsert_batches * options.upsert_batch_size)
+
+    results["ws_fanout"] = bench_fanout(client, dataset["id"], row_ids, options)
+    return results
+
+
+def bench_fanout(client, dataset_id: int, row_ids: Sequence[int], options: BenchOptions) -> Dict[str, Any]:
+    """Time from issuing a patch to the last of ``options.clients`` sockets receiving it."""
+
+    from contextlib import ExitStack
+
+    latencies = []
+    with ExitStack() as stack:
+        sockets = [stack.enter_context(client.websocket_connect(f"/ws/datasets/{dataset_id}")) for _ in range(options.clients)]
+        for index in range(options.fanout_messages):
+            payload = {"id": row_ids[index % len(row_ids)], "key": "Diagnosis", "value": f"fanout {index}"}
+            started = time.perf_counter()
+            _ok(client.post(f"/datasets/{dataset_id}/rows/patch", json=payload))
+            for ws in sockets:
+                ws.receive_text()
+            latencies.append(time.perf_counter() - started)
+    result = summarize(latencies, units=len(latencies) * options.clients)
+    result["clients"] = options.clients
+    return result
+
+
+def bench_snippets(client, corpus: Sequence[Dict[str, str]], headers: Dict[str, str]) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    document = _snippet_document(corpus)
+    base = "/workspaces/1"
+
+    for label in ("snippet_import", "snippet_reimport_unchanged"):
+        response, elapsed = _timed(
+            lambda: _ok(client.post(f"{base}/import", files={"file": ("snippets.json", document, "application/json")}, headers=headers))
+        )
+        results[label] = summarize([elapsed], units=response.json()["imported"])
+
+    latencies = [_timed(lambda: _ok(client.get(f"{base}/snippets", headers=headers)))[1] for _ in range(5)]
+    results["snippet_list"] = summarize(latencies)
+    latencies = [
+        _timed(lambda: _ok(client.get(f"{base}/snippets", params={"q": term}, headers=headers)))[1]
+        for term in SEARCH_TERMS
+    ]
+    results["snippet_search"] = summarize(latencies)
+    return results
+
+
+def run_all(client, corpus: Sequence[Dict[str, str]], options: Optional[BenchOptions] = None) -> Dict[str, Any]:
+    options = options or BenchOptions()
+    token = _ok(client.post("/auth/magic", json={"email": "bench@example.com"})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    results = bench_datasets(client, corpus, options)
+    results.update(bench_snippets(client, corpus, headers))
+    return results
+
+
+def check_thresholds(results: Dict[str, Any], thresholds: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """Return one entry per ``scenario.metric`` that exceeds its limit.
+
+    Limits named ``*_ms`` or ``seconds`` are maxima; ``per_second`` is a minimum.
+    """
+
+    failures = []
+    for name, limits in thresholds.items():
+        measured = results.get(name)
+        if measured is None:
+            continue
+        for metric, limit in limits.items():
+            value = measured.get(metric)
+            if value is None:
+                continue
+            failed = value < limit if metric == "per_second" else value > limit
+            if failed:
+                failures.append({"scenario": name, "metric": metric, "value": value, "limit": limit})
+    return failures
@@ -0,0 +1,338 @@
+"""Synthetic load generator for concurrent collaborative editing.
+
+Each simulated editor keeps a ``/ws/datasets/{id}`` socket open and issues a
+mix of ``rows/patch``, ``rows/upsert`` and ``delete_rows`` requests over HTTP
+at a fixed rate. Every edit carries a unique marker, so the time from sending
+the request to each socket receiving the matching broadcast can be measured
+end to end.
+
+Usage (from the repository root; no network access needed)::
+
+    python -m services.api.benchmarks.loadgen --spawn --editors 50 --duration 30
+    python -m services.api.benchmarks.loadgen --base-url http://127.0.0.1:8000 --datasets 4
+
+``--spawn`` starts a local uvicorn on a free port with a temporary SQLite
+database and stops it afterwards. Results are printed as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import websockets
+
+from .harness import percentile
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+
+@dataclass
+class LoadConfig:
+    base_url: str = "http://127.0.0.1:8000"
+    datasets: int = 1
+    editors: int = 20
+    duration: float = 20.0
+    rate: float = 2.0  # operations per second per editor
+    seed_rows: int = 200
+    mix: Dict[str, float] = field(default_factory=lambda: {"patch": 0.8, "upsert": 0.15, "delete": 0.05})
+    upsert_size: int = 5
+
+
+@dataclass
+class PendingEdit:
+    kind: str
+    sent_at: float
+    expected: int
+    received: List[float] = field(default_factory=list)
+
+
+class LoadRun:
+    """Shared state of one load run: outstanding edits and collected samples."""
+
+    def __init__(self, config: LoadConfig) -> None:
+        self.config = config
+        self.pending: Dict[str, PendingEdit] = {}
+        self.http_latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.room_sizes: Dict[int, int] = defaultdict(int)
+        # Rows created by upserts, keyed by dataset, available for deletes.
+        self.created: Dict[int, List[int]] = defaultdict(list)
+        self._ids = itertools.count()
+
+    def marker(self) -> str:
+        return f"lg-{os.getpid()}-{next(self._ids)}"
+
+    def observe(self, dataset_id: int, message: Dict[str, Any], now: float) -> None:
+        for marker in self._markers(dataset_id, message):
+            edit = self.pending.get(marker)
+            if edit is not None:
+                edit.received.append(now - edit.sent_at)
+
+    def _markers(self, dataset_id: int, message: Dict[str, Any]) -> Iterator[str]:
+        kind = message.get("type")
+        if kind == "cell" and isinstance(message.get("value"), str):
+            yield message["value"]
+        elif kind == "rows_upsert":
+            seen = set()
+            for row in message.get("rows", []):
+                marker = row.get("_lg")
+                if marker and marker not in seen:
+                    seen.add(marker)
+                    yield marker
+        elif kind == "delete_rows":
+            yield "del:" + ",".join(str(i) for i in sorted(message.get("ids", [])))
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        deliveries = [latency for edit in self.pending.values() for latency in edit.received]
+        full = [max(edit.received) for edit in self.pending.values() if len(edit.received) >= edit.expected and edit.received]
+        expected = sum(edit.expected for edit in self.pending.values())
+        ops: Dict[str, int] = defaultdict(int)
+        for edit in self.pending.values():
+            ops[edit.kind] += 1
+
+        def summary(samples: List[float]) -> Dict[str, Any]:
+            return {
+                "count": len(samples),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "max_ms": round(max(samples, default=0.0) * 1000, 3),
+            }
+
+        return {
+            "config": asdict(self.config),
+            "elapsed_seconds": round(elapsed, 2),
+            "ops": dict(ops),
+            "ops_per_second": round(sum(ops.values()) / elapsed, 1) if elapsed else None,
+            "deliveries_per_second": round(len(deliveries) / elapsed, 1) if elapsed else None,
+            "errors": dict(self.errors),
+            "http_latency": {kind: summary(samples) for kind, samples in self.http_latency.items()},
+            # Request sent -> one socket received the broadcast, over every delivery.
+            "broadcast_latency": summary(deliveries),
+            # Request sent -> the last socket in the room received it.
+            "fanout_complete_latency": summary(full),
+            "deliveries_expected": expected,
+            "deliveries_received": len(deliveries),
+        }
+
+
+async def _listen(
+    run: LoadRun, ws_url: str, dataset_id: int, ready: asyncio.Event, stop: asyncio.Event, track_rows: bool
+) -> None:
+    try:
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            run.room_sizes[dataset_id] += 1
+            ready.set()
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.perf_counter()
+                message = json.loads(raw)
+                run.observe(dataset_id, message, now)
+                if track_rows and message.get("type") == "rows_upsert":
+                    # Rows created by the load are the only ones it deletes.
+                    run.created[dataset_id].extend(row["id"] for row in message.get("rows", []) if row.get("_lg"))
+    except (OSError, websockets.WebSocketException):
+        run.errors["websocket"] += 1
+        ready.set()
+
+
+async def _edit(run: LoadRun, http: httpx.AsyncClient, dataset_id: int, row_ids: List[int], rng: random.Random) -> None:
+    config = run.config
+    kind = rng.choices(list(config.mix), weights=list(config.mix.values()))[0]
+    if kind == "delete" and not run.created[dataset_id]:
+        kind = "patch"
+    marker = run.marker()
+    base = f"/datasets/{dataset_id}"
+    if kind == "patch":
+        request = ("POST", f"{base}/rows/patch", {"id": rng.choice(row_ids), "key": "note", "value": marker})
+        key = marker
+    elif kind == "upsert":
+        rows = [{"note": "synthetic", "_lg": marker} for _ in range(config.upsert_size)]
+        request = ("POST", f"{base}/rows/upsert", {"rows": rows})
+        key = marker
+    else:
+        ids = [run.created[dataset_id].pop()]
+        request = ("DELETE", f"{base}/rows", {"ids": ids})
+        key = "del:" + ",".join(str(i) for i in sorted(ids))
+
+    method, path, payload = request
+    edit = PendingEdit(kind=kind, sent_at=time.perf_counter(), expected=run.room_sizes[dataset_id])
+    run.pending[key] = edit
+    try:
+        if method == "DELETE":
+            response = await http.request(method, path, params=payload)
+        else:
+            response = await http.request(method, path, json=payload)
+        run.http_latency[kind].append(time.perf_counter() - edit.sent_at)
+        if response.status_code >= 400:
+            run.errors[f"http_{response.status_code}"] += 1
+            run.pending.pop(key, None)
+    except httpx.HTTPError:
+        run.errors["http"] += 1
+        run.pending.pop(key, None)
+
+
+async def _editor(run: LoadRun, http: httpx.AsyncClient, dataset_id: int, row_ids: List[int], stop: asyncio.Event, seed: int) -> None:
+    rng = random.Random(seed)
+    interval = 1.0 / run.config.rate
+    # Spread editors out so they do not all fire on the same tick.
+    await asyncio.sleep(rng.random() * interval)
+    while not stop.is_set():
+        started = time.perf_counter()
+        await _edit(run, http, dataset_id, row_ids, rng)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)) * rng.uniform(0.5, 1.5))
+
+
+async def _seed(http: httpx.AsyncClient, config: LoadConfig, index: int) -> Tuple[int, List[int]]:
+    created = (await http.post("/datasets", json={"name": f"loadgen {index}", "columns": ["note"]})).json()
+    dataset_id = created["id"]
+    rows = [{"note": f"seed {i}"} for i in range(config.seed_rows)]
+    (await http.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": rows})).raise_for_status()
+    listed = (await http.get(f"/datasets/{dataset_id}/rows", params={"limit": 2000})).json()
+    return dataset_id, [row["id"] for row in listed["rows"]]
+
+
+async def run_load(config: LoadConfig) -> Dict[str, Any]:
+    run = LoadRun(config)
+    ws_base = config.base_url.replace("http", "ws", 1)
+    limits = httpx.Limits(max_connections=max(10, config.editors), max_keepalive_connections=max(10, config.editors))
+    async with httpx.AsyncClient(base_url=config.base_url, limits=limits, timeout=30.0) as http:
+        datasets = [await _seed(http, config, index) for index in range(config.datasets)]
+
+        stop = asyncio.Event()
+        listeners, editors = [], []
+        for index in range(config.editors):
+            dataset_id, _ = datasets[index % len(datasets)]
+            ready = asyncio.Event()
+            # The first socket in each room records created row ids, so each id is tracked once.
+            url = f"{ws_base}/ws/datasets/{dataset_id}"
+            listeners.append(asyncio.create_task(_listen(run, url, dataset_id, ready, stop, index < len(datasets))))
+            await ready.wait()
+        started = time.perf_counter()
+        for index in range(config.editors):
+            dataset_id, row_ids = datasets[index % len(datasets)]
+            editors.append(asyncio.create_task(_editor(run, http, dataset_id, row_ids, stop, seed=index)))
+        await asyncio.sleep(config.duration)
+        stop.set()
+        await asyncio.gather(*editors)
+        elapsed = time.perf_counter() - started
+        # Give in-flight broadcasts a moment to land before closing the sockets.
+        await asyncio.sleep(1.0)
+        await asyncio.gather(*listeners)
+    return run.report(elapsed)
+
+
+def _free_port() -> int:
+    with contextlib.closing(socket.socket()) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def spawn_server(db_url: Optional[str] = None) -> Iterator[str]:
+    """Run ``uvicorn`` for the API on a free local port for the duration of the block."""
+
+    port = _free_port()
+    env = dict(os.environ)
+    env["DB_URL"] = db_url or f"sqlite:///{tempfile.mkdtemp(prefix='api-loadgen-')}/load.db"
+    env.setdefault("AUTO_CREATE_SCHEMA", "true")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "services.api.app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                if httpx.get(f"{base_url}/healthz", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not become healthy within 30s")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("patch", "upsert", "delete"):
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}")
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = LoadConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--base-url", default=defaults.base_url)
+    target.add_argument("--spawn", action="store_true", help="Start a local uvicorn with a temporary database")
+    parser.add_argument("--db-url", help="Database for --spawn (default: temporary SQLite)")
+    parser.add_argument("--datasets", type=int, default=defaults.datasets)
+    parser.add_argument("--editors", type=int, default=defaults.editors, help="Concurrent editors (one socket each)")
+    parser.add_argument("--duration", type=float, default=defaults.duration, help="Seconds of load")
+    parser.add_argument("--rate", type=float, default=defaults.rate, help="Edits per second per editor")
+    parser.add_argument("--seed-rows", type=int, default=defaults.seed_rows)
+    parser.add_argument("--upsert-size", type=int, default=defaults.upsert_size)
+    parser.add_argument("--mix", type=_parse_mix, default=defaults.mix, help="e.g. patch=0.8,upsert=0.15,delete=0.05")
+    parser.add_argument("--output", type=Path, help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    def config_for(base_url: str) -> LoadConfig:
+        return LoadConfig(
+            base_url=base_url,
+            datasets=args.datasets,
+            editors=args.editors,
+            duration=args.duration,
+            rate=args.rate,
+            seed_rows=args.seed_rows,
+            mix=args.mix,
+            upsert_size=args.upsert_size,
+        )
+
+    if args.spawn:
+        with spawn_server(args.db_url) as base_url:
+            report = asyncio.run(run_load(config_for(base_url)))
+    else:
+        report = asyncio.run(run_load(config_for(args.base_url)))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Run the API benchmark suite and write machine-readable results.
+
+Usage (from the repository root)::
+
+    python -m services.api.benchmarks.run                       # fresh SQLite file
+    python -m services.api.benchmarks.run --db-url postgresql+psycopg://localhost/bench --reset
+    python -m services.api.benchmarks.run --output bench.json --check
+
+``--check`` compares against ``thresholds.json`` (per backend) and exits
+non-zero on a regression. Postgres runs need ``--reset`` to drop and recreate
+the tables, so always point them at a throwaway database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .harness import CORPUS_PATH, BenchOptions, check_thresholds, load_corpus, run_all
+
+THRESHOLDS_PATH = Path(__file__).with_name("thresholds.json")
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", help="Database URL (default: a new temporary SQLite file)")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables before running")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH)
+    parser.add_argument("--limit", type=int, help="Only use the first N corpus records")
+    parser.add_argument("--clients", type=int, default=BenchOptions.clients, help="WebSocket clients for fan-out")
+    parser.add_argument("--output", type=Path, help="Write results JSON here as well as to stdout")
+    parser.add_argument("--thresholds", type=Path, default=THRESHOLDS_PATH)
+    parser.add_argument("--check", action="store_true", help="Exit 1 when a threshold is exceeded")
+    args = parser.parse_args(argv)
+
+    db_url = args.db_url or f"sqlite:///{tempfile.mkdtemp(prefix='api-bench-')}/bench.db"
+    # Settings are read at import time, so configure the environment first.
+    os.environ["DB_URL"] = db_url
+    os.environ.setdefault("AUTO_CREATE_SCHEMA", "true")
+
+    from fastapi.testclient import TestClient
+
+    from ..app.database import engine, init_db
+    from ..app.main import create_app
+    from ..app.models import Base
+
+    backend = engine.dialect.name
+    if args.reset or backend == "sqlite":
+        Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    corpus = load_corpus(args.corpus, args.limit)
+    started = time.perf_counter()
+    with TestClient(create_app()) as client:
+        results = run_all(client, corpus, BenchOptions(clients=args.clients))
+    thresholds = json.loads(args.thresholds.read_text()).get(backend, {}) if args.thresholds.exists() else {}
+    regressions = check_thresholds(results, thresholds)
+
+    report = {
+        "meta": {
+            "backend": backend,
+            "corpus_records": len(corpus),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "revision": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "total_seconds": round(time.perf_counter() - started, 2),
+        },
+        "results": results,
+        "regressions": regressions,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    print(text)
+    for item in regressions:
+        print(f"REGRESSION {item['scenario']}.{item['metric']}: {item['value']} (limit {item['limit']})", file=sys.stderr)
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
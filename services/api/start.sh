@@ -1,5 +1,7 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+# A new database is built from the models and stamped; an existing one is migrated.
+python -c "from app.database import create_new_database; create_new_database()"
 alembic upgrade head
 exec uvicorn app.main:app --host 0.0.0.0 --port 8000
@@ -1,15 +1,21 @@
 """Shared pytest fixtures for the API service."""
 
+import os
+import subprocess
+import sys
 from pathlib import Path
-from typing import Generator
+from typing import Callable, Generator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from services.api.app import models
-from services.api.app.database import get_db
+from services.api.app import models, partitions
+from services.api.app.database import get_db, get_read_db, get_session_factory
+from services.api.app.dataset_cache import dataset_cache
+from services.api.app.dependencies import clear_auth_caches
 from services.api.app.main import app
 
 TEST_DB_PATH = Path(__file__).parent / "test.db"
@@ -17,6 +23,18 @@ SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Tests marked ``postgres`` drop and recreate the ``public`` schema of this database.
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+API_DIR = Path(__file__).resolve().parents[1]
+
+
+def authenticate(client: TestClient, email: str = "rad@example.com") -> dict[str, str]:
+    """Sign in through the magic-link endpoint and return the bearer header."""
+
+    response = client.post("/auth/magic", json={"email": email})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
 
 @pytest.fixture(autouse=True)
 def override_settings_env(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -32,6 +50,8 @@ def db_session() -> Generator[Session, None, None]:
         yield session
     finally:
         session.close()
+        clear_auth_caches()
+        dataset_cache.clear()
         models.Base.metadata.drop_all(bind=engine)
         engine.dispose()
         TEST_DB_PATH.unlink(missing_ok=True)
@@ -45,10 +65,72 @@ def client(db_session: Session) -> Generator[TestClient, None, None]:
         finally:
             db_session.rollback()
 
+    # Reads share the single test database; replica routing is covered in test_replica.py.
     app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_read_db] = _get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
     client = TestClient(app)
     try:
         yield client
     finally:
         app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
+        app.dependency_overrides.pop(get_session_factory, None)
         client.close()
+
+
+def _reset_schema(pg: Engine) -> None:
+    with pg.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+
+
+def _run_in_api_dir(*args: str) -> None:
+    # A subprocess keeps alembic's logging setup out of this test session.
+    env = {**os.environ, "DB_URL": POSTGRES_URL, "DATASET_ROW_PARTITIONING": "list"}
+    subprocess.run([sys.executable, *args], cwd=API_DIR, env=env, check=True, capture_output=True)
+
+
+@pytest.fixture()
+def pg_engine() -> Generator[Engine, None, None]:
+    """A new, partitioned database at the latest revision, built the way ``start.sh`` builds one."""
+
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    pg = create_engine(POSTGRES_URL)
+    _reset_schema(pg)
+    _run_in_api_dir("-c", "from app.database import create_new_database; assert create_new_database()")
+    partitions._partitioned.clear()
+    try:
+        yield pg
+    finally:
+        partitions._partitioned.clear()
+        dataset_cache.clear()
+        _reset_schema(pg)
+        pg.dispose()
+
+
+@pytest.fixture()
+def pg_migrate(pg_engine: Engine) -> Callable[..., None]:
+    """Run an alembic command against ``pg_engine`` with row partitioning enabled."""
+
+    def _alembic(*args: str) -> None:
+        _run_in_api_dir("-m", "alembic", *args)
+
+    return _alembic
+
+
+@pytest.fixture()
+def pg_client(pg_engine: Engine, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    """A client on ``pg_engine``; every request gets its own session, as in production."""
+
+    sessions = sessionmaker(bind=pg_engine, autoflush=False)
+
+    def _get_db() -> Generator[Session, None, None]:
+        with sessions() as db:
+            yield db
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, _get_db)
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, _get_db)
+    monkeypatch.setitem(app.dependency_overrides, get_session_factory, lambda: sessions)
+    return TestClient(app)
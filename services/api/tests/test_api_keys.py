@@ -0,0 +1,61 @@
+"""Tests for workspace API keys."""
+
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from services.api.app.dependencies import clear_auth_caches
+from services.api.app.models import ApiKey, AuditLog
+
+from .conftest import authenticate
+
+
+def test_api_key_lifecycle_and_scope(client: TestClient) -> None:
+    headers = authenticate(client)
+    created = client.post("/workspaces/1/api-keys", json={"name": "desktop sync", "role": "viewer"}, headers=headers)
+    assert created.status_code == 201
+    token = created.json()["token"]
+    assert token.startswith("oak_") and created.json()["prefix"] in token
+
+    key_headers = {"X-API-Key": token}
+    assert client.get("/workspaces/1/snippets", headers=key_headers).status_code == 200
+    assert client.get("/workspaces/1/snippets", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    # Viewer keys cannot write and are confined to their workspace.
+    body = {"name": "n", "trigger": ";n", "body": "b"}
+    assert client.post("/workspaces/1/snippets", json=body, headers=key_headers).status_code == 403
+    assert client.get("/workspaces/2/snippets", headers=key_headers).status_code == 403
+    assert client.get("/workspaces/1/snippets", headers={"X-API-Key": token[:-2] + "xx"}).status_code == 401
+
+    listed = client.get("/workspaces/1/api-keys", headers=headers).json()
+    assert [item["name"] for item in listed] == ["desktop sync"] and "token" not in listed[0]
+
+    assert client.delete(f"/workspaces/1/api-keys/{created.json()['id']}", headers=headers).status_code == 200
+    assert client.get("/workspaces/1/snippets", headers=key_headers).status_code == 401
+
+
+def test_api_key_rate_limit(client: TestClient) -> None:
+    headers = authenticate(client)
+    token = client.post(
+        "/workspaces/1/api-keys", json={"name": "burst", "rate_limit_per_minute": 2}, headers=headers
+    ).json()["token"]
+    statuses = [client.get("/workspaces/1/snippets", headers={"X-API-Key": token}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_api_key_writes_are_tagged_and_orphaned_keys_rejected(client: TestClient, db_session: Session) -> None:
+    headers = authenticate(client)
+    created = client.post("/workspaces/1/api-keys", json={"name": "ci", "role": "editor"}, headers=headers).json()
+    key_headers = {"X-API-Key": created["token"]}
+
+    body = {"name": "n", "trigger": ";n", "body": "b"}
+    assert client.post("/workspaces/1/snippets", json=body, headers=key_headers).status_code == 201
+    event = db_session.scalars(select(AuditLog).where(AuditLog.action == "create_snippet")).one()
+    assert event.user_id is not None and event.meta["via_api_key_id"] == created["id"]
+
+    db_session.execute(update(ApiKey).where(ApiKey.id == created["id"]).values(created_by=None))
+    db_session.commit()
+    clear_auth_caches()
+    rejected = client.get("/workspaces/1/snippets", headers=key_headers)
+    assert (rejected.status_code, rejected.json()["detail"]) == (401, "API key has no owner")
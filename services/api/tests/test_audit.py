@@ -0,0 +1,163 @@
+"""Tests for the audit log writer and audit browsing."""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from services.api.app import audit
+from services.api.app.config import settings
+from services.api.app.models import AuditLog, AuditLogArchive
+
+from .conftest import TestingSessionLocal
+from .conftest import authenticate
+
+
+@pytest.fixture()
+def batched_writer(db_session: Session, monkeypatch: pytest.MonkeyPatch):
+    writer = audit.AuditWriter(TestingSessionLocal, batch_size=10, flush_interval=0.05)
+    monkeypatch.setattr(settings, "audit_mode", "batched")
+    monkeypatch.setattr(audit, "audit_writer", writer)
+    writer.start()
+    try:
+        yield writer
+    finally:
+        writer.stop()
+
+
+def test_batched_events_written_after_commit(db_session: Session, batched_writer: audit.AuditWriter) -> None:
+    for index in range(25):
+        audit.record_audit(db_session, action="create_snippet", meta={"snippet_id": index})
+    # Nothing reaches the table until the owning transaction commits.
+    assert db_session.scalars(select(AuditLog)).all() == []
+    db_session.commit()
+    batched_writer.stop()
+
+    rows = db_session.scalars(select(AuditLog).order_by(AuditLog.id)).all()
+    assert [row.meta["snippet_id"] for row in rows] == list(range(25))
+    assert all(row.created_at is not None for row in rows)
+
+
+def test_rolled_back_events_are_discarded(db_session: Session, batched_writer: audit.AuditWriter) -> None:
+    audit.record_audit(db_session, action="update_snippet")
+    db_session.rollback()
+    db_session.commit()
+    batched_writer.stop()
+
+    assert db_session.scalars(select(AuditLog)).all() == []
+
+
+def test_savepoint_rollback_keeps_outer_events(db_session: Session, batched_writer: audit.AuditWriter) -> None:
+    audit.record_audit(db_session, action="kept")
+    savepoint = db_session.begin_nested()
+    audit.record_audit(db_session, action="rolled_back")
+    savepoint.rollback()
+    with db_session.begin_nested():
+        audit.record_audit(db_session, action="released")
+    # Releasing the savepoint must not enqueue anything before the outer commit.
+    assert batched_writer._queue.qsize() == 0
+    db_session.commit()
+    batched_writer.stop()
+
+    assert sorted(row.action for row in db_session.scalars(select(AuditLog))) == ["kept", "released"]
+
+
+def test_overflow_policies() -> None:
+    written = []
+
+    class Recorder(audit.AuditWriter):
+        def _write(self, batch, outcome="written"):
+            written.append((outcome, len(batch)))
+
+    dropping = Recorder(TestingSessionLocal, max_queue=2, overflow="drop")
+    dropping.enqueue([{"action": "a"}] * 5)
+    assert written == []
+
+    syncing = Recorder(TestingSessionLocal, max_queue=2, overflow="sync")
+    syncing.enqueue([{"action": "a"}] * 5)
+    assert written == [("overflow_sync", 3)]
+
+    blocking = Recorder(TestingSessionLocal, max_queue=2, overflow="block", block_timeout=0.05)
+    started = time.monotonic()
+    blocking.enqueue([{"action": "a"}] * 50)
+    # One bounded wait for the whole batch, not one per event.
+    assert time.monotonic() - started < 1
+    assert written[-1] == ("overflow_sync", 48)
+
+
+def test_sync_mode_adds_row_to_session(db_session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "audit_mode", "sync")
+    audit.record_audit(db_session, action="export", workspace_id=None)
+    db_session.commit()
+
+    assert [row.action for row in db_session.scalars(select(AuditLog))] == ["export"]
+
+
+def test_audit_keyset_pages_and_filters(client: TestClient, db_session: Session) -> None:
+    headers = authenticate(client)
+    start = datetime(2024, 1, 1)
+    db_session.add_all(
+        AuditLog(
+            workspace_id=1,
+            user_id=1,
+            action="update_snippet" if index % 2 else "login_probe",
+            meta={"snippet_id": index} if index % 2 else {},
+            # Pairs of events share a timestamp so the id tie-breaker is exercised.
+            created_at=start + timedelta(minutes=index // 2),
+        )
+        for index in range(9)
+    )
+    db_session.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/workspaces/1/audit", params=params, headers=headers)
+        seen += [item["id"] for item in page.json() if item["action"] != "login"]
+        cursor = page.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert len(seen) == 9 and len(set(seen)) == 9
+    assert seen == sorted(seen, reverse=True)
+
+    by_action = client.get("/workspaces/1/audit", params={"action": "update_snippet"}, headers=headers).json()
+    assert [item["meta"]["snippet_id"] for item in by_action] == [7, 5, 3, 1]
+    assert client.get("/workspaces/1/audit", params={"cursor": "bogus!"}, headers=headers).status_code == 400
+
+
+def test_admin_audit_filters_dataset_events(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    first = client.post("/datasets", json={"name": "First", "columns": ["A"]}).json()["id"]
+    second = client.post("/datasets", json={"name": "Second", "columns": ["A"]}).json()["id"]
+    client.post(f"/datasets/{first}/snapshots", json={"name": "s"})
+    client.post(f"/datasets/{first}/rows/upsert", json={"rows": [{"A": "1"}]})
+    row_id = client.get(f"/datasets/{first}/rows").json()["rows"][0]["id"]
+    client.delete(f"/datasets/{first}/rows", params={"ids": [row_id]})
+    client.post(f"/datasets/{first}/rows/purge")
+
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.get("/admin/audit", params={"dataset_id": first}).status_code == 403
+    events = client.get("/admin/audit", params={"dataset_id": first}, headers=admin).json()
+    assert [item["action"] for item in events] == ["purge_rows", "create_snapshot", "create_dataset"]
+    assert all(item["workspace_id"] is None and item["meta"]["dataset_id"] == first for item in events)
+
+    page = client.get("/admin/audit", params={"dataset_id": second, "limit": 1}, headers=admin)
+    assert [item["action"] for item in page.json()] == ["create_dataset"]
+    assert page.headers["x-next-cursor"]
+
+
+def test_archive_moves_old_rows(db_session: Session) -> None:
+    db_session.add_all(
+        [
+            AuditLog(workspace_id=None, action="old", created_at=datetime.utcnow() - timedelta(days=120)),
+            AuditLog(workspace_id=None, action="recent", created_at=datetime.utcnow()),
+        ]
+    )
+    db_session.commit()
+
+    assert audit.archive_audit_logs(db_session, older_than_days=90, batch_size=1) == 1
+    assert [row.action for row in db_session.scalars(select(AuditLog))] == ["recent"]
+    assert [row.action for row in db_session.scalars(select(AuditLogArchive))] == ["old"]
@@ -0,0 +1,53 @@
+"""Tests for cached authentication and membership resolution."""
+
+from __future__ import annotations
+
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from services.api.app.config import settings
+
+from .conftest import authenticate
+
+
+@pytest.fixture()
+def auth_queries(db_session: Session) -> Generator[list[str], None, None]:
+    """Collect the user and membership statements sent while the test runs."""
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement or "FROM memberships" in statement:
+            statements.append(statement)
+
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
+
+
+def test_user_and_membership_are_cached_between_requests(client: TestClient, auth_queries: list[str]) -> None:
+    headers = authenticate(client)
+    assert client.get("/workspaces/1/snippets", headers=headers).status_code == 200
+
+    auth_queries.clear()
+    assert client.get("/workspaces/1/snippets", headers=headers).status_code == 200
+    assert auth_queries == []
+
+    assert client.get("/workspaces/2/snippets", headers=headers).status_code == 403
+
+
+def test_role_claims_skip_membership_lookup(
+    client: TestClient, auth_queries: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "auth_role_claims", True)
+    headers = authenticate(client, "claims@example.com")
+    auth_queries.clear()
+    assert client.get("/workspaces/1/snippets", headers=headers).status_code == 200
+    assert not any("FROM memberships" in statement for statement in auth_queries)
@@ -0,0 +1,40 @@
+"""Smoke test for the benchmark harness on a tiny slice of the corpus."""
+
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+from services.api.benchmarks.harness import BenchOptions, check_thresholds, load_corpus, run_all
+
+
+def test_benchmark_scenarios_run_and_report(client: TestClient) -> None:
+    corpus = load_corpus(limit=20)
+    options = BenchOptions(clients=3, patches=5, upsert_batches=2, upsert_batch_size=5, page_size=8, fanout_messages=2)
+    results = run_all(client, corpus, options)
+
+    assert results["dataset_import"]["per_second"] > 0
+    assert results["list_rows_paging"]["ops"] == 3
+    assert results["ws_fanout"]["clients"] == 3
+    assert results["snippet_reimport_unchanged"]["ops"] == 1
+
+    failures = check_thresholds(results, {"patch_cell": {"p95_ms": 0.0}, "rows_upsert": {"per_second": 1e9}})
+    assert {item["scenario"] for item in failures} == {"patch_cell", "rows_upsert"}
+
+
+def test_loadgen_matches_broadcasts_to_edits() -> None:
+    from services.api.benchmarks.loadgen import LoadConfig, LoadRun, PendingEdit
+
+    run = LoadRun(LoadConfig())
+    run.pending["lg-1"] = PendingEdit(kind="patch", sent_at=0.0, expected=2)
+    run.pending["lg-2"] = PendingEdit(kind="upsert", sent_at=0.0, expected=2)
+    run.pending["del:4,5"] = PendingEdit(kind="delete", sent_at=0.0, expected=2)
+    for now in (0.010, 0.020):
+        run.observe(1, {"type": "cell", "row_id": 3, "key": "note", "value": "lg-1"}, now)
+        run.observe(1, {"type": "rows_upsert", "rows": [{"id": 8, "_lg": "lg-2"}, {"id": 9, "_lg": "lg-2"}]}, now)
+    run.observe(1, {"type": "delete_rows", "ids": [5, 4]}, 0.030)
+
+    report = run.report(elapsed=1.0)
+    assert report["ops"] == {"patch": 1, "upsert": 1, "delete": 1}
+    assert (report["deliveries_expected"], report["deliveries_received"]) == (6, 5)
+    assert report["fanout_complete_latency"]["count"] == 2
+    assert report["fanout_complete_latency"]["max_ms"] == 20.0
@@ -0,0 +1,428 @@
+"""Tests for dataset metadata caching and row read formats."""
+
+from __future__ import annotations
+
+import io
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from services.api.app import column_ops, routes_datasets
+from services.api.app.config import settings
+from services.api.app.dataset_rows import bulk_insert_rows
+from services.api.app.dataset_snapshots import capture_rows, create_snapshot, snapshot_rows
+from services.api.app.models_datasets import Dataset, DatasetRow, DatasetSnapshot
+from services.api.app.partitions import ensure_partition
+
+
+def test_dataset_metadata_is_cached_and_written_through(client: TestClient) -> None:
+    created = client.post("/datasets", json={"name": "Cached", "columns": ["A"], "created_by_client": "c1"})
+    assert created.status_code == 201
+    dataset_id = created.json()["id"]
+
+    listed = client.get("/datasets/all")
+    assert [item["id"] for item in listed.json()["all"]] == [dataset_id]
+    assert int(client.get("/datasets/all").headers["x-query-count"]) == 0
+    assert int(client.get(f"/datasets/{dataset_id}").headers["x-query-count"]) == 0
+
+    client.post(f"/datasets/{dataset_id}/columns/add", json={"key": "B"})
+    detail = client.get(f"/datasets/{dataset_id}")
+    assert [col["key"] for col in detail.json()["schema"]["columns"]] == ["A", "B"]
+    assert int(detail.headers["x-query-count"]) == 0
+
+    second = client.post("/datasets", json={"name": "Second", "created_by_client": "c1"}).json()
+    mine = client.get("/datasets/mine-local", params={"client_id": "c1"}).json()
+    assert {item["id"] for item in mine} == {dataset_id, second["id"]}
+    assert client.get("/datasets/999").status_code == 404
+
+
+def test_rows_columnar_layouts(client: TestClient) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Wide", "columns": ["A", "B"]}).json()["id"]
+    client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": [{"A": "a1", "B": "b1"}, {"B": "b2", "C": "c2"}]})
+
+    objects = client.get(f"/datasets/{dataset_id}/rows").json()
+    ids = [row["id"] for row in objects["rows"]]
+    assert objects["rows"][1] == {"B": "b2", "C": "c2", "id": ids[1]}
+
+    rows = client.get(f"/datasets/{dataset_id}/rows", params={"layout": "rows"}).json()
+    assert rows == {"total": 2, "columns": ["id", "A", "B", "C"], "rows": [[ids[0], "a1", "b1", None], [ids[1], None, "b2", "c2"]]}
+
+    columns = client.get(f"/datasets/{dataset_id}/export", params={"layout": "columns"}).json()["content"]
+    assert columns == {"columns": ["id", "A", "B", "C"], "values": [ids, ["a1", None], ["b1", "b2"], [None, "c2"]]}
+    assert client.get(f"/datasets/{dataset_id}/rows", params={"layout": "bogus"}).status_code == 422
+
+    msgpack = pytest.importorskip("msgpack")
+    packed = client.get(f"/datasets/{dataset_id}/rows", params={"layout": "rows"}, headers={"Accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(packed.content) == rows
+
+
+def _assert_row_json_passthrough_matches(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Raw", "columns": ["A"]}).json()["id"]
+    # Keys are out of jsonb's (length, bytes) order, and the stray "id" comes first.
+    rows = [{"nested": {"x": [1, None]}, "n": 1.5, "A": "café"}, {"id": 999, "A": "stray id"}]
+    client.post(f"/datasets/{dataset_id}/import", files={"file": ("rows.json", json.dumps(rows), "application/json")})
+
+    def read() -> tuple:
+        listing = client.get(f"/datasets/{dataset_id}/rows", params={"limit": 1, "offset": 1})
+        export = client.get(f"/datasets/{dataset_id}/export")
+        # Re-encoding keeps key order (dict comparison would not) but drops whitespace.
+        return listing.headers["content-type"], json.dumps(listing.json()), json.dumps(export.json())
+
+    monkeypatch.setattr(settings, "row_json_passthrough", False)
+    expected = read()
+    monkeypatch.setattr(settings, "row_json_passthrough", True)
+    assert read() == expected
+    listing, export = json.loads(expected[1]), json.loads(expected[2])
+    assert listing["total"] == 2 and list(listing["rows"][0]) == ["id", "A"] and listing["rows"][0]["id"] != 999
+    assert list(export["content"][0]) == ["nested", "n", "A", "id"]
+
+
+def test_row_json_passthrough_matches_python_encoding(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    _assert_row_json_passthrough_matches(client, monkeypatch)
+
+
+@pytest.mark.postgres
+def test_row_json_passthrough_matches_python_encoding_on_postgres(
+    pg_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _assert_row_json_passthrough_matches(pg_client, monkeypatch)
+
+
+def test_parquet_and_arrow_round_trip(client: TestClient) -> None:
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    source = pa.table({"id": [7, 8], "Label": ["a", None], "Count": [1, 2], "Seen": pa.array([0, 86_400_000], pa.timestamp("ms"))})
+    sink = io.BytesIO()
+    pq.write_table(source, sink)
+
+    dataset_id = client.post("/datasets", json={"name": "Arrow"}).json()["id"]
+    imported = client.post(f"/datasets/{dataset_id}/import", files={"file": ("rows.parquet", sink.getvalue())})
+    assert imported.status_code == 200 and imported.json()["rows_added"] == 2
+    assert [col["key"] for col in imported.json()["schema"]["columns"]] == ["Label", "Count", "Seen"]
+    rows = client.get(f"/datasets/{dataset_id}/rows").json()["rows"]
+    assert rows[0]["Count"] == 1 and rows[0]["Seen"].startswith("1970-01-01") and rows[1]["Label"] is None
+
+    exported = client.get(f"/datasets/{dataset_id}/export", params={"fmt": "parquet"})
+    table = pq.read_table(io.BytesIO(exported.content))
+    assert table.column_names == ["id", "Label", "Count", "Seen"]
+    assert table.column("Count").to_pylist() == ["1", "2"]
+
+    stream = client.get(f"/datasets/{dataset_id}/export", params={"fmt": "arrow"})
+    assert stream.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    reimported = client.post(f"/datasets/{dataset_id}/import", files={"file": ("rows.arrows", stream.content)})
+    assert reimported.json()["rows_added"] == 2
+
+
+def test_merge_import_updates_changed_rows_only(client: TestClient) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Merge", "columns": ["Label", "Expansion", "Note"]}).json()["id"]
+    first = "Label,Expansion\nA,alpha\nB,beta\nC,gamma\n"
+    imported = client.post(
+        f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": "Label"}, files={"file": ("a.csv", first)}
+    ).json()
+    assert (imported["rows_added"], imported["rows_updated"], imported["rows_unchanged"]) == (3, 0, 0)
+    assert imported["schema"]["merge_keys"] == ["Label"]
+    assert [col["key"] for col in imported["schema"]["columns"]] == ["Label", "Expansion", "Note"]
+
+    with client.websocket_connect(f"/ws/datasets/{dataset_id}") as ws:
+        second = "Label,Expansion\nA,alpha\nB,BETA\nD,delta\n"
+        merged = client.post(f"/datasets/{dataset_id}/import", params={"mode": "merge"}, files={"file": ("b.csv", second)}).json()
+        assert (merged["rows_added"], merged["rows_updated"], merged["rows_unchanged"]) == (1, 1, 1)
+        assert sorted(row["Label"] for row in ws.receive_json()["rows"]) == ["B", "D"]
+
+    rows = client.get(f"/datasets/{dataset_id}/rows").json()
+    assert rows["total"] == 4
+    assert {row["Label"]: row["Expansion"] for row in rows["rows"]}["B"] == "BETA"
+
+    missing = client.post(f"/datasets/{dataset_id}/import", params={"mode": "merge"}, files={"file": ("c.csv", "Label,Expansion\n,x\n")})
+    assert missing.status_code == 400
+
+    duplicate = client.post(f"/datasets/{dataset_id}/import", files={"file": ("dup.csv", "Label,Expansion\nA,again\n")})
+    assert duplicate.status_code == 409
+    assert client.post(f"/datasets/{dataset_id}/import", files={"file": ("z.csv", "Label,Expansion\nZ,alpha\n")}).status_code == 200
+    conflict = client.post(f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": "Expansion"}, files={"file": ("d.csv", second)})
+    assert conflict.status_code == 409
+
+
+def test_column_operations_rewrite_rows_in_sql(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Ops", "columns": ["Label", "Age", "Flag", "Old"]}).json()["id"]
+    rows = [
+        {"Label": "a", "Age": "42", "Flag": "Yes", "Old": {"nested": [1]}},
+        {"Label": "b", "Age": "n/a", "Flag": "0"},
+        {"Label": "c", "Age": 7, "Flag": True, "Old": "x"},
+    ]
+    client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": rows})
+    base = f"/datasets/{dataset_id}/columns"
+
+    with client.websocket_connect(f"/ws/datasets/{dataset_id}") as ws:
+        renamed = client.post(f"{base}/rename", json={"key": "Old", "new_key": "Legacy"})
+        assert renamed.json()["rows_changed"] == 2
+        message = ws.receive_json()
+        assert message["type"] == "schema_change" and message["new_key"] == "Legacy"
+
+    assert client.post(f"{base}/retype", json={"key": "Age", "type": "number"}).json()["rows_changed"] == 2
+    assert client.post(f"{base}/retype", json={"key": "Flag", "type": "boolean"}).json()["rows_changed"] == 2
+    assert client.post(f"{base}/fill", json={"key": "Note", "value": "-"}).json()["rows_changed"] == 3
+    assert client.post(f"{base}/drop", json={"key": "Label"}).status_code == 200
+
+    data = sorted(client.get(f"/datasets/{dataset_id}/rows").json()["rows"], key=lambda row: row["id"])
+    assert [(row["Age"], row["Flag"], row.get("Legacy"), row["Note"]) for row in data] == [
+        (42, True, {"nested": [1]}, "-"),
+        (None, False, None, "-"),
+        (7, True, "x", "-"),
+    ]
+    assert all("Label" not in row and "Old" not in row for row in data)
+    schema = client.get(f"/datasets/{dataset_id}").json()["schema"]
+    assert [(col["key"], col["type"]) for col in schema["columns"]] == [
+        ("Age", "number"),
+        ("Flag", "boolean"),
+        ("Legacy", "string"),
+        ("Note", "string"),
+    ]
+    assert client.post(f"{base}/rename", json={"key": "Age", "new_key": "Flag"}).status_code == 409
+    assert client.post(f"{base}/drop", json={"key": "Missing"}).status_code == 404
+
+    monkeypatch.setattr(settings, "column_op_chunk_rows", 2)
+    job = client.post(f"{base}/rename", json={"key": "Note", "new_key": "Comment"})
+    assert job.status_code == 202
+    status = client.get(f"{base}/jobs/{job.json()['id']}").json()
+    assert (status["status"], status["rows_changed"], status["ranges_done"]) == ("succeeded", 3, 2)
+
+
+def test_failed_column_job_keeps_schema_and_resumes(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Jobs", "columns": ["A"]}).json()["id"]
+    client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": [{"A": str(n)} for n in range(3)]})
+    ids = [row["id"] for row in client.get(f"/datasets/{dataset_id}/rows").json()["rows"]]
+    base = f"/datasets/{dataset_id}/columns"
+    monkeypatch.setattr(settings, "column_op_chunk_rows", 1)
+
+    def columns() -> list:
+        return [col["key"] for col in client.get(f"/datasets/{dataset_id}").json()["schema"]["columns"]]
+
+    def failing_on_call(func, call: int, exc: Exception):
+        calls = []
+
+        def wrapper(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == call:
+                raise exc
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    # The second range fails: the first stays rewritten and the schema is untouched.
+    capture_rows = column_ops.capture_rows
+    monkeypatch.setattr(column_ops, "capture_rows", failing_on_call(capture_rows, 2, RuntimeError("connection lost")))
+    job_id = client.post(f"{base}/rename", json={"key": "A", "new_key": "B"}).json()["id"]
+    status = client.get(f"{base}/jobs/{job_id}").json()
+    assert (status["status"], status["rows_changed"], status["next_id"]) == ("failed", 1, ids[1])
+    assert (status["schema_updated"], status["resumable"]) == (False, True)
+    assert columns() == ["A"]
+
+    monkeypatch.setattr(column_ops, "capture_rows", capture_rows)
+    resumed = client.post(f"{base}/jobs/{job_id}/resume").json()
+    status = client.get(f"{base}/jobs/{resumed['id']}").json()
+    assert (status["status"], status["rows_changed"], status["schema_updated"]) == ("succeeded", 2, True)
+    assert client.post(f"{base}/jobs/{resumed['id']}/resume").status_code == 409
+    assert [row.get("B") for row in client.get(f"/datasets/{dataset_id}/rows").json()["rows"]] == ["0", "1", "2"]
+    assert columns() == ["B"]
+
+    # The schema no longer accepts the change once the rows are done: fail rather than write a stale plan.
+    conflict = routes_datasets.ColumnOpError("Column already exists", status_code=409)
+    monkeypatch.setattr(routes_datasets, "plan_schema", failing_on_call(routes_datasets.plan_schema, 2, conflict))
+    job_id = client.post(f"{base}/rename", json={"key": "B", "new_key": "C"}).json()["id"]
+    status = client.get(f"{base}/jobs/{job_id}").json()
+    assert status["status"] == "failed" and "schema changed" in status["error"]
+    assert (status["rows_changed"], status["schema_updated"]) == (3, False)
+    assert columns() == ["B"]
+
+
+def test_clone_and_snapshots_copy_rows_server_side(client: TestClient) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Source", "columns": ["A"]}).json()["id"]
+    client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": [{"A": "1"}, {"A": "2"}, {"A": "3"}]})
+    ids = [row["id"] for row in client.get(f"/datasets/{dataset_id}/rows").json()["rows"]]
+    client.delete(f"/datasets/{dataset_id}/rows", params={"ids": [ids[2]]})
+
+    full = client.post(f"/datasets/{dataset_id}/snapshots", json={"name": "full"}).json()
+    cow = client.post(f"/datasets/{dataset_id}/snapshots", json={"name": "cow", "mode": "cow"}).json()
+    assert (full["row_count"], cow["row_count"]) == (2, 2)
+    assert client.post(f"/datasets/{dataset_id}/snapshots", json={"name": "cow"}).status_code == 409
+
+    client.post(f"/datasets/{dataset_id}/rows/patch", json={"id": ids[0], "key": "A", "value": "changed"})
+    client.post(f"/datasets/{dataset_id}/rows/patch", json={"id": ids[0], "key": "A", "value": "changed again"})
+    client.delete(f"/datasets/{dataset_id}/rows", params={"ids": [ids[1]]})
+    client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": [{"A": "new"}]})
+
+    for snapshot in (full, cow):
+        rows = client.get(f"/datasets/{dataset_id}/snapshots/{snapshot['id']}/rows").json()["rows"]
+        assert [(row["id"], row["A"]) for row in rows] == [(ids[0], "1"), (ids[1], "2")]
+
+    clone = client.post(f"/datasets/{dataset_id}/clone", json={"snapshot_id": cow["id"]})
+    assert clone.status_code == 201 and clone.json()["rows_copied"] == 2
+    assert clone.json()["name"] == "Source (copy)"
+    cloned_rows = client.get(f"/datasets/{clone.json()['id']}/rows").json()["rows"]
+    assert [row["A"] for row in cloned_rows] == ["1", "2"]
+
+    live_clone = client.post(f"/datasets/{dataset_id}/clone", json={"name": "Template"}).json()
+    assert live_clone["rows_copied"] == 2
+    assert [row["A"] for row in client.get(f"/datasets/{live_clone['id']}/rows").json()["rows"]] == ["changed again", "new"]
+
+    assert [item["name"] for item in client.get(f"/datasets/{dataset_id}/snapshots").json()] == ["cow", "full"]
+    assert client.delete(f"/datasets/{dataset_id}/snapshots/{cow['id']}").json() == {"deleted": True}
+    assert client.get(f"/datasets/{dataset_id}/snapshots/{cow['id']}/rows").status_code == 404
+
+
+@pytest.mark.postgres
+def test_cow_snapshot_waits_for_in_flight_write(pg_engine: Engine) -> None:
+    sessions = sessionmaker(bind=pg_engine, autoflush=False)
+    with sessions() as db:
+        dataset = Dataset(name="Raced", schema={"columns": [{"key": "A"}]})
+        db.add(dataset)
+        db.flush()
+        dataset_id = dataset.id
+        ensure_partition(db, dataset_id)
+        row_id = bulk_insert_rows(db, dataset_id, [{"A": "before"}])[0]["id"]
+        db.commit()
+
+    taken = {}
+
+    def take_snapshot() -> None:
+        with sessions() as db:
+            taken["id"] = create_snapshot(db, db.get(Dataset, dataset_id), "cow", "cow").id
+            db.commit()
+
+    thread = threading.Thread(target=take_snapshot)
+    with sessions() as writer:
+        capture_rows(writer, dataset_id, row_ids=[row_id])
+        writer.execute(update(DatasetRow).where(DatasetRow.id == row_id).values(data={"A": "after"}))
+        thread.start()
+        thread.join(0.5)
+        # The snapshot waits on the writer's dataset lock instead of slipping in before its commit.
+        waited = thread.is_alive()
+        writer.commit()
+    thread.join(5)
+    assert waited
+
+    with sessions() as db:
+        capture_rows(db, dataset_id, row_ids=[row_id])
+        db.execute(update(DatasetRow).where(DatasetRow.id == row_id).values(data={"A": "later"}))
+        db.commit()
+        rows = db.execute(select(snapshot_rows(db.get(DatasetSnapshot, taken["id"])))).all()
+    assert [row.data for row in rows] == [{"A": "after"}]
+
+
+@pytest.mark.postgres
+def test_merge_index_is_built_concurrently_for_its_keys(pg_engine: Engine, pg_client: TestClient) -> None:
+    def index_keys(dataset_id: int):
+        with pg_engine.connect() as conn:
+            return conn.execute(
+                text(
+                    "SELECT indisvalid, obj_description(indexrelid, 'pg_class') FROM pg_index "
+                    "WHERE indexrelid = to_regclass(:name)"
+                ),
+                {"name": f"ix_dataset_rows_key_{dataset_id}"},
+            ).first()
+
+    def merge(dataset_id: int, body: str, key: str):
+        return pg_client.post(
+            f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": key}, files={"file": ("a.csv", body)}
+        )
+
+    dataset_id = pg_client.post("/datasets", json={"name": "Keyed", "columns": ["K", "V"]}).json()["id"]
+    assert merge(dataset_id, "K,V\n1,a\n2,a\n", "K").json()["rows_added"] == 2
+    assert tuple(index_keys(dataset_id)) == (True, '["K"]')
+
+    # V repeats, so the rebuild fails and both the index and the stored keys stay put.
+    assert merge(dataset_id, "K,V\n3,b\n", "V").status_code == 409
+    assert tuple(index_keys(dataset_id)) == (True, '["K"]')
+    assert pg_client.get(f"/datasets/{dataset_id}").json()["schema"]["merge_keys"] == ["K"]
+    assert merge(dataset_id, "K,V\n1,z\n", "K").json()["rows_updated"] == 1
+    assert merge(dataset_id, "K,V\n1,y\n", "V").json()["rows_added"] == 1
+    assert tuple(index_keys(dataset_id)) == (True, '["V"]')
+
+    clone = pg_client.post(f"/datasets/{dataset_id}/clone", json={}).json()
+    assert tuple(index_keys(clone["id"])) == (True, '["V"]')
+
+
+def test_row_counters_follow_writes_and_reconcile(
+    client: TestClient, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def counters(dataset_id: int):
+        db_session.expire_all()
+        dataset = db_session.get(Dataset, dataset_id)
+        return dataset.live_row_count, dataset.archived_row_count, dataset.approx_bytes
+
+    def actual_bytes(dataset_id: int) -> int:
+        return db_session.execute(
+            text("SELECT coalesce(sum(length(data)), 0) FROM dataset_rows WHERE dataset_id = :id"), {"id": dataset_id}
+        ).scalar()
+
+    dataset_id = client.post("/datasets", json={"name": "Counted", "columns": ["K", "V"]}).json()["id"]
+    client.post(f"/datasets/{dataset_id}/import", files={"file": ("a.csv", "K,V\n1,a\n2,b\n3,c\n")})
+    client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": [{"K": "4", "V": "d"}]})
+    ids = [row["id"] for row in client.get(f"/datasets/{dataset_id}/rows").json()["rows"]]
+    client.post(f"/datasets/{dataset_id}/rows/patch", json={"id": ids[0], "key": "V", "value": "a much longer value"})
+    client.post(f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": "K"}, files={"file": ("b.csv", "K,V\n2,bb\n5,e\n")})
+    client.delete(f"/datasets/{dataset_id}/rows", params={"ids": ids[2:4]})
+    client.delete(f"/datasets/{dataset_id}/rows", params={"ids": ids[3:4]})
+    assert counters(dataset_id) == (3, 2, actual_bytes(dataset_id))
+
+    rows = client.get(f"/datasets/{dataset_id}/rows")
+    assert rows.json()["total"] == 3
+    listed = client.get("/datasets/all").json()["all"]
+    assert (listed[0]["row_count"], listed[0]["approx_bytes"]) == (3, actual_bytes(dataset_id))
+
+    purged = client.post(f"/datasets/{dataset_id}/rows/purge").json()
+    assert purged["purged"] == 2 and purged["bytes_freed"] > 0
+    assert counters(dataset_id) == (3, 0, actual_bytes(dataset_id))
+
+    client.post(f"/datasets/{dataset_id}/columns/rename", json={"key": "V", "new_key": "Value"})
+    assert counters(dataset_id) == (3, 0, actual_bytes(dataset_id))
+    clone = client.post(f"/datasets/{dataset_id}/clone", json={}).json()
+    assert counters(clone["id"]) == (3, 0, actual_bytes(clone["id"]))
+
+    db_session.execute(text("UPDATE datasets SET live_row_count = 99 WHERE id = :id"), {"id": dataset_id})
+    db_session.commit()
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.post("/admin/datasets/reconcile-counts").status_code == 403
+    fixed = client.post("/admin/datasets/reconcile-counts", headers=admin).json()["fixed"]
+    assert [(item["dataset_id"], item["before"]["live_row_count"], item["after"]["live_row_count"]) for item in fixed] == [
+        (dataset_id, 99, 3)
+    ]
+    assert client.post("/admin/datasets/reconcile-counts", headers=admin).json() == {"fixed": []}
+
+
+def test_delete_dataset_removes_rows_snapshots_and_merge_index(
+    client: TestClient, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Doomed", "columns": ["K"], "created_by_client": "c9"}).json()["id"]
+    keep_id = client.post("/datasets", json={"name": "Kept", "columns": ["K"]}).json()["id"]
+    client.post(f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": "K"}, files={"file": ("a.csv", "K\n1\n2\n")})
+    client.post(f"/datasets/{keep_id}/rows/upsert", json={"rows": [{"K": "1"}]})
+    client.post(f"/datasets/{dataset_id}/snapshots", json={"name": "s"})
+    assert len(client.get("/datasets/mine-local", params={"client_id": "c9"}).json()) == 1
+
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 405
+    assert client.delete(f"/admin/datasets/{dataset_id}").status_code == 403
+    assert client.delete(f"/admin/datasets/{dataset_id}", headers=admin).json() == {"deleted": True}
+    assert client.get(f"/datasets/{dataset_id}").status_code == 404
+    assert client.delete(f"/admin/datasets/{dataset_id}", headers=admin).status_code == 404
+    assert client.get("/datasets/mine-local", params={"client_id": "c9"}).json() == []
+    counts = db_session.execute(
+        text(
+            "SELECT (SELECT count(*) FROM dataset_rows WHERE dataset_id = :id), "
+            "(SELECT count(*) FROM dataset_snapshots WHERE dataset_id = :id), "
+            "(SELECT count(*) FROM sqlite_master WHERE name = :index)"
+        ),
+        {"id": dataset_id, "index": f"ix_dataset_rows_key_{dataset_id}"},
+    ).one()
+    assert tuple(counts) == (0, 0, 0)
+    assert client.get(f"/datasets/{keep_id}/rows").json()["total"] == 1
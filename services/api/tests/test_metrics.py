@@ -0,0 +1,96 @@
+"""Tests for request instrumentation."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from services.api.app.config import settings
+from services.api.app.middleware import instrument_engines
+
+from .conftest import authenticate
+
+
+def test_request_metrics_use_route_templates(client: TestClient) -> None:
+    headers = authenticate(client)
+    response = client.get("/workspaces/1/snippets", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    client.get("/no/such/path")
+
+    body = client.get("/metrics").text
+    template = 'path="/workspaces/{workspace_id:int}/snippets"'
+    assert f'macro_http_requests_total{{method="GET",{template},status="200"}}' in body
+    assert f'macro_http_request_db_queries_count{{method="GET",{template}}}' in body
+    assert 'path="unmatched",status="404"' in body
+    assert 'path="/workspaces/1/snippets"' not in body
+    labels = {"method": "GET", "path": "/workspaces/{workspace_id:int}/snippets"}
+    assert REGISTRY.get_sample_value("macro_http_request_db_queries_sum", labels) > 0
+
+
+def test_slow_query_log_and_profile_trigger(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    headers = authenticate(client)
+    monkeypatch.setattr(settings, "slow_query_ms", 1e-6)
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+
+    with caplog.at_level(logging.WARNING, logger="services.api.app.middleware"):
+        response = client.get("/workspaces/1/snippets", headers={**headers, "X-Profile": "1", "X-Admin-Token": "s3cret"})
+    assert int(response.headers["x-query-count"]) >= 1
+    slow = [record for record in caplog.records if record.msg == "slow_query"]
+    assert slow and slow[0].route == "/workspaces/{workspace_id:int}/snippets"
+    assert len(slow[0].params_hash) == 12
+
+    profiles = list(tmp_path.glob("*.folded"))
+    assert len(profiles) == 1
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in profiles[0].read_text().splitlines())
+
+    # Other threads busy during the request are left out of its profile.
+    done = threading.Event()
+
+    def unrelated_busy_loop() -> None:
+        while not done.is_set():
+            sum(range(1000))
+
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path / "busy"))
+    monkeypatch.setattr(settings, "profile_interval_ms", 0.01)
+    busy = threading.Thread(target=unrelated_busy_loop)
+    busy.start()
+    try:
+        client.get("/workspaces/1/snippets", headers={**headers, "X-Profile": "1", "X-Admin-Token": "s3cret"})
+    finally:
+        done.set()
+        busy.join()
+    (profile,) = (tmp_path / "busy").glob("*.folded")
+    stacks = profile.read_text()
+    assert stacks
+    assert "unrelated_busy_loop" not in stacks
+
+    # Without the admin token the header is ignored.
+    client.get("/workspaces/1/snippets", headers={**headers, "X-Profile": "1"})
+    assert len(list(tmp_path.glob("**/*.folded"))) == 2
+
+
+def test_failed_statements_are_timed(db_session: Session) -> None:
+    def count() -> float:
+        return REGISTRY.get_sample_value("macro_db_query_duration_seconds_count") or 0
+
+    instrument_engines()
+    before = count()
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            db_session.execute(text("SELECT * FROM no_such_table"))
+        db_session.rollback()
+    db_session.execute(text("SELECT 1"))
+    assert count() - before == 4
+    assert "query_started" not in db_session.connection().info
@@ -0,0 +1,119 @@
+"""Tests for LIST partitioning of ``dataset_rows`` (migration 0011).
+
+The Postgres ones drop and recreate the ``public`` schema of the database named by
+``TEST_POSTGRES_URL``, so point it at a throwaway database::
+
+    TEST_POSTGRES_URL=postgresql+psycopg://postgres@localhost/scratch pytest -m postgres
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from services.api.app.config import settings
+from services.api.app.partitions import partitioning_requested
+
+
+@pytest.mark.parametrize(
+    ("dialect", "value", "expected"),
+    [
+        ("postgresql", "list", True),
+        ("postgresql", "LIST", True),
+        ("postgresql", "none", False),
+        ("postgresql", None, False),
+        ("sqlite", "list", False),
+    ],
+)
+def test_partitioning_requested(dialect: str, value: str | None, expected: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    if value is None:
+        monkeypatch.delenv("DATASET_ROW_PARTITIONING", raising=False)
+    else:
+        monkeypatch.setenv("DATASET_ROW_PARTITIONING", value)
+    assert partitioning_requested(dialect) is expected
+
+
+def _partition_tables(engine: Engine) -> list[str]:
+    with engine.connect() as conn:
+        return list(
+            conn.execute(
+                text(
+                    "SELECT child.relname FROM pg_inherits "
+                    "JOIN pg_class child ON child.oid = inhrelid "
+                    "WHERE inhparent = to_regclass('dataset_rows') ORDER BY 1"
+                )
+            ).scalars()
+        )
+
+
+def _key_index_tables(engine: Engine) -> dict[str, str]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT indexname, tablename FROM pg_indexes WHERE indexname LIKE 'ix_dataset_rows_key_%'"))
+        return dict(rows.all())
+
+
+@pytest.mark.postgres
+def test_migration_partitions_existing_rows_and_reverts(pg_engine: Engine, pg_migrate: Callable[..., None]) -> None:
+    # A new database is created partitioned; take it back to 0010 to start from a plain table.
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('dataset_rows')")).first()
+    pg_migrate("downgrade", "0010_dataset_counters")
+    with pg_engine.begin() as conn:
+        conn.execute(text("""INSERT INTO datasets (id, name, schema) VALUES (1, 'a', '{"merge_keys": ["K"]}'), (2, 'b', '{}')"""))
+        conn.execute(
+            text(
+                """INSERT INTO dataset_rows (dataset_id, data, archived) VALUES """
+                """(1, '{"K": "1"}', false), (1, '{"K": "2"}', false), (2, '{"K": "x"}', true)"""
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE UNIQUE INDEX ix_dataset_rows_key_1 ON dataset_rows ((data ->> 'K')) "
+                "WHERE dataset_id = 1 AND archived = false"
+            )
+        )
+
+    pg_migrate("upgrade", "head")
+    assert _partition_tables(pg_engine) == ["dataset_rows_p1", "dataset_rows_p2"]
+    assert _key_index_tables(pg_engine) == {"ix_dataset_rows_key_1": "dataset_rows_p1"}
+    with pg_engine.begin() as conn:
+        assert conn.execute(text("SELECT count(*) FROM dataset_rows_p1")).scalar() == 2
+        # The sequence still feeds ids after the table was rebuilt.
+        assert conn.execute(text("""INSERT INTO dataset_rows (dataset_id, data) VALUES (2, '{}') RETURNING id""")).scalar() == 4
+
+    pg_migrate("downgrade", "0010_dataset_counters")
+    assert _partition_tables(pg_engine) == []
+    assert _key_index_tables(pg_engine) == {"ix_dataset_rows_key_1": "dataset_rows"}
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM dataset_rows")).scalar() == 4
+
+
+@pytest.mark.postgres
+def test_datasets_get_and_drop_their_partition(
+    pg_engine: Engine, pg_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = pg_client
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+
+    doomed = client.post("/datasets", json={"name": "Doomed", "columns": ["K"]}).json()["id"]
+    kept = client.post("/datasets", json={"name": "Kept", "columns": ["K"]}).json()["id"]
+    for dataset_id in (doomed, kept):
+        imported = client.post(
+            f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": "K"}, files={"file": ("a.csv", "K,V\n1,a\n2,b\n")}
+        )
+        assert imported.json()["rows_added"] == 2
+    assert _partition_tables(pg_engine) == [f"dataset_rows_p{doomed}", f"dataset_rows_p{kept}"]
+    assert _key_index_tables(pg_engine)[f"ix_dataset_rows_key_{kept}"] == f"dataset_rows_p{kept}"
+
+    updated = client.post(f"/datasets/{kept}/import", params={"mode": "merge"}, files={"file": ("a.csv", "K,V\n1,z\n")})
+    assert updated.json()["rows_updated"] == 1
+
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.delete(f"/admin/datasets/{doomed}", headers=admin).json() == {"deleted": True}
+    assert _partition_tables(pg_engine) == [f"dataset_rows_p{kept}"]
+    assert f"ix_dataset_rows_key_{doomed}" not in _key_index_tables(pg_engine)
+    assert client.get(f"/datasets/{kept}/rows").json()["total"] == 2
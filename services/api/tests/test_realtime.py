@@ -0,0 +1,129 @@
+"""Tests for the realtime hub and its diagnostics."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from starlette.websockets import WebSocketDisconnect
+
+from services.api.app.config import settings
+from services.api.app.realtime import DatasetHub
+
+
+class FakeSocket:
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.sent: list[str] = []
+        self.closed = False
+
+    async def accept(self) -> None:
+        return None
+
+    async def send_text(self, payload: str) -> None:
+        if self.fail:
+            raise RuntimeError("socket gone")
+        self.sent.append(payload)
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+
+
+def test_broadcast_serializes_once_and_evicts_dead_sockets() -> None:
+    async def scenario() -> dict:
+        hub = DatasetHub(send_timeout=0.1)
+        healthy, dead = FakeSocket(), FakeSocket(fail=True)
+        await hub.connect(7, healthy)
+        await hub.connect(7, dead)
+        await hub.broadcast(7, {"type": "cell", "value": 1})
+        await hub.broadcast(7, {"type": "cell", "value": 2})
+        assert healthy.sent == ['{"type":"cell","value":1}', '{"type":"cell","value":2}']
+        assert dead.closed and dead.sent == []
+        return await hub.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["connections"] == 1
+    room = snapshot["largest_rooms"][0]
+    assert room["dataset_id"] == 7 and room["evictions"] == 1 and room["messages_sent"] == 2
+
+
+def test_admin_snapshot_requires_token(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    dataset = client.post("/datasets", json={"name": "Live"}).json()
+    with client.websocket_connect(f"/ws/datasets/{dataset['id']}"):
+        # Unset token: closed even in development.
+        assert client.get("/admin/realtime").status_code == 403
+
+        monkeypatch.setattr(settings, "admin_token", "s3cret")
+        assert client.get("/admin/realtime").status_code == 403
+        snapshot = client.get("/admin/realtime", headers={"X-Admin-Token": "s3cret"}).json()
+        room = snapshot["largest_rooms"][0]
+        assert (room["dataset_id"], room["connections"]) == (dataset["id"], 1)
+
+
+def test_websocket_columnar_upserts(client: TestClient) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Live", "columns": ["A"]}).json()["id"]
+    with client.websocket_connect(f"/ws/datasets/{dataset_id}") as plain, client.websocket_connect(
+        f"/ws/datasets/{dataset_id}?layout=rows"
+    ) as compact:
+        client.post(f"/datasets/{dataset_id}/rows/upsert", json={"rows": [{"A": "x"}]})
+        row = plain.receive_json()["rows"][0]
+        assert compact.receive_json() == {"type": "rows_upsert", "layout": "rows", "columns": ["id", "A"], "rows": [[row["id"], "x"]]}
+
+    msgpack = pytest.importorskip("msgpack")
+    with client.websocket_connect(f"/ws/datasets/{dataset_id}?layout=columns&encoding=msgpack") as packed:
+        client.post(f"/datasets/{dataset_id}/rows/patch", json={"id": row["id"], "key": "A", "value": "y"})
+        assert msgpack.unpackb(packed.receive_bytes())["value"] == "y"
+
+
+def test_websocket_rejects_unknown_formats_with_1003(client: TestClient) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Live", "columns": ["A"]}).json()["id"]
+    with client.websocket_connect(f"/ws/datasets/{dataset_id}?layout=bogus") as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1003 and closed.value.reason == "Unsupported layout or encoding"
+
+
+def test_websocket_ops_are_acked_and_broadcast_to_peers(client: TestClient) -> None:
+    dataset_id = client.post("/datasets", json={"name": "Live", "columns": ["K", "V"]}).json()["id"]
+    client.post(f"/datasets/{dataset_id}/import", params={"mode": "merge", "key": "K"}, files={"file": ("a.csv", "K,V\n1,a\n2,b\n")})
+    ids = [row["id"] for row in client.get(f"/datasets/{dataset_id}/rows").json()["rows"]]
+
+    with client.websocket_connect(f"/ws/datasets/{dataset_id}") as editor, client.websocket_connect(
+        f"/ws/datasets/{dataset_id}"
+    ) as peer:
+        editor.send_json(
+            [
+                {"op": "patch", "op_id": "p1", "id": ids[0], "key": "V", "value": "edited"},
+                {"op": "upsert", "op_id": "u1", "rows": [{"K": "3", "V": "c"}]},
+                {"op": "upsert", "op_id": "u2", "rows": [{"K": "1", "V": "duplicate key"}]},
+                {"op": "patch", "op_id": "p2", "id": 999999, "key": "V", "value": "x"},
+                {"op": "rename", "op_id": "bad"},
+            ]
+        )
+        editor.send_json({"op": "delete", "op_id": "d1", "ids": [ids[1]]})
+        replies = {}
+        while len(replies) < 6:
+            reply = editor.receive_json()
+            replies[reply["op_id"]] = reply
+
+        assert replies["p1"]["type"] == "ack" and replies["p1"]["row_id"] == ids[0]
+        assert replies["u1"]["type"] == "ack" and len(replies["u1"]["created_ids"]) == 1
+        assert (replies["u2"]["type"], replies["u2"]["status"]) == ("error", 409)
+        assert (replies["p2"]["type"], replies["p2"]["status"]) == ("error", 404)
+        assert (replies["bad"]["type"], replies["bad"]["status"]) == ("error", 400)
+        assert replies["d1"] == {"type": "ack", "op_id": "d1", "deleted": 1}
+        assert REGISTRY.get_sample_value("macro_ws_ops_total", {"op": "unknown", "outcome": "invalid"}) >= 1
+        assert REGISTRY.get_sample_value("macro_ws_ops_total", {"op": "rename", "outcome": "invalid"}) is None
+
+        seen = [peer.receive_json() for _ in range(3)]
+        assert [message["type"] for message in seen] == ["cell", "rows_upsert", "delete_rows"]
+        assert seen[1]["rows"] == [{"K": "3", "V": "c", "id": replies["u1"]["created_ids"][0]}]
+
+        editor.send_text("not json")
+        assert editor.receive_json() == {"type": "error", "op_id": None, "status": 400, "detail": "Malformed message"}
+
+    rows = client.get(f"/datasets/{dataset_id}/rows").json()
+    assert rows["total"] == 2
+    assert sorted((row["K"], row["V"]) for row in rows["rows"]) == [("1", "edited"), ("3", "c")]
@@ -0,0 +1,138 @@
+"""Tests for read-replica routing of GET sessions."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from services.api.app import database
+from services.api.app.database import READ_AFTER_WRITE, READ_REPLICA, SessionLocal, get_read_db
+from services.api.app.dataset_cache import DatasetCache, MemoryBackend
+from services.api.app.middleware import LastWriteMiddleware
+
+
+class StubLag:
+    interval = 1.0
+
+    def __init__(self, seconds: Optional[float]) -> None:
+        self.value = seconds
+
+    def seconds(self) -> Optional[float]:
+        return self.value
+
+    def mark_unavailable(self) -> None:
+        self.value = None
+
+
+def _request(last_write: Optional[float] = None, cookie: bool = False) -> Request:
+    headers = []
+    if last_write is not None:
+        headers.append((b"cookie", f"last_write={last_write}".encode()) if cookie else (b"x-last-write", str(last_write).encode()))
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+@pytest.fixture()
+def replica(monkeypatch: pytest.MonkeyPatch) -> StubLag:
+    lag = StubLag(0.5)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", SessionLocal)
+    monkeypatch.setattr(database, "replica_lag", lag)
+    return lag
+
+
+def test_reads_use_replica_unless_stale_for_the_caller(replica: StubLag) -> None:
+    assert database._read_target(_request()) == ("replica", "ok")
+    assert database._read_target(_request(time.time() - 60)) == ("replica", "ok")
+    assert database._read_target(_request(time.time())) == ("primary", "recent_write")
+    assert database._read_target(_request(time.time(), cookie=True)) == ("primary", "recent_write")
+    assert database._read_target(_request(time.time() - 1.2)) == ("primary", "recent_write")
+
+    replica.value = 30.0
+    assert database._read_target(_request()) == ("primary", "replica_lagging")
+    replica.value = None
+    assert database._read_target(_request()) == ("primary", "replica_unavailable")
+
+
+def test_without_replica_reads_use_primary() -> None:
+    assert database.ReplicaSessionLocal is None
+    assert database._read_target(_request()) == ("primary", "no_replica")
+
+
+def test_lag_checks_never_block_readers(monkeypatch: pytest.MonkeyPatch) -> None:
+    release = threading.Event()
+    lag = database.ReplicaLag(interval=0.2)
+    monkeypatch.setattr(lag, "_measure", lambda: 0.5 if release.wait(5) else None)
+
+    started = time.monotonic()
+    assert lag.seconds() is None
+    time.sleep(0.3)
+    # The check is still hanging: unavailable, without waiting for it.
+    assert lag.seconds() is None
+    assert time.monotonic() - started < 1
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while lag.seconds() != 0.5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert lag.seconds() == 0.5
+
+    lag.mark_unavailable()
+    assert lag.seconds() is None
+
+
+def test_unreachable_replica_session_falls_back_to_primary(replica: StubLag, monkeypatch: pytest.MonkeyPatch) -> None:
+    dead = create_engine("sqlite:////nonexistent/replica.db")
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=dead))
+
+    sessions = get_read_db(_request())
+    db = next(sessions)
+    assert db.info[READ_REPLICA] is False
+    sessions.close()
+    assert database._read_target(_request()) == ("primary", "replica_unavailable")
+
+
+def test_read_session_is_flagged_for_caches(replica: StubLag) -> None:
+    sessions = get_read_db(_request(time.time()))
+    db = next(sessions)
+    assert (db.info[READ_REPLICA], db.info[READ_AFTER_WRITE]) == (False, True)
+    sessions.close()
+
+    sessions = get_read_db(_request())
+    db = next(sessions)
+    assert (db.info[READ_REPLICA], db.info[READ_AFTER_WRITE]) == (True, False)
+    sessions.close()
+
+    cache = DatasetCache(MemoryBackend(), ttl=30)
+    cache.put("k", "stale")
+    assert cache.get_or_load("k", lambda: "fresh") == "stale"
+    assert cache.get_or_load("k", lambda: "fresh", refresh=True) == "fresh"
+
+
+def test_successful_writes_are_stamped() -> None:
+    app = FastAPI()
+    app.add_middleware(LastWriteMiddleware)
+
+    @app.get("/item")
+    def read_item() -> dict:
+        return {}
+
+    @app.post("/item")
+    def write_item(fail: bool = False) -> dict:
+        if fail:
+            raise HTTPException(status_code=409)
+        return {}
+
+    client = TestClient(app)
+    before = time.time()
+    written = client.post("/item")
+    assert before <= float(written.headers["x-last-write"]) <= time.time()
+    assert "last_write=" in written.headers["set-cookie"]
+    assert "x-last-write" not in client.post("/item", params={"fail": True}).headers
+    assert "x-last-write" not in client.get("/item").headers
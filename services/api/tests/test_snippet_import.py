@@ -0,0 +1,67 @@
+"""Tests for the bulk snippet import engine."""
+
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+from sqlalchemy.orm import Session
+
+from services.api.app.models import Snippet, SnippetVersion, User, Workspace
+from services.api.app.snippet_import import ImportFormatError, import_snippets
+
+
+def _document(snippets, schema="text-expander.v1") -> io.BytesIO:
+    return io.BytesIO(json.dumps({"schema": schema, "snippets": snippets}).encode("utf-8"))
+
+
+def _workspace(db: Session) -> tuple[int, int]:
+    workspace = Workspace(name="Import Workspace")
+    user = User(email="importer@example.com")
+    db.add_all([workspace, user])
+    db.commit()
+    return workspace.id, user.id
+
+
+def test_bulk_import_creates_updates_and_skips_unchanged(db_session: Session) -> None:
+    workspace_id, user_id = _workspace(db_session)
+    snippets = [
+        {"name": f"Snippet {i}", "trigger": f";s{i}", "body": f"Body {i}", "tags": ["ct"]}
+        for i in range(25)
+    ]
+    result = import_snippets(db_session, workspace_id, user_id, _document(snippets), batch_size=10)
+    db_session.commit()
+    assert (result.processed, result.created, result.updated, result.unchanged) == (25, 25, 0, 0)
+
+    snippets[3]["body"] = "Changed body"
+    progress = []
+    result = import_snippets(
+        db_session,
+        workspace_id,
+        user_id,
+        _document(snippets),
+        batch_size=10,
+        on_progress=lambda r: progress.append(r.processed),
+    )
+    db_session.commit()
+    assert (result.created, result.updated, result.unchanged) == (0, 1, 24)
+    assert progress[-1] == 25
+
+    changed = db_session.query(Snippet).filter(Snippet.trigger == ";s3").one()
+    assert changed.body == "Changed body"
+    versions = sorted(v.version for v in db_session.query(SnippetVersion).filter_by(snippet_id=changed.id))
+    assert versions == [1, 2]
+    assert db_session.query(SnippetVersion).count() == 26
+
+
+def test_streaming_parser_handles_small_chunks_and_bad_schema(db_session: Session) -> None:
+    workspace_id, user_id = _workspace(db_session)
+    payload = {"snippets": [{"name": "Ünïcode", "trigger": ";u", "body": "x" * 5000}], "schema": "text-expander.v1"}
+    stream = io.BytesIO(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    stream.read = lambda size=-1, _read=stream.read: _read(7)  # type: ignore[method-assign]
+    result = import_snippets(db_session, workspace_id, user_id, stream)
+    assert result.created == 1
+
+    with pytest.raises(ImportFormatError):
+        import_snippets(db_session, workspace_id, user_id, _document([], schema="other"))
@@ -0,0 +1,87 @@
+"""Integration tests for the snippet, history and render endpoints."""
+
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+from .conftest import authenticate
+
+
+def test_snippet_history_and_diff(client: TestClient) -> None:
+    headers = authenticate(client)
+    base = "/workspaces/1/snippets"
+    payload = {"name": "Chest", "trigger": ";cxr", "body": "Lungs clear.\nNo effusion."}
+    created = client.post(base, json=payload, headers=headers)
+    assert created.status_code == 201
+    snippet_id = created.json()["id"]
+
+    unchanged = client.put(f"{base}/{snippet_id}", json=payload, headers=headers)
+    assert unchanged.json()["version"] == 1
+
+    payload["body"] = "Lungs clear.\nSmall left effusion."
+    payload["tags"] = ["chest"]
+    assert client.put(f"{base}/{snippet_id}", json=payload, headers=headers).json()["version"] == 2
+
+    history = client.get(f"{base}/{snippet_id}/versions", headers=headers)
+    assert [item["version"] for item in history.json()] == [2, 1]
+    assert "body" not in history.json()[0]
+
+    version = client.get(f"{base}/{snippet_id}/versions/1", headers=headers)
+    assert version.json()["body"] == "Lungs clear.\nNo effusion."
+    assert "immutable" in version.headers["cache-control"]
+
+    diff = client.get(f"{base}/{snippet_id}/versions/1/diff/2", headers=headers).json()
+    assert diff["fields"] == {"tags": {"old": [], "new": ["chest"]}}
+    assert "-No effusion." in diff["body_diff"] and "+Small left effusion." in diff["body_diff"]
+
+    restored = client.post(f"{base}/{snippet_id}/restore/1", headers=headers)
+    assert restored.json()["version"] == 3
+    assert restored.json()["body"] == "Lungs clear.\nNo effusion."
+
+    # v3 has v1's contents, so this pair shares the cached hunks but not the labels or ETag.
+    first = client.get(f"{base}/{snippet_id}/versions/1/diff/2", headers=headers)
+    again = client.get(f"{base}/{snippet_id}/versions/3/diff/2", headers=headers)
+    assert again.json()["body_diff"].startswith("--- v3\n+++ v2\n@@")
+    assert again.json()["body_diff"].split("\n")[2:] == first.json()["body_diff"].split("\n")[2:]
+    assert again.headers["etag"] != first.headers["etag"]
+
+
+def test_snippet_list_query_count_does_not_grow_with_snippets(client: TestClient) -> None:
+    headers = authenticate(client)
+    base = "/workspaces/1/snippets"
+
+    def list_queries() -> int:
+        response = client.get(base, headers=headers)
+        assert all(item["version"] == 1 for item in response.json())
+        return int(response.headers["x-query-count"])
+
+    client.post(base, json={"name": "s0", "trigger": ";s0", "body": "b"}, headers=headers)
+    baseline = list_queries()
+    for index in range(1, 6):
+        client.post(base, json={"name": f"s{index}", "trigger": f";s{index}", "body": "b"}, headers=headers)
+    assert list_queries() == baseline
+    since = client.get(f"{base}/since", params={"since_ts": "2000-01-01T00:00:00Z"}, headers=headers)
+    assert int(since.headers["x-query-count"]) == baseline
+
+
+def test_render_single_and_batch(client: TestClient) -> None:
+    headers = authenticate(client)
+    base = "/workspaces/1/snippets"
+    snippet = client.post(
+        base,
+        json={"name": "Age", "trigger": ";age", "body": "{{ age }} year old {{sex}}.", "variables": {"sex": "female"}},
+        headers=headers,
+    ).json()
+
+    rendered = client.post(f"{base}/{snippet['id']}/render", json={"values": {"age": "54"}}, headers=headers)
+    assert rendered.json() == {"snippet_id": snippet["id"], "version": 1, "text": "54 year old female.", "missing": []}
+
+    batch = client.post(
+        f"{base}/render",
+        json={"items": [{"snippet_id": snippet["id"], "values": {"age": str(age)}} for age in (30, 40)]},
+        headers=headers,
+    )
+    assert [item["text"] for item in batch.json()["results"]] == ["30 year old female.", "40 year old female."]
+
+    strict = client.post(f"{base}/{snippet['id']}/render", json={"strict": True}, headers=headers)
+    assert strict.status_code == 422
@@ -0,0 +1,15 @@
+"""Tests for compiled snippet templates."""
+
+from services.api.app.templating import compile_template
+
+
+def test_render_uses_values_then_defaults_and_reports_missing() -> None:
+    template = compile_template("Age {{ age }}, sex {{sex}}: {{ finding }}.", {"sex": "F"})
+    assert template.names == ("age", "sex", "finding")
+
+    text, missing = template.render({"age": "42"})
+    assert text == "Age 42, sex F: {{ finding }}."
+    assert missing == ["finding"]
+
+    text, missing = template.render({"age": "42", "sex": "M", "finding": "normal"})
+    assert (text, missing) == ("Age 42, sex M: normal.", [])
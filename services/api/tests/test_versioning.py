@@ -0,0 +1,71 @@
+"""Tests for content-addressed snippet version storage."""
+
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+from services.api.app.models import Snippet, SnippetBlob, SnippetVersion, Workspace
+from services.api.app.utils import snippet_content_hash
+from services.api.app.versioning import compact_history, load_version_body, record_version
+
+
+def _snippet(db: Session, body: str) -> Snippet:
+    workspace = Workspace(name="Versions")
+    db.add(workspace)
+    db.flush()
+    snippet = Snippet(
+        workspace_id=workspace.id,
+        name="Macro",
+        trigger=";m",
+        body=body,
+        content_hash=snippet_content_hash("Macro", ";m", body, None, None),
+    )
+    db.add(snippet)
+    db.flush()
+    return snippet
+
+
+def _versions(db: Session, snippet_id: int) -> list[SnippetVersion]:
+    return (
+        db.query(SnippetVersion)
+        .filter(SnippetVersion.snippet_id == snippet_id)
+        .order_by(SnippetVersion.version)
+        .all()
+    )
+
+
+def test_large_bodies_are_stored_as_deltas_and_reconstructed(db_session: Session) -> None:
+    lines = [f"Finding {i}: no acute abnormality.\n" for i in range(200)]
+    snippet = _snippet(db_session, "".join(lines))
+    record_version(db_session, snippet, None)
+
+    expected = ["".join(lines)]
+    for i in range(5):
+        previous = snippet.body
+        lines[i * 10] = f"Finding {i * 10}: revised.\n"
+        snippet.body = "".join(lines)
+        expected.append(snippet.body)
+        record_version(db_session, snippet, None, previous)
+    db_session.commit()
+
+    versions = _versions(db_session, snippet.id)
+    assert [v.delta_depth for v in versions] == [0, 1, 2, 3, 4, 5]
+    assert all(v.body is None for v in versions)
+    assert db_session.query(SnippetBlob).count() == 1
+    assert [load_version_body(db_session, v) for v in versions] == expected
+
+
+def test_identical_bodies_share_a_blob_and_compaction_keeps_content(db_session: Session) -> None:
+    snippet = _snippet(db_session, "Short body")
+    for version in (1, 2, 3):
+        db_session.add(
+            SnippetVersion(snippet_id=snippet.id, version=version, name="Macro", trigger=";m", body="Short body")
+        )
+    db_session.commit()
+
+    stats = compact_history(db_session)
+    assert stats == {"snippets": 1, "versions": 3}
+    versions = _versions(db_session, snippet.id)
+    assert all(v.body is None and v.content_hash for v in versions)
+    assert db_session.query(SnippetBlob).count() == 1
+    assert {load_version_body(db_session, v) for v in versions} == {"Short body"}